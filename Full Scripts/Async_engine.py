@@ -0,0 +1,174 @@
+import asyncio
+import heapq
+import itertools
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+import numpy as np
+from Pipeline import MatchedRows, Pipeline, Stage, WriterStage, put_blocking, put_latest
+from Time_index import TimeIndex
+
+TEMPERATURE = 'temperature'
+
+# An instrument polled on its own schedule; read_batch returns (epoch times, value rows)
+class PolledSource:
+    def __init__(self, name, read_batch, interval):
+        self.name = name
+        self.read_batch = read_batch
+        self.interval = interval
+
+# Merges batches from several sources into one time-ordered stream. A record is
+# released once every source has reported a later timestamp (its watermark), or once
+# it is older than max_delay seconds, so a silent source cannot stall the stream.
+class StreamMerger:
+    def __init__(self, names, max_delay=2.0):
+        self.heap = []
+        self.counter = itertools.count()
+        self.watermarks = {name: -np.inf for name in names}
+        self.max_delay = max_delay
+
+    def add(self, name, times, values):
+        for timestamp, row in zip(times.tolist(), values):
+            heapq.heappush(self.heap, (timestamp, next(self.counter), name, row))
+        if len(times):
+            self.watermarks[name] = max(self.watermarks[name], times[-1])
+
+    # Records that no source can still precede, as (timestamp, order, name, row) in time order
+    def release(self, now):
+        limit = max(min(self.watermarks.values()), now - self.max_delay)
+        records = []
+        while self.heap and self.heap[0][0] <= limit:
+            records.append(heapq.heappop(self.heap))
+        return records
+
+# Joins the merged stream: lock-in records go into one TimeIndex per instrument and each
+# temperature row is matched against all of them once every instrument has a reading at
+# or after the row (or the stream has moved hold seconds past it). At most max_pending
+# rows wait, the oldest are dropped beyond that.
+class MergedJoin:
+    def __init__(self, lockin_names, policy='nearest', max_skew=None, hold=2.0, max_pending=10000):
+        self.lockin_names = list(lockin_names)
+        self.indexes = {name: TimeIndex(4, policy, max_skew) for name in self.lockin_names}
+        self.max_skew = max_skew
+        self.hold = hold
+        self.max_pending = max_pending
+        self.pending_times = []
+        self.pending_temperatures = []
+
+    def add_records(self, records):
+        if not records:
+            return None
+        for name, group in itertools.groupby(records, key=lambda record: record[2]):
+            group = list(group)
+            if name == TEMPERATURE:
+                self.pending_times.extend(record[0] for record in group)
+                self.pending_temperatures.extend(record[3][0] for record in group)
+                excess = len(self.pending_times) - self.max_pending
+                if excess > 0:
+                    del self.pending_times[:excess]
+                    del self.pending_temperatures[:excess]
+                    print(f"{excess} temperature rows dropped, more than {self.max_pending} were waiting for lock-in readings")
+            else:
+                self.indexes[name].extend(np.array([record[0] for record in group]),
+                                          np.array([record[3] for record in group], dtype=float))
+        return self._match_ready(records[-1][0])
+
+    def _match_ready(self, stream_time):
+        latest = [self.indexes[name].latest() for name in self.lockin_names]
+        # Until every instrument has a reading only rows older than hold seconds are released
+        waiting = any(timestamp is None for timestamp in latest)
+        count = 0
+        for timestamp in self.pending_times:
+            if (waiting or timestamp > min(latest)) and stream_time - timestamp <= self.hold:
+                break
+            count += 1
+        if count == 0:
+            return None
+        times = np.array(self.pending_times[:count])
+        temperatures = np.array(self.pending_temperatures[:count])
+        del self.pending_times[:count]
+        del self.pending_temperatures[:count]
+        if waiting:
+            print(f"{count} temperature rows had no lock-in reading, not every instrument has answered yet")
+            return None
+
+        columns = []
+        valid = np.ones(count, dtype=bool)
+        for name in self.lockin_names:
+            values, found = self.indexes[name].lookup(times)
+            columns.append(values)
+            valid &= found
+            self.indexes[name].prune(times[-1])
+        if not valid.all():
+            print(f"{np.count_nonzero(~valid)} temperature rows had no lock-in reading within {self.max_skew} s")
+        return MatchedRows(times[valid], temperatures[valid], np.hstack(columns)[valid])
+
+# Runs the asyncio event loop of an AsyncPipeline in its own thread
+class EngineStage(Stage):
+    def __init__(self, pipeline, stop_event):
+        Stage.__init__(self, 'asyncio engine', stop_event)
+        self.pipeline = pipeline
+
+    def loop(self):
+        asyncio.run(self.pipeline._main())
+
+# asyncio acquisition core: every lock-in and the MPMS tailer are polled concurrently on
+# independent schedules (blocking VISA and file I/O run in a thread pool), merged into one
+# time-ordered stream and joined. Offers the same interface as Pipeline, so the run logic
+# (record) and the UI consume it unchanged; matched rows carry X, Y, R, theta of every
+# instrument in the order of sources.
+class AsyncPipeline(Pipeline):
+    def __init__(self, sources, tailer, watcher, record, tail_interval=0.5, policy='nearest',
+                 max_skew=None, hold=2.0, queue_size=1000, ui_queue_size=100, idle=None):
+        self.sources = sources
+        self.tailer = tailer
+        self.watcher = watcher
+        self.tail_interval = tail_interval
+        self.stop_event = Event()
+        self.merger = StreamMerger([source.name for source in sources] + [TEMPERATURE], hold)
+        self.joiner = MergedJoin([source.name for source in sources], policy, max_skew, hold)
+        self.matched = queue.Queue(queue_size)
+        self.ui = queue.Queue(ui_queue_size)
+        self.executor = ThreadPoolExecutor(max_workers=len(sources) + 2)
+        self.stages = [EngineStage(self, self.stop_event), WriterStage(record, self.matched, self.stop_event, idle)]
+
+    async def _main(self):
+        self.release_lock = asyncio.Lock()
+        tasks = [self._poll(source) for source in self.sources] + [self._tail()]
+        await asyncio.gather(*tasks)
+
+    # Releases merged records, joins them and hands matched rows to the writer and the UI
+    async def _release(self):
+        loop = asyncio.get_running_loop()
+        async with self.release_lock:
+            batch = self.joiner.add_records(self.merger.release(time.time()))
+            if batch is not None and len(batch.times):
+                await loop.run_in_executor(self.executor, put_blocking, self.matched, batch, self.stop_event)
+                put_latest(self.ui, batch)
+
+    async def _poll(self, source):
+        loop = asyncio.get_running_loop()
+        next_time = loop.time()
+        while not self.stop_event.is_set():
+            times, values = await loop.run_in_executor(self.executor, source.read_batch)
+            self.merger.add(source.name, times, values)
+            await self._release()
+            next_time += source.interval
+            delay = next_time - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                next_time = loop.time()
+
+    async def _tail(self):
+        loop = asyncio.get_running_loop()
+        while not self.stop_event.is_set():
+            times, temperatures = await loop.run_in_executor(self.executor, self.tailer.read_new)
+            self.merger.add(TEMPERATURE, times, temperatures[:, None])
+            await self._release()
+            await loop.run_in_executor(self.executor, self.watcher.wait, self.tail_interval)
+
+    def stop(self):
+        Pipeline.stop(self)
+        self.executor.shutdown()
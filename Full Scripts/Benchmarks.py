@@ -0,0 +1,753 @@
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+from Fake_instruments import FakeLockin
+from Lockin_session import SettingsCache, configure_snapshot, read_snapshot
+from Capture_stream import CaptureStream
+from Csv_writer import BufferedCsvWriter
+from Log_tailer import LogTailer
+from Log_scanner import LogScanner
+from Log_watcher import LogWatcher
+from Trend_detector import TrendDetector
+from Time_index import TimeIndex
+from Ring_buffer import LiveSeries
+from Live_plot import LivePlot
+from Pipeline import Pipeline
+from Run_state_machine import RunStateMachine
+from Replay import ReplayClock, LogReplayer, ReplayLockin
+from Columnar_store import ColumnarWriter, read_columns, stepper_columns
+
+# Legacy acquisition path: two sequential OUTP? round trips per sample
+def read_two_queries(lockin):
+    x2 = float(lockin.query('OUTP? 0'))
+    y2 = float(lockin.query('OUTP? 1'))
+    return [x2, y2]
+
+# Legacy oscillator setup: every parameter sent as its own write on every call
+def legacy_set_oscillator_parameters(lockin, dc_offset, ac_amplitude, frequency):
+    lockin.write(f'SOFF {dc_offset}')
+    lockin.write(f'SLVL {ac_amplitude}')
+    lockin.write(f'FREQ {frequency}')
+
+# Legacy file output: open, write one row and close for every matched sample
+def legacy_append_to_run_file(filename, timestamp, temperature, voltage_data):
+    with open(filename, 'a', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow([timestamp, temperature, voltage_data[0], voltage_data[1]])
+
+# Legacy log reading: reopen log.csv, seek and parse every new line into datetimes
+def legacy_get_new_temperature_lines(file_path, last_position, start_time):
+    with open(file_path, 'r') as file:
+        file.seek(last_position)
+        lines = file.readlines()
+        last_position = file.tell()
+
+    data = []
+    for line in lines:
+        parts = line.strip().split(',')
+        if len(parts) > 1:
+            try:
+                timestamp = int(float(parts[0]))
+                temperature = float(parts[1])
+                latest_timestamp = datetime.fromtimestamp(timestamp)
+                if latest_timestamp >= start_time:
+                    data.append((latest_timestamp, temperature))
+            except ValueError:
+                continue
+    return data, last_position
+
+# Legacy latest-temperature read: the whole log read with readlines() and searched for [Data] on every call
+def legacy_get_latest_temperature(file_path):
+    with open(file_path, 'r') as file:
+        lines = file.readlines()
+    data_start = 0
+    for i, line in enumerate(lines):
+        if line.strip() == '[Data]':
+            data_start = i + 2
+            break
+    for line in reversed(lines[data_start:]):
+        parts = line.strip().split(',')
+        try:
+            return float(parts[1]), float(parts[2])
+        except (ValueError, IndexError):
+            continue
+    return None
+
+# Legacy join: scan every lock-in reading taken so far for each temperature row, append
+# the row to the file and keep the last 2000 rows in plain lists for the plot
+def legacy_match_readings(temperature_data, voltage_readings, file, series):
+    timestamps, temperatures, x2_vals, y2_vals = series
+    for temp_time, temp in temperature_data:
+        closest_time = min(voltage_readings, key=lambda x: abs(x[0] - temp_time))
+        legacy_append_to_run_file(file, temp_time, temp, closest_time[1])
+        timestamps.append(temp_time)
+        temperatures.append(temp)
+        x2_vals.append(closest_time[1][0])
+        y2_vals.append(closest_time[1][1])
+
+        if len(timestamps) > 2000:
+            timestamps.pop(0)
+            temperatures.pop(0)
+            x2_vals.pop(0)
+            y2_vals.pop(0)
+
+# Latency percentiles in milliseconds of a list of durations in seconds
+def percentiles(durations):
+    if not durations:
+        return {}
+    values = 1000 * np.asarray(durations, dtype=float)
+    return {f'p{q}_ms': float(np.percentile(values, q)) for q in (50, 95, 99)}
+
+# Legacy trend detection: polyfit of the last 60 temperatures against sample index
+def legacy_detect_trend(temperatures, tolerance):
+    last_60_temps = temperatures[-60:]
+    if len(last_60_temps) < 2:
+        return "Not enough data"
+    x_values = np.arange(len(last_60_temps))
+    y_values = np.array(last_60_temps)
+    slope, _ = np.polyfit(x_values, y_values, 1)
+    if abs(slope) < tolerance:
+        return "steady"
+    elif slope > 0:
+        return "warming"
+    else:
+        return "cooling"
+
+# Compares sample rate of the two-query path with one SNAPD? query per sample
+def bench_snapshot(samples=200, latency=0.005):
+    lockin = FakeLockin(latency=latency)
+    configure_snapshot(lockin)
+
+    start = time.perf_counter()
+    for _ in range(samples):
+        read_two_queries(lockin)
+    two_query_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(samples):
+        read_snapshot(lockin)
+    snapshot_time = time.perf_counter() - start
+
+    return {
+        'samples': samples,
+        'latency_s': latency,
+        'two_query_rate_hz': samples / two_query_time,
+        'snapshot_rate_hz': samples / snapshot_time,
+        'speedup': two_query_time / snapshot_time,
+    }
+
+# Dead time at run boundaries (arm a run at the next DC offset, then park the oscillator) with every
+# parameter sent each time and with the settings cache; verify adds the read-back queries
+def bench_oscillator(runs=20, latency=0.005, dc_offset=1.6e-3, dc_step=1e-4, ac_voltage=0.5, frequency=271.8e3):
+    results = {'runs': runs, 'latency_s': latency}
+    for name in ('legacy', 'cache', 'cache_verify'):
+        lockin = FakeLockin(latency=latency)
+        settings = SettingsCache(lockin, verify=name == 'cache_verify')
+        start = time.perf_counter()
+        for run in range(runs):
+            for values in ((dc_offset + run * dc_step, ac_voltage, frequency), (0.001, 0.001, frequency)):
+                if name == 'legacy':
+                    legacy_set_oscillator_parameters(lockin, *values)
+                else:
+                    settings.apply(SOFF=values[0], SLVL=values[1], FREQ=values[2])
+        results[f'{name}_ms_per_boundary'] = 1e3 * (time.perf_counter() - start) / (2 * runs)
+        results[f'{name}_transactions'] = lockin.queries + lockin.writes
+    return results
+
+# Effective sample rate and bus transactions of the capture buffer drained every poll_interval
+def bench_capture(duration=2.0, poll_interval=0.5, rate_divider=8, latency=0.005):
+    lockin = FakeLockin(latency=latency)
+    stream = CaptureStream(lockin, rate_divider)
+    stream.arm()
+    transactions = lockin.queries + lockin.writes
+    samples = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        time.sleep(poll_interval)
+        times, values = stream.drain()
+        samples += len(values)
+    elapsed = time.perf_counter() - start
+    stream.stop()
+    transactions = lockin.queries + lockin.writes - transactions
+    return {
+        'samples': samples,
+        'capture_rate_hz': stream.rate,
+        'effective_rate_hz': samples / elapsed,
+        'bus_transactions': transactions,
+        'samples_per_transaction': samples / transactions,
+    }
+
+# Rows per second written by open-per-row appends and by the buffered writer (two files per row, as while recording)
+def bench_csv_writer(rows=2000, folder=None):
+    with tempfile.TemporaryDirectory(dir=folder) as directory:
+        full_data = os.path.join(directory, 'Full_Data.csv')
+        run_file = os.path.join(directory, 'Run_1.csv')
+        row = (datetime.now(), 4.2, (1.25e-06, -3.5e-07))
+
+        start = time.perf_counter()
+        for _ in range(rows):
+            legacy_append_to_run_file(full_data, *row)
+            legacy_append_to_run_file(run_file, *row)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with BufferedCsvWriter(full_data) as full_writer, BufferedCsvWriter(run_file) as run_writer:
+            for _ in range(rows):
+                for writer in (full_writer, run_writer):
+                    writer.writerow([row[0], row[1], row[2][0], row[2][1]])
+        buffered_time = time.perf_counter() - start
+
+    return {
+        'rows': rows,
+        'legacy_rows_per_s': rows / legacy_time,
+        'buffered_rows_per_s': rows / buffered_time,
+        'speedup': legacy_time / buffered_time,
+    }
+
+# Synthetic MPMS: appends one row per interval, its time column being the moment it was written
+def synthetic_log_writer(path, rows, interval):
+    with open(path, 'a') as file:
+        for _ in range(rows):
+            time.sleep(interval)
+            file.write(f'{time.time():.6f},4.2\n')
+            file.flush()
+
+# Delay from a row being written to it being read, with the watcher and with a fixed sleep between polls
+def bench_log_latency(rows=40, interval=0.1, sleep_interval=0.5, folder=None):
+    results = {}
+    with tempfile.TemporaryDirectory(dir=folder) as directory:
+        for method in ('watcher', 'sleep'):
+            path = os.path.join(directory, f'log_{method}.csv')
+            open(path, 'w').close()
+            tailer = LogTailer(path)
+            watcher = LogWatcher(path)
+            writer = multiprocessing.Process(target=synthetic_log_writer, args=(path, rows, interval))
+            writer.start()
+            latencies = []
+            cpu_start = time.process_time()
+            while len(latencies) < rows:
+                if method == 'watcher':
+                    watcher.wait(1.0)
+                else:
+                    time.sleep(sleep_interval)
+                times, _ = tailer.read_new()
+                now = time.time()
+                latencies.extend((now - times).tolist())
+            cpu_time = time.process_time() - cpu_start
+            writer.join()
+            mode = watcher.mode
+            watcher.close()
+            tailer.close()
+            latencies = sorted(latencies)
+            results[f'{method}_mean_latency_ms'] = 1000 * sum(latencies) / len(latencies)
+            results[f'{method}_p95_latency_ms'] = 1000 * latencies[int(0.95 * (len(latencies) - 1))]
+            results[f'{method}_cpu_s'] = cpu_time
+        results['watcher_mode'] = mode
+    return results
+
+# Cost per row of a polyfit on every row against the running-sum detector
+def bench_trend(rows=5000):
+    temperatures = list(2 + 0.2 / 60 * np.arange(rows))
+    start = time.perf_counter()
+    for i in range(rows):
+        legacy_detect_trend(temperatures[max(0, i - 59):i + 1], 0.2 / 60 * 0.2)
+    legacy_time = time.perf_counter() - start
+
+    detector = TrendDetector(60, 0.2 * 0.2)
+    start = time.perf_counter()
+    for i, temperature in enumerate(temperatures):
+        detector.add(1.7e9 + i, temperature)
+        detector.trend()
+    rolling_time = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'polyfit_us_per_row': 1e6 * legacy_time / rows,
+        'rolling_us_per_row': 1e6 * rolling_time / rows,
+        'speedup': legacy_time / rolling_time,
+    }
+
+# Rows per second parsed from a growing log by the legacy reader and by LogTailer
+def bench_tail(rows=50000, chunks=50, folder=None):
+    with tempfile.TemporaryDirectory(dir=folder) as directory:
+        path = os.path.join(directory, 'log.csv')
+        start_time = datetime.now()
+        first = time.time()
+        lines = [f'{first + i:.3f},{2 + i * 1e-4:.4f}\n' for i in range(rows)]
+        open(path, 'w').close()
+        tailer = LogTailer(path, start_time.timestamp())
+        last_position = 0
+        legacy_time = 0.0
+        tailer_time = 0.0
+        legacy_rows = 0
+        tailer_rows = 0
+        for chunk in np.array_split(np.arange(rows), chunks):
+            with open(path, 'a') as file:
+                file.write(''.join(lines[chunk[0]:chunk[-1] + 1]))
+            start = time.perf_counter()
+            data, last_position = legacy_get_new_temperature_lines(path, last_position, start_time)
+            legacy_time += time.perf_counter() - start
+            legacy_rows += len(data)
+            start = time.perf_counter()
+            times, _ = tailer.read_new()
+            tailer_time += time.perf_counter() - start
+            tailer_rows += len(times)
+        tailer.close()
+    return {
+        'rows': rows,
+        'legacy_rows_per_s': legacy_rows / legacy_time,
+        'tailer_rows_per_s': tailer_rows / tailer_time,
+        'speedup': (legacy_time / legacy_rows) / (tailer_time / tailer_rows),
+    }
+
+# Per-row cost of joining and writing a temperature row after hours of acquisition. The legacy
+# join scans every reading taken since the start; the engine binary-searches a pruned TimeIndex.
+def bench_growth(hours=(0, 1, 3, 6, 12), sample_interval=0.5, rows=20, folder=None):
+    results = {'sample_interval_s': sample_interval, 'hours': list(hours)}
+    legacy_us = []
+    engine_us = []
+    legacy_readings = []
+    engine_readings = []
+    with tempfile.TemporaryDirectory(dir=folder) as directory:
+        for hour in hours:
+            count = int(hour * 3600 / sample_interval) + 1
+            origin = time.time() - count * sample_interval
+            reading_times = origin + sample_interval * np.arange(count)
+            row_times = reading_times[-1] - 0.1 + np.linspace(0, 0.05, rows)
+
+            voltage_readings = [(datetime.fromtimestamp(t), [1.25e-06, -3.5e-07]) for t in reading_times.tolist()]
+            temperature_data = [(datetime.fromtimestamp(t), 4.2) for t in row_times.tolist()]
+            series = ([], [], [], [])
+            start = time.perf_counter()
+            legacy_match_readings(temperature_data, voltage_readings, os.path.join(directory, f'legacy_{hour}.csv'), series)
+            legacy_us.append(1e6 * (time.perf_counter() - start) / rows)
+            legacy_readings.append(len(voltage_readings))
+
+            # The pipeline prunes after every batch, so only readings near the newest row remain
+            index = TimeIndex(4, 'nearest', 2.0)
+            index.extend(reading_times, np.tile([1.25e-06, -3.5e-07, 1.3e-06, -15.6], (count, 1)))
+            index.prune(row_times[0] - 1.0)
+            with BufferedCsvWriter(os.path.join(directory, f'engine_{hour}.csv')) as writer:
+                start = time.perf_counter()
+                values, _ = index.lookup(row_times)
+                index.prune(row_times[-1])
+                for temp_time, value in zip(row_times.tolist(), values.tolist()):
+                    writer.writerow([datetime.fromtimestamp(temp_time), 4.2, value[0], value[1]])
+                engine_us.append(1e6 * (time.perf_counter() - start) / rows)
+            engine_readings.append(len(index))
+    results.update({
+        'legacy_us_per_row': legacy_us,
+        'engine_us_per_row': engine_us,
+        'legacy_readings_held': legacy_readings,
+        'engine_readings_held': engine_readings,
+    })
+    return results
+
+# Wraps a LogTailer, recording when each row was read and how long after it was written
+class TimedTailer:
+    def __init__(self, tailer, read_times, latencies):
+        self.tailer = tailer
+        self.read_times = read_times
+        self.latencies = latencies
+
+    def read_new(self):
+        times, temperatures = self.tailer.read_new()
+        now = time.time()
+        self.latencies.extend((now - times).tolist())
+        for timestamp in times.tolist():
+            self.read_times[timestamp] = now
+        return times, temperatures
+
+    def close(self):
+        self.tailer.close()
+
+# The stepper's per-row work (file output, trend, run state) with the time spent in each part;
+# stats counts the rows and keeps the wall time of the last one
+def timed_record(writer, detector, machine, read_times, latencies, stats):
+    def record(batch):
+        now = time.time()
+        for timestamp in batch.times.tolist():
+            latencies['join'].append(now - read_times.pop(timestamp, now))
+        for temp_time, temp, values in zip(batch.times.tolist(), batch.temperatures.tolist(), batch.values.tolist()):
+            start = time.perf_counter()
+            writer.writerow([datetime.fromtimestamp(temp_time), temp, values[0], values[1]])
+            latencies['write'].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            detector.add(temp_time, temp)
+            machine.update(temp_time, temp, detector.trend())
+            latencies['trend'].append(time.perf_counter() - start)
+        stats['rows'] += len(batch.times)
+        stats['last'] = time.time()
+    return record
+
+# Plots the batches of a running pipeline like live_readout until idle for idle_timeout seconds
+# after finished() turns true; returns redraw durations and (elapsed s, traced bytes) samples
+def drive_pipeline(pipeline, finished, plot_window=2000, fps=5.0, idle_timeout=1.0, memory_interval=1.0):
+    plot = LivePlot(plot_window, fps, show=False)
+    redraws = []
+    memory = []
+    start = time.monotonic()
+    last_batch = start
+    next_memory = start
+    while pipeline.running():
+        now = time.monotonic()
+        if tracemalloc.is_tracing() and now >= next_memory:
+            memory.append((now - start, tracemalloc.get_traced_memory()[0]))
+            next_memory += memory_interval
+        batches = pipeline.ui_batches(timeout=0.1)
+        if not batches and finished() and time.monotonic() - last_batch > idle_timeout:
+            break
+        if batches:
+            last_batch = time.monotonic()
+        for batch in batches:
+            for temp_time, temp, values in zip(batch.times.tolist(), batch.temperatures.tolist(), batch.values.tolist()):
+                plot.add(temp_time, temp, values[0], values[1])
+        draw_start = time.perf_counter()
+        if plot.update():
+            redraws.append(time.perf_counter() - draw_start)
+    pipeline.check()
+    plot.close()
+    return redraws, memory
+
+# Bytes per hour from (elapsed s, bytes) samples, fitted over the second half to leave out start-up
+# allocations. Runs shorter than the trend window still include the detector filling its window.
+def memory_growth(memory):
+    if len(memory) < 4:
+        return {'traced_bytes': [bytes_used for _, bytes_used in memory]}
+    elapsed, used = np.array(memory[len(memory) // 2:], dtype=float).T
+    slope = np.polyfit(elapsed, used, 1)[0]
+    return {'traced_start_bytes': int(memory[0][1]), 'traced_end_bytes': int(memory[-1][1]),
+            'traced_growth_bytes_per_hour': float(slope * 3600)}
+
+# End to end at a fixed offered load: a synthetic MPMS process writes log rows in real time and a fake
+# lock-in is sampled every sample_interval; reports throughput and per-stage latencies, or with
+# trace_memory the memory growth (tracing slows every allocation, so latencies are measured without it)
+def bench_pipeline(duration=20.0, log_rate=50.0, sample_interval=0.05, latency=0.002, folder=None, trace_memory=False):
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        with tempfile.TemporaryDirectory(dir=folder) as directory:
+            path = os.path.join(directory, 'log.csv')
+            open(path, 'w').close()
+            lockin = FakeLockin(latency=latency)
+            configure_snapshot(lockin)
+
+            def read_batch():
+                snapshot = read_snapshot(lockin)
+                return np.array([snapshot.timestamp.timestamp()]), np.array([snapshot[1:5]])
+
+            latencies = {'tail': [], 'join': [], 'write': [], 'trend': []}
+            read_times = {}
+            stats = {'rows': 0, 'last': None}
+            tailer = TimedTailer(LogTailer(path), read_times, latencies['tail'])
+            watcher = LogWatcher(path)
+            writer_process = multiprocessing.Process(target=synthetic_log_writer, args=(path, int(duration * log_rate), 1 / log_rate))
+            with BufferedCsvWriter(os.path.join(directory, 'Full_Data.csv')) as writer:
+                record = timed_record(writer, TrendDetector(60, 0.04), RunStateMachine(2, 9), read_times, latencies, stats)
+                pipeline = Pipeline(read_batch, tailer, watcher, TimeIndex(4, 'nearest', 2.0), record, sample_interval)
+                start = time.time()
+                writer_process.start()
+                pipeline.start()
+                try:
+                    redraws, memory = drive_pipeline(pipeline, lambda: not writer_process.is_alive())
+                finally:
+                    pipeline.stop()
+                    writer_process.join()
+                    watcher.close()
+                    tailer.close()
+    finally:
+        tracemalloc.stop()
+    results = {'offered_rows_per_s': log_rate, 'rows': stats['rows'], 'rows_per_s': stats['rows'] / (stats['last'] - start)}
+    if trace_memory:
+        results.update(memory_growth(memory))
+        return results
+    for stage in ('tail', 'join', 'write', 'trend'):
+        results.update({f'{stage}_{name}': value for name, value in percentiles(latencies[stage]).items()})
+    results.update({f'plot_{name}': value for name, value in percentiles(redraws).items()})
+    return results
+
+# Traced memory of the end-to-end run over time
+def bench_memory(duration=30.0, folder=None):
+    return bench_pipeline(duration, folder=folder, trace_memory=True)
+
+# Largest sustained rate: a recorded log replayed as fast as possible through the full pipeline
+def bench_replay(rows=20000, folder=None):
+    with tempfile.TemporaryDirectory(dir=folder) as directory:
+        source = os.path.join(directory, 'recorded_log.csv')
+        temperatures = np.concatenate([np.full(rows // 4, 2.0), np.linspace(2, 9, rows // 2), np.full(rows - rows // 4 - rows // 2, 9.0)])
+        with open(source, 'w') as file:
+            file.write('[Data]\nTime,Temperature (K)\n')
+            file.write(''.join(f'{1.7e9 + i:.3f},{temperature:.4f}\n' for i, temperature in enumerate(temperatures.tolist())))
+        target = os.path.join(directory, 'log.csv')
+        open(target, 'w').close()
+        clock = ReplayClock()
+        replayer = LogReplayer(source, target, clock, 0)
+        latencies = {'join': [], 'write': [], 'trend': []}
+        stats = {'rows': 0, 'last': None}
+        tailer = LogTailer(target)
+        watcher = LogWatcher(target)
+        with BufferedCsvWriter(os.path.join(directory, 'Full_Data.csv')) as writer:
+            record = timed_record(writer, TrendDetector(60, 0.04), RunStateMachine(2, 9), {}, latencies, stats)
+            pipeline = Pipeline(ReplayLockin(clock, 0.5).read_batch, tailer, watcher, TimeIndex(4, 'nearest', 2.0), record, 0.05)
+            start = time.time()
+            replayer.start()
+            pipeline.start()
+            try:
+                redraws, _ = drive_pipeline(pipeline, replayer.finished)
+            finally:
+                pipeline.stop()
+                replayer.stop()
+                watcher.close()
+                tailer.close()
+    results = {'rows': stats['rows'], 'rows_per_s': stats['rows'] / (stats['last'] - start)}
+    for stage in ('write', 'trend'):
+        results.update({f'{stage}_{name}': value for name, value in percentiles(latencies[stage]).items()})
+    results.update({f'plot_{name}': value for name, value in percentiles(redraws).items()})
+    return results
+
+# Legacy redraw: set_data on every row, Python min/max per axis, titles and a full canvas draw
+def legacy_redraw(fig, lines, axes, series):
+    time_elapsed = series.column('elapsed')
+    columns = [series.column(name) for name in ('temperature', 'x2', 'y2')]
+    for line, ax, values in zip(lines, axes, columns):
+        line.set_data(time_elapsed, values)
+        ax.set_xlim(time_elapsed[0], time_elapsed[-1] + 1)
+        ax.set_ylim(min(values) - 1, max(values) + 1)
+        ax.set_title(f'Current Reading: {values[-1]:.2f}')
+    fig.canvas.draw()
+    fig.canvas.flush_events()
+
+# Cost of one frame with the legacy full redraw and with LivePlot (blitted, decimated), one row added per frame
+def bench_plot(sizes=(2000, 20000, 200000), frames=30):
+    import matplotlib.pyplot as plt
+    results = {'sizes': list(sizes), 'legacy_ms_per_frame': [], 'blit_ms_per_frame': [], 'blit_full_draws': []}
+    for size in sizes:
+        elapsed = np.arange(size + frames, dtype=float)
+        temperatures = 2 + 0.2 / 60 * elapsed
+        x2 = 1e-6 * np.sin(elapsed / 30)
+        y2 = 1e-6 * np.cos(elapsed / 30)
+
+        series = LiveSeries(size)
+        for row in zip(elapsed[:size].tolist(), temperatures[:size].tolist(), x2[:size].tolist(), y2[:size].tolist()):
+            series.add(*row)
+        fig, axes = plt.subplots(3, 1)
+        lines = [ax.plot([], [])[0] for ax in axes]
+        start = time.perf_counter()
+        for i in range(size, size + frames):
+            series.add(elapsed[i], temperatures[i], x2[i], y2[i])
+            legacy_redraw(fig, lines, axes, series)
+        results['legacy_ms_per_frame'].append(1000 * (time.perf_counter() - start) / frames)
+        plt.close(fig)
+
+        plot = LivePlot(size, fps=0, show=False)
+        for row in zip(elapsed[:size].tolist(), temperatures[:size].tolist(), x2[:size].tolist(), y2[:size].tolist()):
+            plot.add(*row)
+        plot.update()
+        full_draws = plot.full_draws
+        start = time.perf_counter()
+        for i in range(size, size + frames):
+            plot.add(elapsed[i], temperatures[i], x2[i], y2[i])
+            plot.update()
+        results['blit_ms_per_frame'].append(1000 * (time.perf_counter() - start) / frames)
+        results['blit_full_draws'].append(plot.full_draws - full_draws)
+        plot.close()
+    return results
+
+# Writes a synthetic MPMS log of about size bytes, rows every interval seconds ending now. Rows
+# are fixed width (Comment,Time,Temperature (K) and extra_columns constant columns like the
+# other MPMS channels) and built as one byte matrix per block of rows, so even a gigabyte is
+# written in seconds.
+def write_synthetic_log(path, size, interval=0.5, extra_columns=0, block_rows=1 << 20):
+    extra = b',0.0000' * extra_columns
+    row = 23 + len(extra)  # ',' + 10.3 digit time + ',' + 1.4 digit temperature + extra columns + newline
+    rows = max(size // row, 1)
+    last_ms = int(time.time() * 1000)
+    first_ms = last_ms - int(interval * 1000) * (rows - 1)
+    with open(path, 'wb') as file:
+        names = ''.join(f',Channel {i + 1}' for i in range(extra_columns))
+        file.write(f'[Header]\nTITLE,Synthetic MPMS log\n[Data]\nComment,Time,Temperature (K){names}\n'.encode())
+        for start in range(0, rows, block_rows):
+            index = np.arange(start, min(start + block_rows, rows), dtype=np.int64)
+            ms = first_ms + int(interval * 1000) * index
+            kelvin = 20000 + (index * 7) % 70000  # 1e-4 K units, 2 K to 9 K sawtooth
+            block = np.empty((len(index), row), np.uint8)
+            block[:, 0] = ord(',')
+            block[:, 1:11] = (ms // 1000)[:, None] // 10 ** np.arange(9, -1, -1) % 10 + 48
+            block[:, 11] = ord('.')
+            block[:, 12:15] = (ms % 1000)[:, None] // 10 ** np.arange(2, -1, -1) % 10 + 48
+            block[:, 15] = ord(',')
+            block[:, 16] = kelvin // 10000 + 48
+            block[:, 17] = ord('.')
+            block[:, 18:22] = (kelvin % 10000)[:, None] // 10 ** np.arange(3, -1, -1) % 10 + 48
+            block[:, 22:-1] = np.frombuffer(extra, np.uint8)
+            block[:, -1] = ord('\n')
+            file.write(block.tobytes())
+    return rows
+
+# Reading the newest row and parsing a whole historical log: the legacy readlines() reader and the
+# line-by-line LogTailer against the mmap LogScanner. The legacy paths hold the whole file in memory,
+# so they run on a legacy_size log only; rates are per MB.
+def bench_scan(size=1 << 30, legacy_size=128 << 20, extra_columns=8, folder=None):
+    with tempfile.TemporaryDirectory(dir=folder) as directory:
+        path = os.path.join(directory, 'log.csv')
+        legacy_path = os.path.join(directory, 'legacy_log.csv')
+        rows = write_synthetic_log(path, size, extra_columns=extra_columns)
+        write_synthetic_log(legacy_path, legacy_size, extra_columns=extra_columns)
+        legacy_mb = os.path.getsize(legacy_path) / 2 ** 20
+        scan_mb = os.path.getsize(path) / 2 ** 20
+
+        start = time.perf_counter()
+        legacy_get_latest_temperature(legacy_path)
+        legacy_latest = time.perf_counter() - start
+        start = time.perf_counter()
+        with LogScanner(path) as scanner:
+            scanner.latest()
+        scanner_latest = time.perf_counter() - start
+
+        tailer = LogTailer(legacy_path, bulk_bytes=legacy_size + 1)
+        start = time.perf_counter()
+        tailer.read_new()
+        tailer_parse = time.perf_counter() - start
+        tailer.close()
+        parsed = 0
+        start = time.perf_counter()
+        with LogScanner(path) as scanner:
+            for _, times, _ in scanner.chunks():
+                parsed += len(times)
+        scanner_parse = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'log_mb': scan_mb,
+        'legacy_latest_ms_per_mb': 1e3 * legacy_latest / legacy_mb,
+        'legacy_latest_ms_at_log_size': 1e3 * legacy_latest / legacy_mb * scan_mb,
+        'scanner_latest_ms': 1e3 * scanner_latest,
+        'tailer_parse_mb_per_s': legacy_mb / tailer_parse,
+        'scanner_parse_mb_per_s': scan_mb / scanner_parse,
+        'scanner_rows_parsed': parsed,
+    }
+
+# First read of a large log when acquisition starts hours into it (rows from the last hour only):
+# a full parse against seeking through a LogIndex that is built on the spot or loaded from its cache
+def bench_index(size=1 << 30, recent_hours=1.0, extra_columns=8, folder=None):
+    with tempfile.TemporaryDirectory(dir=folder) as directory:
+        path = os.path.join(directory, 'log.csv')
+        write_synthetic_log(path, size, extra_columns=extra_columns)
+        start_time = time.time() - 3600 * recent_hours
+        results = {'log_mb': os.path.getsize(path) / 2 ** 20}
+        for name, use_index in (('full_parse', False), ('index_build', True), ('index_cached', True)):
+            tailer = LogTailer(path, start_time, use_index=use_index)
+            start = time.perf_counter()
+            times, _ = tailer.read_new()
+            results[f'{name}_s'] = time.perf_counter() - start
+            results[f'{name}_rows'] = len(times)
+            tailer.close()
+    return results
+
+# Size on disk, write cost and reload time of the same rows as CSV and as columnar chunks
+def bench_storage(rows=100000, folder=None):
+    with tempfile.TemporaryDirectory(dir=folder) as directory:
+        times = time.time() + np.arange(rows, dtype=float)
+        temperatures = 2 + 0.2 / 60 * np.arange(rows)
+        x2 = 1e-6 * np.sin(np.arange(rows) / 30)
+        y2 = 1e-6 * np.cos(np.arange(rows) / 30)
+        csv_path = os.path.join(directory, 'Full_Data.csv')
+        columns_path = os.path.join(directory, 'Full_Data.columns')
+
+        start = time.perf_counter()
+        with BufferedCsvWriter(csv_path, 'w') as writer:
+            for row in zip(times.tolist(), temperatures.tolist(), x2.tolist(), y2.tolist()):
+                writer.writerow([datetime.fromtimestamp(row[0]), *row[1:]])
+        csv_write = time.perf_counter() - start
+        start = time.perf_counter()
+        with ColumnarWriter(columns_path, stepper_columns()) as writer:
+            for row in zip(times.tolist(), temperatures.tolist(), x2.tolist(), y2.tolist()):
+                writer.append(*row, 1.6e-3, 1)
+        columnar_write = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with open(csv_path, 'r', newline='') as file:
+            loaded = [(datetime.fromisoformat(row[0]).timestamp(), float(row[1]), float(row[2]), float(row[3])) for row in csv.reader(file)]
+        csv_read = time.perf_counter() - start
+        start = time.perf_counter()
+        read_columns(columns_path)
+        columnar_read = time.perf_counter() - start
+        csv_bytes = os.path.getsize(csv_path)
+        columnar_bytes = sum(os.path.getsize(os.path.join(columns_path, name)) for name in os.listdir(columns_path))
+    return {
+        'rows': len(loaded),
+        'csv_bytes': csv_bytes,
+        'columnar_bytes': columnar_bytes,
+        'csv_write_us_per_row': 1e6 * csv_write / rows,
+        'columnar_write_us_per_row': 1e6 * columnar_write / rows,
+        'csv_reload_s': csv_read,
+        'columnar_reload_s': columnar_read,
+    }
+
+# Milliseconds spent importing modules, from the self times python -X importtime reports
+def import_time_ms(report):
+    total = 0
+    for line in report.splitlines():
+        fields = line.split('|')[0].partition(':')[2].strip()
+        if line.startswith('import time:') and fields.isdigit():
+            total += int(fields)
+    return total / 1000
+
+# Start-up cost in fresh interpreters (best of repeats), up to the first reading: the baseline script, which imported
+# pyvisa, matplotlib and numpy and read the settings at the top of the file; a session with plot windows and a
+# headless one, each loading the modules live_readout imports; and importing Get_Data_Stepper alone
+def bench_startup(repeats=5):
+    folder = os.path.dirname(os.path.abspath(__file__))
+    settings = os.path.join(folder, 'settings.txt')
+    setup = f"import sys; sys.path.insert(0, {folder!r}); "
+    session = "import Get_Data_Stepper, Lockin_session, Time_index, Log_tailer, Log_watcher, Pipeline"
+    cases = {
+        'baseline': setup + f"import pyvisa, matplotlib.pyplot, numpy, csv; open({settings!r}).readlines()",
+        'plot': setup + session + f", Live_plot, History; Get_Data_Stepper.load_settings({settings!r})",
+        'headless': setup + session + f"; Get_Data_Stepper.load_settings({settings!r}, headless_mode=True)",
+        'import': setup + "import Get_Data_Stepper",
+    }
+    results = {}
+    for name, code in cases.items():
+        import_times = []
+        start_times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code + "; print('matplotlib' in sys.modules)"],
+                                       capture_output=True, text=True, check=True)
+            start_times.append(time.perf_counter() - start)
+            import_times.append(import_time_ms(completed.stderr))
+        results[f'{name}_import_ms'] = min(import_times)
+        results[f'{name}_start_ms'] = 1000 * min(start_times)
+        results[f'{name}_matplotlib'] = completed.stdout.strip() == 'True'
+    return results
+
+BENCHES = (bench_startup, bench_snapshot, bench_oscillator, bench_capture, bench_csv_writer, bench_log_latency, bench_trend,
+           bench_tail, bench_scan, bench_index, bench_growth, bench_plot, bench_storage, bench_pipeline, bench_memory, bench_replay)
+
+if __name__ == "__main__":
+    import matplotlib
+    matplotlib.use('Agg')
+    # python Benchmarks.py [results.json] - results are also printed
+    output = sys.argv[1] if len(sys.argv) > 1 else f'benchmark_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
+    results = {
+        'date': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'benchmarks': {},
+    }
+    for bench in BENCHES:
+        print(bench.__name__)
+        results['benchmarks'][bench.__name__] = values = bench()
+        for name, value in values.items():
+            print(f'  {name}: {value:.4g}' if isinstance(value, float) else f'  {name}: {value}')
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f'Results saved to {output}')
@@ -0,0 +1,118 @@
+import time
+import numpy as np
+
+# CAPTURECFG code and column names for each capture configuration of the SR865A
+CAPTURE_CONFIGS = {
+    'X': (0, ('x',)),
+    'XY': (1, ('x', 'y')),
+    'RT': (2, ('r', 'theta')),
+    'XYRT': (3, ('x', 'y', 'r', 'theta')),
+}
+
+# Decodes an IEEE 488.2 definite-length block (#<digits><length><data>) of little-endian float32 values
+def decode_block(raw):
+    if raw[:1] != b'#':
+        raise ValueError(f"Not a binary block: {raw[:16]!r}")
+    digits = int(raw[1:2])
+    length = int(raw[2:2 + digits])
+    return np.frombuffer(raw, dtype='<f4', count=length // 4, offset=2 + digits)
+
+# Streams the SR865A internal capture buffer: the instrument samples at a fixed rate
+# in continuous mode and drain() reads everything captured since the last call in
+# whole-kilobyte binary blocks
+class CaptureStream:
+    def __init__(self, lockin, rate_divider=0, config='XY', buffer_kb=256, max_block_kb=64):
+        """
+        Parameters:
+        lockin: Open session (or stand-in instrument) providing write, query and query_raw.
+        rate_divider (int): Capture rate is the maximum rate divided by 2**rate_divider (0-20).
+        config (str): Captured parameters, one of CAPTURE_CONFIGS.
+        buffer_kb (int): Capture buffer length in kilobytes (2-4096; the kilobyte being written is never read).
+        max_block_kb (int): Largest block requested per CAPTUREGET? (the SR865A limit is 64).
+        """
+        self.lockin = lockin
+        self.rate_divider = int(rate_divider)
+        self.config = config
+        self.config_code, self.columns = CAPTURE_CONFIGS[config]
+        self.buffer_kb = int(buffer_kb)
+        if self.buffer_kb < 2:
+            raise ValueError(f"Capture buffer of {buffer_kb} kB is too small, at least 2 kB are needed")
+        self.max_block_kb = int(max_block_kb)
+        self.samples_per_kb = 1024 // (4 * len(self.columns))
+        self.rate = None
+        self.start_time = None
+
+    # Configures the buffer and starts a continuous, immediately triggered capture
+    def arm(self):
+        self.lockin.write('CAPTURESTOP')
+        self.lockin.write(f'CAPTURELEN {self.buffer_kb}')
+        self.lockin.write(f'CAPTURECFG {self.config_code}')
+        self.lockin.write(f'CAPTURERATE {self.rate_divider}')
+        self.rate = float(self.lockin.query('CAPTURERATEMAX?')) / 2 ** self.rate_divider
+        before = time.time()
+        self.lockin.write('CAPTURESTART 1,0')
+        after = time.time()
+        self.start_time = (before + after) / 2  # Sample 0 is taken when the capture starts
+        self.kb_read = 0
+        self.total_bytes = 0
+
+    def stop(self):
+        self.lockin.write('CAPTURESTOP')
+
+    # Total bytes written since arm(). CAPTUREBYTES? is the write position in the circular buffer, so
+    # the number of wraps comes from the samples the elapsed time accounts for: of the totals at that
+    # position, the one closest to the expected count (and not below the last one) is taken. Any number
+    # of wraps between two calls is counted this way.
+    def _bytes_written(self):
+        captured = int(float(self.lockin.query('CAPTUREBYTES?')))
+        buffer_bytes = self.buffer_kb * 1024
+        expected = (time.time() - self.start_time) * self.rate * 4 * len(self.columns)
+        wraps = max(round((expected - captured) / buffer_bytes), 0)
+        total = wraps * buffer_bytes + captured
+        while total < self.total_bytes:
+            total += buffer_bytes
+        self.total_bytes = total
+        return total
+
+    # Reads all complete kilobytes captured since the last call
+    def drain(self):
+        """
+        Returns:
+        tuple: (times, values) where times are epoch seconds derived from the capture
+        rate and values has one column per entry of self.columns. Must be called more
+        often than once per buffer length (buffer_kb * samples_per_kb / rate seconds),
+        otherwise the oldest data is overwritten before it is read and skipped.
+        """
+        available_kb = self._bytes_written() // 1024 - self.kb_read
+        # With the buffer full, the oldest kilobyte is the one the instrument is writing over, so at most
+        # buffer_kb - 1 kilobytes can be read
+        if available_kb > self.buffer_kb - 1:
+            print(f"Capture buffer overrun: skipped {available_kb - (self.buffer_kb - 1)} kB")
+            self.kb_read += available_kb - (self.buffer_kb - 1)
+            available_kb = self.buffer_kb - 1
+
+        first_sample = self.kb_read * self.samples_per_kb
+        blocks = []
+        while available_kb > 0:
+            offset = self.kb_read % self.buffer_kb
+            count = min(available_kb, self.max_block_kb, self.buffer_kb - offset)
+            blocks.append(decode_block(self.lockin.query_raw(f'CAPTUREGET? {offset},{count}')))
+            self.kb_read += count
+            available_kb -= count
+
+        values = np.concatenate(blocks) if blocks else np.empty(0, dtype='<f4')
+        values = values.reshape(-1, len(self.columns)).astype(float)
+        times = self.start_time + (first_sample + np.arange(len(values))) / self.rate
+        return times, values
+
+# Expands a drained capture batch to X, Y, R, theta columns, deriving whichever pair was not captured
+def to_lockin_columns(values, columns):
+    data = dict(zip(columns, values.T))
+    if 'x' not in data and 'r' in data:
+        data['x'] = data['r'] * np.cos(np.radians(data['theta']))
+        data['y'] = data['r'] * np.sin(np.radians(data['theta']))
+    x = data['x']
+    y = data.get('y', np.zeros(len(values)))
+    r = data.get('r', np.hypot(x, y))
+    theta = data.get('theta', np.degrees(np.arctan2(y, x)))
+    return np.column_stack([x, y, r, theta])
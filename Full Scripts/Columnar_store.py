@@ -0,0 +1,160 @@
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from datetime import datetime
+import numpy as np
+
+SCHEMA_FILE = 'columns.json'
+
+# Typed columns of the stepper's binary output; extra lock-ins add an x2/y2 pair each after y2
+BASE_COLUMNS = [('timestamp', '<f8'), ('temperature', '<f8'), ('x2', '<f8'), ('y2', '<f8')]
+RUN_COLUMNS = [('dc_offset', '<f8'), ('run', '<i4')]
+
+# Column names and types for the main lock-in plus extra lock-in addresses, with the detection harmonic
+# of every row when the harmonic changes during the session
+def stepper_columns(extra_addresses=(), harmonic=False):
+    columns = list(BASE_COLUMNS)
+    for address in extra_addresses:
+        columns += [(f'x2 {address}', '<f8'), (f'y2 {address}', '<f8')]
+    if harmonic:
+        columns.append(('harmonic', '<i4'))
+    return columns + RUN_COLUMNS
+
+# Append-only columnar dataset: a folder of compressed .npz chunks, one array per column,
+# and a columns.json schema holding the column types and the CSV banner and header, so the
+# CSV file can be reproduced exactly (export_csv). Rows are kept in preallocated arrays and
+# written as one chunk when chunk_rows are waiting or flush_interval seconds have passed.
+class ColumnarWriter:
+    def __init__(self, folder, columns, banner=(), csv_header=(), chunk_rows=4096, flush_interval=60.0, resume_until=None):
+        """
+        Parameters:
+        folder (str): Dataset folder, created if needed; chunks of an earlier dataset there are removed.
+        columns (list): (name, numpy dtype) of every column, timestamp (epoch seconds) first.
+        banner (list): Lines written above the column header by export_csv.
+        csv_header (list): Column header of the CSV export (one name per column up to the lock-in values).
+        chunk_rows (int): Rows per chunk.
+        flush_interval (float): Longest time in seconds rows wait in memory.
+        resume_until (float): Continue the dataset already in folder, keeping its rows up to this timestamp
+        (later ones are removed) and its schema; None to start a new dataset.
+        """
+        self.folder = folder
+        self.columns = [(name, np.dtype(dtype)) for name, dtype in columns]
+        self.chunk_rows = chunk_rows
+        self.flush_interval = flush_interval
+        os.makedirs(folder, exist_ok=True)
+        for path in glob.glob(os.path.join(folder, 'chunk_*.npz.tmp')):
+            os.remove(path)
+        chunks = sorted(glob.glob(os.path.join(folder, 'chunk_*.npz')))
+        keep = self._keep_until(chunks, resume_until) if resume_until is not None else 0
+        for path in chunks[keep:]:
+            os.remove(path)
+        if resume_until is None or not os.path.exists(os.path.join(folder, SCHEMA_FILE)):
+            schema = {
+                'created': datetime.now().isoformat(),
+                'columns': [[name, dtype.str] for name, dtype in self.columns],
+                'banner': list(banner),
+                'csv_header': list(csv_header),
+            }
+            with open(os.path.join(folder, SCHEMA_FILE), 'w') as file:
+                json.dump(schema, file, indent=2)
+        self.arrays = {name: np.empty(chunk_rows, dtype) for name, dtype in self.columns}
+        self.count = 0
+        self.chunks = keep
+        self.last_flush = time.monotonic()
+        self.closed = False
+
+    # Number of leading chunks holding only rows up to until; the chunk where later rows start is cut short
+    def _keep_until(self, chunks, until):
+        time_column = self.columns[0][0]
+        for index, path in enumerate(chunks):
+            with np.load(path) as chunk:
+                arrays = {name: chunk[name] for name in chunk.files}
+            keep = arrays[time_column] <= until
+            if keep.all():
+                continue
+            if not keep.any():
+                return index
+            with open(path + '.tmp', 'wb') as file:
+                np.savez_compressed(file, **{name: array[keep] for name, array in arrays.items()})
+            os.replace(path + '.tmp', path)
+            return index + 1
+        return len(chunks)
+
+    # One row, values in column order
+    def append(self, *values):
+        for (name, _), value in zip(self.columns, values):
+            self.arrays[name][self.count] = value
+        self.count += 1
+        if self.count == self.chunk_rows:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    # Writes waiting rows once flush_interval seconds have passed since the last flush, for when rows stop arriving
+    def flush_if_due(self):
+        if self.count and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    # Writes waiting rows as a new chunk; the chunk only appears once it is complete (and on disk with sync)
+    def flush(self, sync=False):
+        if self.count:
+            path = os.path.join(self.folder, f'chunk_{self.chunks:06d}.npz')
+            with open(path + '.tmp', 'wb') as file:
+                np.savez_compressed(file, **{name: array[:self.count] for name, array in self.arrays.items()})
+                if sync:
+                    file.flush()
+                    os.fsync(file.fileno())
+            os.replace(path + '.tmp', path)
+            self.chunks += 1
+            self.count = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+            self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def read_schema(folder):
+    with open(os.path.join(folder, SCHEMA_FILE), 'r') as file:
+        return json.load(file)
+
+# Loads a whole dataset as {column name: array}
+def read_columns(folder):
+    schema = read_schema(folder)
+    parts = {name: [] for name, _ in schema['columns']}
+    for path in sorted(glob.glob(os.path.join(folder, 'chunk_*.npz'))):
+        with np.load(path) as chunk:
+            for name in parts:
+                parts[name].append(chunk[name])
+    return {name: np.concatenate(arrays) if arrays else np.empty(0, dtype)
+            for (name, dtype), arrays in zip(schema['columns'], parts.values())}
+
+# Writes a dataset as the CSV create_run_file/append_to_run_file would have produced
+def export_csv(folder, filename):
+    schema = read_schema(folder)
+    data = read_columns(folder)
+    names = [name for name, _ in schema['columns']][1:len(schema['csv_header'])]
+    with open(filename, 'w', newline='') as file:
+        writer = csv.writer(file)
+        for line in schema['banner']:
+            writer.writerow([line])
+        writer.writerow(schema['csv_header'])
+        columns = [data[name].tolist() for name in names]
+        for timestamp, *values in zip(data['timestamp'].tolist(), *columns):
+            writer.writerow([datetime.fromtimestamp(timestamp), *values])
+
+if __name__ == "__main__":
+    # python Columnar_store.py <dataset folder> [output.csv]
+    folder = sys.argv[1].rstrip('/\\')
+    output = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(folder)[0] + '_export.csv'
+    export_csv(folder, output)
+    print(f'Exported {folder} to {output}')
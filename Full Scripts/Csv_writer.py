@@ -0,0 +1,91 @@
+import bisect
+import csv
+import os
+import time
+
+# Keeps a CSV file open for the whole run and writes rows in batches.
+# Buffered rows are written out once flush_rows are waiting or flush_interval
+# seconds have passed since the last flush, and always on flush()/close(). Writers
+# whose rows can stop arriving call flush_if_due() now and then so the interval holds.
+# The byte offset of every flushed batch is kept, so rows already on disk can be
+# read back by row number (read_rows) without scanning the file. before_flush is
+# called ahead of every batch written, e.g. to flush files that must not fall behind.
+class BufferedCsvWriter:
+    def __init__(self, filename, mode='a', flush_rows=100, flush_interval=5.0, before_flush=None):
+        self.filename = filename
+        self.before_flush = before_flush
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.file = open(filename, mode, newline='')
+        self.writer = csv.writer(self.file)
+        self.rows = []
+        self.last_flush = time.monotonic()
+        self.row_count = 0      # Rows passed to writerow since the file was opened
+        self.flushed_rows = 0   # Rows of those already written to the file
+        self.checkpoints = []   # (row number, byte offset) at the start of every flushed batch
+
+    def writerow(self, row):
+        self.rows.append(row)
+        self.row_count += 1
+        if len(self.rows) >= self.flush_rows:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    # Flushes buffered rows once flush_interval seconds have passed since the last flush
+    def flush_if_due(self):
+        if self.rows and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    # Writes buffered rows and hands them to the operating system; sync also waits until they are on disk
+    def flush(self, sync=False):
+        batch = None
+        if self.rows:
+            if self.before_flush is not None:
+                self.before_flush()
+            batch = (self.flushed_rows, self.file.tell())
+            self.writer.writerows(self.rows)
+        self.file.flush()
+        # Readers on other threads only learn about the batch once its bytes have reached the file
+        if batch is not None:
+            self.checkpoints.append(batch)
+            self.flushed_rows += len(self.rows)
+            self.rows.clear()
+        if sync:
+            os.fsync(self.file.fileno())
+        self.last_flush = time.monotonic()
+
+    # Bytes written to the file so far (after a flush, its size)
+    def tell(self):
+        return self.file.tell()
+
+    # Rows first to last (exclusive, counted from the first writerow) that are already on disk, as
+    # lists of strings; safe to call from another thread while rows are being written
+    def read_rows(self, first, last):
+        last = min(last, self.flushed_rows)
+        if first >= last:
+            return []
+        checkpoints = self.checkpoints[:]
+        index = bisect.bisect_right(checkpoints, (first, float('inf'))) - 1
+        row_number, offset = checkpoints[index]
+        with open(self.filename, 'rb') as file:
+            file.seek(offset)
+            lines = []
+            for line in file:
+                if row_number >= first:
+                    lines.append(line.decode('utf-8', errors='replace'))
+                row_number += 1
+                if row_number >= last:
+                    break
+        return list(csv.reader(lines))
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,118 @@
+import math
+import time
+import numpy as np
+
+# Stand-in for an SRS865A session: answers the commands used by the scripts and
+# sleeps for a fixed bus latency on every transaction, like a GPIB round trip.
+# The capture buffer is emulated from the wall clock and served as synthetic
+# IEEE 488.2 binary blocks.
+class FakeLockin:
+    def __init__(self, latency=0.01, amplitude=1e-6, period=60.0, capture_rate_max=1.25e6):
+        self.latency = latency
+        self.amplitude = amplitude
+        self.period = period
+        self.settings = {'SOFF': 0.0, 'SLVL': 0.001, 'FREQ': 1000.0, 'HARM': 1, 'OFLT': 10, 'OFSL': 1}
+        self.channels = [0, 1, 2, 3]
+        self.queries = 0
+        self.writes = 0
+        self.capture_rate_max = capture_rate_max
+        self.capture = {'CAPTURELEN': 256, 'CAPTURECFG': 1, 'CAPTURERATE': 0}
+        self.capture_start = None
+        self.capture_stop = None
+
+    # Parameter values the instrument would report at the current time (X, Y, R, theta, IN1-IN4)
+    def _parameters(self):
+        phase = 2 * math.pi * time.time() / self.period
+        x = self.amplitude * math.cos(phase)
+        y = self.amplitude * math.sin(phase)
+        return [x, y, math.hypot(x, y), math.degrees(math.atan2(y, x)), 0.0125, -0.0031, 0.0002, 0.0]
+
+    # Synthetic capture samples for absolute sample indices, interleaved like the instrument
+    def capture_values(self, indices):
+        rate = self.capture_rate_max / 2 ** self.capture['CAPTURERATE']
+        phase = 2 * np.pi * indices / (rate * self.period)
+        x = self.amplitude * np.cos(phase)
+        y = self.amplitude * np.sin(phase)
+        columns = {0: [x], 1: [x, y], 2: [np.hypot(x, y), np.degrees(np.arctan2(y, x))],
+                   3: [x, y, np.hypot(x, y), np.degrees(np.arctan2(y, x))]}[self.capture['CAPTURECFG']]
+        return np.column_stack(columns).astype('<f4')
+
+    def _capture_width(self):
+        return {0: 1, 1: 2, 2: 2, 3: 4}[self.capture['CAPTURECFG']]
+
+    # Bytes written since CAPTURESTART, before wrapping into the circular buffer
+    def _capture_total_bytes(self):
+        if self.capture_start is None:
+            return 0
+        end = self.capture_stop if self.capture_stop is not None else time.time()
+        rate = self.capture_rate_max / 2 ** self.capture['CAPTURERATE']
+        return int((end - self.capture_start) * rate) * 4 * self._capture_width()
+
+    # One write may hold several commands separated by ';', like on the instrument
+    def write(self, command):
+        time.sleep(self.latency)
+        self.writes += 1
+        for part in command.split(';'):
+            self._command(part.strip())
+
+    def _command(self, command):
+        name, _, args = command.partition(' ')
+        if name in self.capture:
+            self.capture[name] = int(args)
+        elif name == 'CAPTURESTART':
+            self.capture_start = time.time()
+            self.capture_stop = None
+        elif name == 'CAPTURESTOP':
+            if self.capture_start is not None and self.capture_stop is None:
+                self.capture_stop = time.time()
+        elif name == 'CDSP':
+            channel, parameter = (int(value) for value in args.split(','))
+            self.channels[channel] = parameter
+        elif name in self.settings:
+            self.settings[name] = float(args)
+
+    def query(self, command):
+        time.sleep(self.latency)
+        self.queries += 1
+        name, _, args = command.partition(' ')
+        if name == 'OUTP?':
+            return f'{self._parameters()[int(args)]:.6e}'
+        if name == 'SNAPD?':
+            parameters = self._parameters()
+            return ','.join(f'{parameters[channel]:.6e}' for channel in self.channels)
+        if name == 'SNAP?':
+            parameters = self._parameters()
+            return ','.join(f'{parameters[int(index)]:.6e}' for index in args.split(','))
+        if name.rstrip('?') in self.settings:
+            return f'{self.settings[name.rstrip("?")]:.6e}'
+        if name == 'CAPTURERATEMAX?':
+            return f'{self.capture_rate_max:.6e}'
+        if name == 'CAPTUREBYTES?':
+            return str(self._capture_total_bytes() % (self.capture['CAPTURELEN'] * 1024))
+        if name == '*IDN?':
+            return 'Stanford_Research_Systems,SR865A,000000,fake'
+        raise ValueError(f'FakeLockin does not understand {command!r}')
+
+    # Serves CAPTUREGET? i,j: j kilobytes starting at buffer kilobyte i, from the most recent pass over the buffer
+    def query_raw(self, command):
+        time.sleep(self.latency)
+        self.queries += 1
+        name, _, args = command.partition(' ')
+        if name != 'CAPTUREGET?':
+            return (self.query(command) + '\n').encode()
+        offset_kb, count_kb = (int(value) for value in args.split(','))
+        buffer_bytes = self.capture['CAPTURELEN'] * 1024
+        position = offset_kb * 1024
+        end = position + count_kb * 1024
+        total = self._capture_total_bytes()
+        if end > total:
+            raise ValueError('CAPTUREGET? past the captured data')
+        start = position + buffer_bytes * ((total - end) // buffer_bytes)
+        bytes_per_sample = 4 * self._capture_width()
+        first = start // bytes_per_sample
+        payload = self.capture_values(np.arange(first, first + count_kb * 1024 // bytes_per_sample)).tobytes()
+        length = str(len(payload))
+        return b'#' + str(len(length)).encode() + length.encode() + payload + b'\n'
+
+    def close(self):
+        pass
@@ -1,10 +1,26 @@
-import pyvisa
-import matplotlib.pyplot as plt
-import numpy as np
-import time
-import csv
+import argparse
+import bisect
+import math
 import os
+import time
 from datetime import datetime
+from types import SimpleNamespace
+from Csv_writer import BufferedCsvWriter
+from Trend_detector import TrendDetector
+from Settle_detector import SettleDetector, lockin_settling_time
+from Sweep_plan import SweepPlan, parse_axis
+from Interleave import Interleaver
+from Run_state_machine import RunStateMachine, ARMED, RECORDING, STEPPING
+from Journal import Journal, last_checkpoint
+# numpy, pyvisa and the modules built on them are imported by the code that uses them, so importing this
+# module (or starting a headless session) only loads what that session needs
+
+# Command line: python Get_Data_Stepper.py [--settings settings.txt] [--headless]
+def parse_command_line(argv=None):
+    parser = argparse.ArgumentParser(description='Records lock-in readings against the MPMS temperature log.')
+    parser.add_argument('--settings', help='settings file to use instead of the one on the lab PC')
+    parser.add_argument('--headless', action='store_true', help='run without plot windows (matplotlib is never imported)')
+    return parser.parse_args(argv)
 
 #read configuration file
 def read_config(file_path):
@@ -25,242 +41,715 @@ def read_config(file_path):
             config[key] = value
     return config
 
-# Create a new run file in the output folder
-def create_run_file(run_number, dc_offset, run):
+# Lines above the column header of a run file - details are further lines describing the run (e.g. its sweep point)
+def run_file_banner(run_number, dc_offset, details=()):
+    return ["-----------------------------------------------------------",
+            datetime.now().strftime("%B %d %Y %I:%M%p"),
+            "Run: "+ str(run_number)+". DC_offset: "+str(dc_offset)+ str("V"),
+            *details,
+            "-----------------------------------------------------------"]
+
+# Column header of a run file - harmonic adds the detection harmonic each row was measured at
+def run_file_header(config, harmonic=False):
+    header = ['Timestamp', 'Temperature (K)', 'Vx', 'Vy']
+    for address in config.extra_lock_in_addresses:
+        header += [f'Vx {address}', f'Vy {address}']
+    if harmonic:
+        header.append('Harmonic')
+    return header
+
+# Run_N.csv, or Run_N_<label>.csv for one of several series recorded in the same run
+def run_file_name(config, run_number, run, label=None):
     if run==True:
-        filename = os.path.join(output_folder, f'Run_{run_number}.csv')
-    else:
-        filename = output_file
-    with open(filename, 'w+', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(["-----------------------------------------------------------"])
-        writer.writerow([datetime.now().strftime("%B %d %Y %I:%M%p")])
-        writer.writerow(["Run: "+ str(run_number)+". DC_offset: "+str(dc_offset)+ str("V")])
-        writer.writerow(["-----------------------------------------------------------"])
-        writer.writerow(['Timestamp', 'Temperature (K)', 'Vx', 'Vy'])
-    return filename
-
-# Read new temperature lines from the log.csv file
-def get_new_temperature_lines(file_path, last_position, start_time):
-    with open(file_path, 'r') as file:
-        file.seek(last_position)
-        lines = file.readlines()
-        last_position = file.tell()
-
-    data = []
-    for line in lines:
-        parts = line.strip().split(',')
-        if len(parts) > 1:
-            try:
-                timestamp = int(float(parts[0]))
-                temperature = float(parts[1])
-                latest_timestamp = datetime.fromtimestamp(timestamp)
-                if latest_timestamp >= start_time:
-                    data.append((latest_timestamp, temperature))
-            except ValueError:
-                continue
-    return data, last_position
-
-# Append new temperature and voltage data to the current run file
-def append_to_run_file(filename, timestamp, temperature, voltage_data):
-    with open(filename, 'a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([timestamp, temperature, voltage_data[0], voltage_data[1]])
-
-# Returns reading from Lock-in Data - A list with 2 values
-def read_lockin_data(address):
-    #rm = pyvisa.ResourceManager()
-    #lockin = rm.open_resource(address)
+        suffix = f'_{label}' if label is not None else ''
+        return os.path.join(config.output_folder, f'Run_{run_number}{suffix}.csv')
+    return config.output_file
+
+# Writer of a run file. Run files are only flushed along with the Full Data Log (see live_readout), so after a
+# crash they never hold rows the Full Data Log is missing, nor miss rows it has
+def open_run_file(config, filename, mode, run):
+    if run==True:
+        return BufferedCsvWriter(filename, mode, math.inf, math.inf)
+    return BufferedCsvWriter(filename, mode, config.csv_flush_rows, config.csv_flush_interval)
+
+# Create a new run file in the output folder - returns a writer that stays open until closed
+def create_run_file(config, run_number, dc_offset, run, label=None, details=()):
+    filename = run_file_name(config, run_number, run, label)
+    writer = open_run_file(config, filename, 'w', run)
+    for line in run_file_banner(run_number, dc_offset, details):
+        writer.writerow([line])
+    writer.writerow(run_file_header(config, full_data_harmonic(config, run)))
+    writer.flush()
+    return writer
+
+# Timestamp of a run file line in epoch seconds, None for banner and header lines
+def run_file_row_time(line):
+    try:
+        return datetime.fromisoformat(line.split(b',', 1)[0].decode('utf-8', errors='replace')).timestamp()
+    except ValueError:
+        return None
+
+# Where the complete rows of a run file measured up to until (all of them for None) end, read from the end of the file
+def run_file_end(filename, until=None, block=1 << 16):
+    """
+    Returns:
+    tuple: (byte offset after the last row kept, its timestamp or None when no row is kept).
+    """
+    with open(filename, 'rb') as file:
+        size = file.seek(0, os.SEEK_END)
+        start = size
+        while True:
+            start = max(start - block, 0)
+            file.seek(start)
+            data = file.read(size - start)
+            end = data.rfind(b'\n') + 1  # A last line without its newline was cut short by the crash
+            while end > 0:
+                line_start = data.rfind(b'\n', 0, end - 1) + 1
+                if line_start == 0 and start > 0:
+                    break  # The line starts before this block
+                timestamp = run_file_row_time(data[line_start:end])
+                if timestamp is None or until is None or timestamp <= until:
+                    return start + end, timestamp
+                end = line_start
+            if start == 0:
+                return 0, None
+
+# Reopen a run file after a crash - every complete row measured up to until is kept, a partly written last line is cut off
+def resume_run_file(config, run_number, run, until=None, label=None):
+    """
+    Returns:
+    tuple: (writer appending to the file, timestamp of its last row or None).
+    """
+    filename = run_file_name(config, run_number, run, label)
+    end, last_time = run_file_end(filename, until)
+    with open(filename, 'r+b') as file:
+        file.truncate(end)
+    return open_run_file(config, filename, 'a', run), last_time
+
+# Binary columnar copy of a run file (a .columns folder next to the CSV) - None unless columnar_output is set.
+# With resume_until, continues the copy written before a crash, keeping its rows up to that time.
+def create_columnar_file(config, run_number, dc_offset, run, resume_until=None, label=None, details=()):
+    if not config.columnar_output:
+        return None
+    from Columnar_store import ColumnarWriter, stepper_columns
+    folder = os.path.splitext(run_file_name(config, run_number, run, label))[0] + '.columns'
+    harmonic = full_data_harmonic(config, run)
+    return ColumnarWriter(folder, stepper_columns(config.extra_lock_in_addresses, harmonic),
+                          run_file_banner(run_number, dc_offset, details), run_file_header(config, harmonic),
+                          flush_interval=config.columnar_flush_interval, resume_until=resume_until)
+
+# The Full Data Log says which harmonic each row was measured at when harmonics are interleaved (run files hold one each),
+# 0 for rows next to a change
+def full_data_harmonic(config, run):
+    return run != True and bool(config.harmonics)
+
+# Append new temperature and voltage data to an open run file writer (harmonic only for a file with a Harmonic column)
+def append_to_run_file(writer, timestamp, temperature, voltage_data, harmonic=None):
+    row = [timestamp, temperature, *voltage_data]
+    if harmonic is not None:
+        row.append(harmonic)
+    writer.writerow(row)
+
+# Append a row to an open columnar writer - timestamp in epoch seconds, with the DC offset applied and the run number (0 between runs)
+def append_to_columnar_file(writer, timestamp, temperature, voltage_data, dc_offset, run_number, harmonic=None):
+    if writer is not None:
+        extra = (harmonic,) if harmonic is not None else ()
+        writer.append(timestamp, temperature, *voltage_data, *extra, dc_offset, run_number)
+
+# Returns one simultaneous Lock-in reading (X, Y, R, theta) - None if the query failed
+def read_lockin_snapshot(config, address):
+    import pyvisa
+    from Lockin_session import get_session, read_snapshot
+    lockin = get_session(address, config.visa_backend)
     try:
-        x2 = 5#float(lockin.query('OUTP? 0'))  # Query X2 (in-phase 2nd Harm)
-        y2 = 5#float(lockin.query('OUTP? 1'))  # Query Y2 (out-of-phase 2nd Harm)
-        voltage_data = [x2, y2]
-        return voltage_data
+        return read_snapshot(lockin)
     except pyvisa.VisaIOError as e:
         print(f"An error occurred: {e}")
-        return [None, None]
-    #finally:
-        #lockin.close()
-
-# Detects trend in temperature data
-def detect_trend(temperatures, tolerance):
-    last_60_temps = temperatures[-60:]
-    if len(last_60_temps) < 2:
-        return "Not enough data"
-    
-    x_values = np.arange(len(last_60_temps))
-    y_values = np.array(last_60_temps)
-    slope, _ = np.polyfit(x_values, y_values, 1)
-
-    if abs(slope) < tolerance:
-        return "steady"
-    elif slope > 0:
-        return "warming"
-    else:
-        return "cooling"
-    
+        return None
+
+# Returns one Lock-in snapshot as a batch - epoch time and X, Y, R, theta columns (empty if the query failed)
+def read_lockin_batch(config, address):
+    import numpy as np
+    snapshot = read_lockin_snapshot(config, address)
+    if snapshot is None:
+        return np.empty(0), np.empty((0, 4))
+    return np.array([snapshot.timestamp.timestamp()]), np.array([snapshot[1:5]])
+
+# Returns the Lock-in readings captured by the instrument buffer since the last call - epoch times and X, Y, R, theta columns
+def read_capture_batch(capture_stream):
+    import numpy as np
+    import pyvisa
+    from Capture_stream import to_lockin_columns
+    try:
+        times, values = capture_stream.drain()
+    except pyvisa.VisaIOError as e:
+        print(f"An error occurred: {e}")
+        return np.empty(0), np.empty((0, 4))
+    return times, to_lockin_columns(values, capture_stream.columns)
+
+# How each oscillator setting is reported when it is changed
+OSCILLATOR_LABELS = {'SOFF': ('DC offset', 'V'), 'SLVL': ('AC amplitude', 'V'), 'FREQ': ('frequency', 'Hz'),
+                     'HARM': ('detection harmonic', '')}
+
 #Set Lock-in settings
-def set_oscillator_parameters(address, dc_offset, ac_amplitude, frequency):
+def set_oscillator_parameters(config, address, dc_offset, ac_amplitude, frequency, harmonic=None):
     """
     Set the internal oscillator parameters for the SRS865A lock-in amplifier.
+    Only the parameters that differ from the instrument's current ones are sent, in one write.
     
     Parameters:
+    config: Settings from load_settings.
     address (str): GPIB address of the lock-in amplifier.
     dc_offset (float): DC offset voltage in volts.
     ac_amplitude (float): AC amplitude voltage in volts.
     frequency (float): Frequency in hertz.
+    harmonic (int): Detection harmonic, None to leave it as it is.
     """
-    # Initialize the VISA resource manager
-    rm = pyvisa.ResourceManager()
-    
-    # Open a connection to the SRS865A lock-in amplifier
-    lockin = rm.open_resource(address)
+    import pyvisa
+    from Lockin_session import get_settings_cache
+    # The cache of the session opened for this address knows what the instrument is set to
+    settings = get_settings_cache(address, config.visa_backend, config.oscillator_verify)
     
     try:
-        # Set DC offset
-        lockin.write(f'SOFF {dc_offset}')
-        print(f'Set DC offset to {dc_offset} V')
-        
-        # Set AC amplitude
-        lockin.write(f'SLVL {ac_amplitude}')
-        print(f'Set AC amplitude to {ac_amplitude} V')
-        
-        # Set frequency
-        lockin.write(f'FREQ {frequency}')
-        print(f'Set frequency to {frequency} Hz')
+        values = {'SOFF': dc_offset, 'SLVL': ac_amplitude, 'FREQ': frequency}
+        if harmonic is not None:
+            values['HARM'] = int(harmonic)
+        changed = settings.apply(**values)
+        for name, value in changed.items():
+            label, unit = OSCILLATOR_LABELS[name]
+            print(f'Set {label} to {value} {unit}'.rstrip())
 
     except pyvisa.VisaIOError as e:
         print(f"An error occurred: {e}")
-    finally:
-        # Close the connection to the lock-in amplifier
-        lockin.close()
+
+# The sweep campaign from the sweep_* settings, None when only the DC offset is stepped
+def create_sweep_plan(config):
+    axes = {name: parse_axis(config.settings[key]) for name, key in (('SOFF', 'sweep_dc_offset'), ('SLVL', 'sweep_ac_voltage'),
+                                                              ('FREQ', 'sweep_frequency')) if key in config.settings}
+    if not axes:
+        return None
+    # Settings that are not swept keep their single value
+    axes.setdefault('SOFF', [config.dc_offset])
+    axes.setdefault('SLVL', [config.ac_voltage])
+    axes.setdefault('FREQ', [config.frequency])
+    plan = SweepPlan(axes, config.sweep_points_per_ramp, os.path.join(config.output_folder, 'sweep_state.json'))
+    print(f"Sweep of {len(plan.points)} points in {len(plan)} ramps, {len(plan.completed)} ramps done")
+    return plan
+
+# Banner line describing a sweep point
+def sweep_point_details(point):
+    return [f"AC amplitude: {point['SLVL']}V. Frequency: {point['FREQ']}Hz"]
+
+# Slots of a run: each oscillator setting once per detection harmonic when harmonics are interleaved
+def harmonic_slots(config, points):
+    if not config.harmonics:
+        return list(points)
+    return [dict(point, HARM=harmonic) for point in points for harmonic in config.harmonics]
+
+# File label of each slot of a run (None for a single plain series): the point number when several oscillator
+# settings share the run, H<n> for the harmonic - Run_N_2_H3.csv is the third harmonic of the second point
+def slot_labels(slots):
+    points = []
+    for slot in slots:
+        point = {name: value for name, value in slot.items() if name != 'HARM'}
+        if point not in points:
+            points.append(point)
+    labels = []
+    for slot in slots:
+        parts = []
+        if len(points) > 1:
+            parts.append(str(points.index({name: value for name, value in slot.items() if name != 'HARM'}) + 1))
+        if 'HARM' in slot:
+            parts.append(f"H{slot['HARM']}")
+        labels.append('_'.join(parts) or None)
+    return labels
+
+# Longest output filter settling time of the lock-ins in seconds - 0 if it could not be read
+def read_settling_time(config):
+    import pyvisa
+    from Lockin_session import get_session
+    try:
+        return max(lockin_settling_time(get_session(address, config.visa_backend))
+                   for address in [config.lock_in_address] + config.extra_lock_in_addresses)
+    except pyvisa.VisaIOError as e:
+        print(f"An error occurred: {e}")
+        return 0.0
 
 # Records live data to file and plots newly added data
-def live_readout():
-    timestamps = []
-    temperatures = []
-    x2_vals = []
-    y2_vals = []
-    voltage_readings = []
-
-    fig, (ax1, ax2, ax3) = plt.subplots(3, 1)
-    fig.suptitle('Live Data Readout')
-    line1, = ax1.plot([], [], 'r')
-    line2, = ax2.plot([], [], 'g')
-    line3, = ax3.plot([], [], 'b')
-    ax1.set_ylabel('Temperature (K)')
-    ax2.set_ylabel('Second Harmonic In-phase (V)')
-    ax3.set_xlabel('Time (s)')
-    ax3.set_ylabel('Second Harmonic Out-of-phase (V)')
-    fig.show()
-
-    last_position = 0
-    plot_counter = 0
-    trend_counter = 0
-    current_dc_offset = dc_offset
+def live_readout(config, full_data, full_columns=None, journal=None, checkpoint=None):
+    import pyvisa
+    from Lockin_session import get_session, get_settings_cache, configure_snapshot
+    from Time_index import TimeIndex
+    from Log_tailer import LogTailer
+    from Log_watcher import LogWatcher
+    from Pipeline import Pipeline
+    plot = None
+    history = None
+    history_plot = None
+    if not config.headless:
+        # matplotlib is only imported when there are windows to draw
+        from Live_plot import LivePlot, HistoryPlot
+        from History import HistoryPyramid
+        # Most recent rows for plotting, redrawn at most plot_fps times a second (main thread)
+        plot = LivePlot(config.plot_window, config.plot_fps)
+        if config.history_refresh > 0:
+            # Temperature, X2 and Y2 of the whole session, zoomable down to the rows in Full_Data.csv. With interleaved
+            # harmonics only the first one is kept, and zooms stop at the rows still in memory (the file holds them all)
+            history = HistoryPyramid(3, writer=None if config.harmonics else full_data)
+            history_plot = HistoryPlot(history, config.history_refresh)
+    # Temperature slope over the last trend_window seconds, updated on every row (writer thread)
+    trend_detector = TrendDetector(config.trend_window, config.tolerance)
+    # Lock-in readings (X, Y, R, theta) indexed by time for joining with temperature rows
+    voltage_readings = TimeIndex(4, config.join_policy, config.max_skew)
+    # Longest a row waits for a reading after it, and how far from a row the reading joined with it can be
+    hold = config.max_skew if config.max_skew is not None else 2.0
+    # Holds an armed run until the lock-in outputs have settled after the oscillator change
+    settle = SettleDetector(config.settle_tolerance, config.settle_points, timeout=config.settle_timeout or None)
+
+    last_trend = None
+    current_dc_offset = config.dc_offset
     run_number = 1
-    recording = False
-    current_run_file = None
-
-    # Matches the time stamps in the temperature log with lock-in readings
-    def match_readings(temperature_data, voltage_readings, file):
-        for temp_time, temp in temperature_data:
-            closest_time = min(voltage_readings, key=lambda x: abs(x[0] - temp_time))
-            append_to_run_file(file, temp_time, temp, closest_time[1])
-            timestamps.append(temp_time)
-            temperatures.append(temp)
-            x2_vals.append(closest_time[1][0])
-            y2_vals.append(closest_time[1][1])
-
-            if len(timestamps) > 2000:
-                timestamps.pop(0)
-                temperatures.pop(0)
-                x2_vals.pop(0)
-                y2_vals.pop(0)
-
-    while True:
-        voltage_reading = read_lockin_data(lock_in_address)
-        voltage_readings.append((datetime.now(), voltage_reading))
-        new_data, last_position = get_new_temperature_lines(input_file, last_position, start_time)
-
-        if new_data:
-            match_readings(new_data, voltage_readings, output_file)
-            if recording:
-                match_readings(new_data, voltage_readings, current_run_file)
-
-            time_elapsed = [(t - timestamps[0]).total_seconds() for t in timestamps]
-
-            if plot_counter == 0:
-                line1.set_data(time_elapsed, temperatures)
-                line2.set_data(time_elapsed, x2_vals)
-                line3.set_data(time_elapsed, y2_vals)
-
-                ax1.set_xlim(0, max(time_elapsed) + 1)
-                ax1.set_ylim(min(temperatures) - 1, max(temperatures) + 1)
-                ax1.set_title(f'Current Temperature: {temperatures[-1]:.2f} K')
-                ax1.set_xticks([])
-
-                ax2.set_xlim(0, max(time_elapsed) + 1)
-                ax2.set_ylim(min(x2_vals), max(x2_vals))
-                ax2.set_title(f'Current Reading: {x2_vals[-1]:.2f} V')
-                ax2.set_xticks([])
-
-                ax3.set_xlim(0, max(time_elapsed) + 1)
-                ax3.set_ylim(min(y2_vals), max(y2_vals))
-                ax3.set_title(f'Current Reading: {y2_vals[-1]:.2f} V')
-
-                fig.canvas.draw()
-                fig.canvas.flush_events()
-                plot_counter = 0
-            else:
-                plot_counter += 1
-
-            if trend_counter == 15:
-                trend = detect_trend(temperatures, tolerance)
-                print(trend+': '+str(datetime.now()))
-                if trend == "steady":
-                    if not recording and abs(temperatures[-1]-temp_min)<=0.01:
-                        set_oscillator_parameters(lock_in_address, current_dc_offset, ac_voltage, frequency)
-                        current_run_file = create_run_file(run_number, current_dc_offset, True)
-                        recording = True
-                        run_number += 1
-                    elif recording and abs(temperatures[-1]-temp_max) <= 0.01:
-                        recording = False
-                        set_oscillator_parameters(lock_in_address, 0.001, 0.001, frequency)
-                        current_dc_offset += dc_step
-                        print("DC offset set to: "+str(current_dc_offset))
-                trend_counter = 0
+    # Sweep campaign and the oscillator settings (slots) of the current run, interleaved when there are several
+    sweep = create_sweep_plan(config)
+    sweep_done = sweep is not None and sweep.next_ramp() is None
+    current_ramp = None
+    run_slots = []
+    interleaver = None
+    row_clock = time.time  # Time base of the rows; a replay goes by the newest row, however fast it runs
+    replay_source = None  # Lock-in readings of a replay
+    # Run file and columnar copy of each slot of the current run
+    run_files = {}
+    run_columns = {}
+    current_run = 0
+    applied_dc_offset = float('nan')
+    # (time, harmonic) of the latest harmonic changes, for labelling rows measured before they are processed
+    harmonic_switches = []
+    rows_recorded = 0
+    last_recorded = None
+    last_row_time = None
+
+    # Sends one slot's oscillator settings; a harmonic change is dated before it is sent
+    def apply_slot(slot):
+        nonlocal applied_dc_offset
+        if 'HARM' in slot:
+            note_harmonic(slot['HARM'])
+        set_oscillator_parameters(config, config.lock_in_address, slot['SOFF'], slot['SLVL'], slot['FREQ'], slot.get('HARM'))
+        applied_dc_offset = slot['SOFF']
+        # The replayed outputs respond to the change like the instrument's
+        if replay_source is not None and row_clock() is not None:
+            replay_source.step(row_clock())
+
+    # Remembers when the harmonic changed; the first one known covers every earlier row
+    def note_harmonic(harmonic):
+        nonlocal harmonic_switches
+        if harmonic_switches and harmonic_switches[-1][1] == harmonic:
+            return
+        now = row_clock() if harmonic_switches else None
+        # A new list, so the plotting thread never sees it half updated
+        harmonic_switches = harmonic_switches[-63:] + [(now if now is not None else -math.inf, harmonic)]
+
+    # Detection harmonic the main lock-in was set to when a row was measured, None if harmonics are not interleaved.
+    # The reading joined with a row can be up to hold seconds away on either side, so a row that close to a change
+    # is labelled 0: its values may have been measured at either harmonic
+    def harmonic_at(timestamp):
+        switches = harmonic_switches
+        index = bisect.bisect_right(switches, (timestamp + hold, math.inf)) - 1
+        if index < 0:
+            return None
+        return switches[index][1] if switches[index][0] < timestamp - hold else 0
+
+    # Opens (or after a crash, with the time of the last row kept, reopens) the run file of every slot of a run
+    def open_run_files(run, resume_until=None):
+        for index, (slot, label) in enumerate(zip(run_slots, slot_labels(run_slots))):
+            details = list(sweep_point_details(slot)) if sweep is not None else []
+            if 'HARM' in slot:
+                details.append(f"Harmonic: {slot['HARM']}")
+            if resume_until is None:
+                run_files[index] = create_run_file(config, run, slot['SOFF'], True, label, details)
             else:
-                trend_counter += 1
+                run_files[index], _ = resume_run_file(config, run, True, resume_until, label)
+            run_columns[index] = create_columnar_file(config, run, slot['SOFF'], True, resume_until, label, details)
+
+    # Puts the rows of the run files on disk; called before every batch of the Full Data Log is written
+    def flush_run_files():
+        for writer in list(run_files.values()):
+            writer.flush()
+
+    full_data.before_flush = flush_run_files
+
+    def close_run_files():
+        for writer in list(run_files.values()) + list(run_columns.values()):
+            if writer is not None:
+                writer.close()
+        run_files.clear()
+        run_columns.clear()
+
+    # Entering ARMED: set the oscillator for the next sweep point(s) and open their run files
+    def start_run(machine):
+        nonlocal run_number, current_run, current_ramp, run_slots
+        if sweep is not None:
+            current_ramp = sweep.next_ramp()
+            run_slots = harmonic_slots(config, sweep.ramp(current_ramp))
+        else:
+            run_slots = harmonic_slots(config, [{'SOFF': current_dc_offset, 'SLVL': config.ac_voltage, 'FREQ': config.frequency}])
+        apply_slot(run_slots[0])
+        settle.start(machine.timestamp, read_settling_time(config))
+        full_data.flush()
+        open_run_files(run_number)
+        current_run = run_number
+        run_number += 1
+
+    # Cycles the slots of the run, dropping rows for a filter settling time (plus a reading) after each switch,
+    # and rows whose reading may have been taken on the other side of one
+    def start_interleaving(settling_time):
+        nonlocal interleaver
+        guard = settling_time + config.loop_interval
+        if len(run_slots) > 1 and config.sweep_dwell <= guard + 2 * hold:
+            print(f"sweep_dwell ({config.sweep_dwell} s) is not longer than the settling time after a switch ({guard:.1f} s) "
+                  f"plus the join window on both sides of it ({2 * hold:.1f} s), no rows will be recorded")
+        interleaver = Interleaver(run_slots, config.sweep_dwell, apply_slot, guard, row_clock, skew=hold)
+        interleaver.start()
+
+    # Entering RECORDING: the outputs settled, report how long that took and start cycling the slots
+    def begin_recording(machine):
+        reason = "timed out" if settle.timed_out else "settled"
+        print(f"Lock-in {reason} after {settle.wait():.1f} s (filter settling time {settle.settling_time:.2f} s)")
+        start_interleaving(settle.settling_time)
+
+    # Entering STEPPING: close the run files, park the oscillator and move on to the next DC offset or sweep ramp
+    def end_run(machine):
+        nonlocal current_dc_offset, current_run, interleaver, sweep_done
+        close_run_files()
+        interleaver = None
+        finished_run = current_run
+        current_run = 0
+        full_data.flush()
+        park = {'SOFF': 0.001, 'SLVL': 0.001, 'FREQ': run_slots[-1]['FREQ']}
+        if config.harmonics:
+            park['HARM'] = config.harmonics[0]
+        apply_slot(park)
+        if sweep is not None:
+            sweep.complete(current_ramp, finished_run)
+            print(f"Sweep ramp {current_ramp + 1} of {len(sweep)} done")
+            sweep_done = sweep.next_ramp() is None
+        else:
+            current_dc_offset += config.dc_step
+            print("DC offset set to: "+str(current_dc_offset))
+
+    run_state = RunStateMachine(config.temp_min, config.temp_max, config.temp_band, config.temp_band_exit,
+                                config.settle_dwell, config.stop_dwell,
+                                on_enter={ARMED: start_run, RECORDING: begin_recording, STEPPING: end_run},
+                                ready=lambda machine: settle.settled(machine.timestamp))
 
-        time.sleep(0.5)
+    # Continue the session of a checkpoint: run bookkeeping, state machine, open run files and oscillator
+    if checkpoint is not None:
+        run_number = checkpoint['run_number']
+        current_dc_offset = checkpoint['current_dc_offset']
+        current_run = checkpoint['current_run']
+        applied_dc_offset = checkpoint['applied_dc_offset']
+        last_row_time = checkpoint['last_row_time']
+        current_ramp = checkpoint['current_ramp']
+        run_slots = checkpoint['run_slots']
+        run_state.restore(checkpoint['run_state'])
+        if current_run:
+            open_run_files(current_run, last_row_time)
+            apply_slot(run_slots[0])
+            # An interrupted run starts its slot cycle (or its wait for the outputs to settle) again
+            settle.start(last_row_time, read_settling_time(config))
+            if run_state.recording:
+                start_interleaving(settle.settling_time)
+        elif applied_dc_offset == 0.001:
+            set_oscillator_parameters(config, config.lock_in_address, 0.001, 0.001,
+                                      run_slots[-1]['FREQ'] if run_slots else config.frequency)
+        print(f"Resumed in {run_state.state} after {datetime.fromtimestamp(last_row_time)}, next run {run_number}")
 
-#Paths and settings from settings.txt file
-settings_file = r'C:\Users\bpkro\OneDrive\Escritorio\Chi-2\settings.txt'
-settings = read_config(settings_file)
+    # Between runs the main lock-in stays at the first harmonic, the one that is plotted
+    if config.harmonics and not harmonic_switches:
+        try:
+            cache = get_settings_cache(config.lock_in_address, config.visa_backend, config.oscillator_verify)
+            if cache.apply(HARM=config.harmonics[0]):
+                print(f'Set detection harmonic to {config.harmonics[0]}')
+        except pyvisa.VisaIOError as e:
+            print(f"An error occurred: {e}")
+        note_harmonic(config.harmonics[0])
 
-input_file=r'C:\Users\bpkro\OneDrive\Escritorio\Chi-2\log.csv'
-output_file=r'C:\Users\bpkro\OneDrive\Escritorio\Chi-2\Full_Data.csv'
-output_folder=r'C:\Users\bpkro\OneDrive\Escritorio\Chi-2\Run Files'
+    # Everything needed to continue after the last written row; the CSV files are put on disk first, while the
+    # columnar copies keep their own chunk schedule and only their chunks already written are journaled
+    def save_checkpoint():
+        for writer in run_files.values():
+            writer.flush(sync=True)
+        full_data.flush(sync=True)
+        journal.record({
+            'time': datetime.now().isoformat(),
+            'last_row_time': last_row_time,
+            'tailer': tailer.resume_state(last_row_time),
+            'run_state': run_state.snapshot(),
+            'run_number': run_number,
+            'current_dc_offset': current_dc_offset,
+            'current_run': current_run,
+            'applied_dc_offset': applied_dc_offset,
+            'current_ramp': current_ramp,
+            'run_slots': run_slots,
+        })
 
-temp_min = float(settings['temp_min'])
-temp_max = float(settings['temp_max'])
-ac_voltage = float(settings['ac_voltage'])
-dc_offset = float(settings['dc_offset'])
-dc_step = float(settings['dc_step'])
-frequency = float(settings['frequency'])
+    # Starts or ends runs from the temperature trend, checked after every row
+    def update_run_state(temp_time, temp):
+        nonlocal last_trend
+        trend = trend_detector.trend()
+        if trend.state != last_trend:
+            print(f"{trend.state} ({trend.slope:.3f} K/min): {datetime.now()}")
+            last_trend = trend.state
+        transitions = run_state.update(temp_time, temp, trend)
+        for _, source, target in transitions:
+            print(f"{source} -> {target}: {datetime.now()}")
+        return transitions
 
-# GPIB address of the lock-in amplifier
-lock_in_address = 'GPIB0::13::INSTR'
-start_time = datetime.now()  # Record the start time of the script
-tolerance = float(settings['warming_ramp_rate'])/60*0.2  #Tolerance for temperature change(20% of smallest expected slope)
+    # Writes a matched batch to every open file and steps through the runs (called by the writer stage)
+    def record_rows(batch):
+        nonlocal rows_recorded, last_recorded, last_row_time
+        rows_recorded += len(batch.times)
+        last_recorded = time.monotonic()
+        for temp_time, temp, values in zip(batch.times.tolist(), batch.temperatures.tolist(), batch.values.tolist()):
+            last_row_time = temp_time
+            # X and Y of each lock-in, main lock-in first
+            voltage_data = [value for index, value in enumerate(values) if index % 4 < 2]
+            # Rows of a run go to the file of the slot they were measured in, none while it settles after a switch.
+            # They are written ahead of the Full Data Log, whose flushes take the run files along
+            slot = None
+            if run_state.recording:
+                interleaver.poll()
+                slot = interleaver.slot_at(temp_time)
+            if slot is not None:
+                append_to_run_file(run_files[slot], datetime.fromtimestamp(temp_time), temp, voltage_data)
+                append_to_columnar_file(run_columns[slot], temp_time, temp, voltage_data, run_slots[slot]['SOFF'], current_run)
+            harmonic = harmonic_at(temp_time)
+            append_to_run_file(full_data, datetime.fromtimestamp(temp_time), temp, voltage_data, harmonic)
+            append_to_columnar_file(full_columns, temp_time, temp, voltage_data, applied_dc_offset, current_run, harmonic)
+            if history is not None and (harmonic is None or harmonic == config.harmonics[0]):
+                history.add(temp_time, (temp, voltage_data[0], voltage_data[1]))
+            trend_detector.add(temp_time, temp)
+            if run_state.state == ARMED:
+                settle.add(temp_time, voltage_data)
+            # Every run start and end is journaled at once, everything else on the journal's schedule
+            if update_run_state(temp_time, temp) and journal is not None:
+                save_checkpoint()
+        if journal is not None and journal.due():
+            save_checkpoint()
+
+    # Keeps the flush intervals while no rows arrive (called by the writer stage, so never alongside record_rows);
+    # the run files go along with the Full Data Log
+    def flush_due_files():
+        full_data.flush_if_due()
+        for writer in [full_columns] + list(run_columns.values()):
+            if writer is not None:
+                writer.flush_if_due()
+
+    readout_start = time.monotonic()
+    # Replay of a recorded log, hardware-buffered capture when a capture rate is configured, software-timed snapshots otherwise
+    capture_stream = None
+    replayer = None
+    if config.replay_log:
+        from Replay import ReplayClock, LogReplayer, ReplayLockin, load_lockin_trace
+        clock = ReplayClock()
+        row_clock = lambda: last_row_time
+        replayer = LogReplayer(config.replay_log, config.input_file, clock, config.replay_speed)
+        trace = load_lockin_trace(config.replay_lockin) if config.replay_lockin else None
+        replay_source = ReplayLockin(clock, config.loop_interval, trace)
+        read_batch = replay_source.read_batch
+        replayer.start()
+    elif config.capture_rate_divider is not None:
+        from Capture_stream import CaptureStream
+        capture_stream = CaptureStream(get_session(config.lock_in_address, config.visa_backend), config.capture_rate_divider,
+                                       buffer_kb=config.capture_buffer_kb)
+        capture_stream.arm()
+        read_batch = lambda: read_capture_batch(capture_stream)
+    else:
+        configure_snapshot(get_session(config.lock_in_address, config.visa_backend))
+        read_batch = lambda: read_lockin_batch(config, config.lock_in_address)
+
+    # Acquisition, log tailing, matching and file output run in their own threads; this thread only plots
+    tailer = LogTailer(config.input_file, config.start_time.timestamp())
+    if checkpoint is not None and not config.replay_log:
+        tailer.restore(checkpoint['tailer'])
+    watcher = LogWatcher(config.input_file)
+    if config.extra_lock_in_addresses:
+        # Several lock-ins: poll each one concurrently with the asyncio engine (asyncio is only imported for this)
+        from Async_engine import AsyncPipeline, PolledSource
+        sources = [PolledSource(config.lock_in_address, read_batch, config.loop_interval)]
+        for address in config.extra_lock_in_addresses:
+            configure_snapshot(get_session(address, config.visa_backend))
+            sources.append(PolledSource(address, lambda address=address: read_lockin_batch(config, address), config.loop_interval))
+        pipeline = AsyncPipeline(sources, tailer, watcher, record_rows, config.loop_interval, config.join_policy, config.max_skew, hold,
+                                 idle=flush_due_files)
+    else:
+        pipeline = Pipeline(read_batch, tailer, watcher, voltage_readings, record_rows, config.loop_interval, hold=hold, idle=flush_due_files)
+    pipeline.start()
+
+    last_batch = time.monotonic()
+    try:
+        while pipeline.running():
+            if sweep_done:
+                print("Sweep campaign complete")
+                break
+            batches = pipeline.ui_batches(timeout=0.1)
+            if not batches:
+                # Draws rows held back by the frame rate cap, otherwise just keeps the window responsive
+                if plot is not None and not plot.update():
+                    plot.canvas.flush_events()
+                if history_plot is not None:
+                    history_plot.update()
+                # A replay ends once the whole log is written and nothing more comes through
+                if replayer is not None and replayer.finished() and time.monotonic() - last_batch > hold + 2 * config.loop_interval:
+                    elapsed = (last_recorded or readout_start) - readout_start
+                    print(f"Replayed {rows_recorded} rows in {elapsed:.1f} s ({rows_recorded / max(elapsed, 1e-9):.0f} rows/s)")
+                    break
+                continue
+            last_batch = time.monotonic()
+            if plot is None:
+                continue
+            for batch in batches:
+                for temp_time, temp, values in zip(batch.times.tolist(), batch.temperatures.tolist(), batch.values.tolist()):
+                    # Only the first harmonic is plotted, the others are in their run files
+                    if config.harmonics and harmonic_at(temp_time) != config.harmonics[0]:
+                        continue
+                    plot.add(temp_time, temp, values[0], values[1])
+            plot.update()
+            if history_plot is not None:
+                history_plot.update()
+        pipeline.check()
+    finally:
+        pipeline.stop()
+        if replayer is not None:
+            replayer.stop()
+        watcher.close()
+        tailer.close()
+        if capture_stream is not None:
+            capture_stream.stop()
+        close_run_files()
+
+# Settings file of the lab PC, used when no other one is given on the command line
+LAB_SETTINGS_FILE = r'C:\Users\bpkro\OneDrive\Escritorio\Chi-2\settings.txt'
+
+#Paths and settings from settings.txt file - returned as the attributes of one object, which is passed to every function
+#above that needs them (nothing is read when the module is imported)
+def load_settings(settings_file=LAB_SETTINGS_FILE, headless_mode=False):
+    settings = read_config(settings_file)
+    config = SimpleNamespace(settings=settings)
+
+    # The log and output locations in the settings file, the lab PC's if it leaves them out
+    config.input_file = str(settings.get('input_file', r'C:\Users\bpkro\OneDrive\Escritorio\Chi-2\log.csv'))
+    config.output_file = str(settings.get('output_file', r'C:\Users\bpkro\OneDrive\Escritorio\Chi-2\Full_Data.csv'))
+    config.output_folder = str(settings.get('output_folder', r'C:\Users\bpkro\OneDrive\Escritorio\Chi-2\Run Files'))
+    # No plot windows (--headless, or headless=1 in the settings): for acquisition PCs without a display
+    config.headless = headless_mode or bool(settings.get('headless', 0))
+
+    # Offline replay: a recorded MPMS log is written into replay_log.csv in the output folder at replay_speed
+    # times real time (0 for as fast as possible) and tailed in place of the live log. Lock-in readings come
+    # from a recorded Full_Data.csv/run file (replay_lockin) or a synthetic signal, and the oscillator
+    # commands go to the simulated lock-in unless visa_backend says otherwise.
+    config.replay_log = str(settings.get('replay_log', ''))
+    config.replay_lockin = str(settings.get('replay_lockin', ''))
+    config.replay_speed = float(settings.get('replay_speed', 1))
+    if config.replay_log:
+        config.input_file = os.path.join(config.output_folder, 'replay_log.csv')
+
+    config.temp_min = float(settings['temp_min'])
+    config.temp_max = float(settings['temp_max'])
+    config.ac_voltage = float(settings['ac_voltage'])
+    config.dc_offset = float(settings['dc_offset'])
+    config.dc_step = float(settings['dc_step'])
+    config.frequency = float(settings['frequency'])
+    # Read the oscillator settings back after every change and resend any the instrument did not take
+    config.oscillator_verify = bool(settings.get('oscillator_verify', 0))
+    # An armed run starts recording once the output filter has settled and the last settle_points readings have stopped
+    # changing (by more than settle_tolerance, relative, or the noise); settle_timeout (s) caps the wait, 0 for no limit
+    config.settle_tolerance = float(settings.get('settle_tolerance', 0.01))
+    config.settle_points = int(settings.get('settle_points', 6))
+    config.settle_timeout = float(settings.get('settle_timeout', 120))
+    # Sweep campaign: sweep_dc_offset, sweep_ac_voltage and sweep_frequency ('start:stop:step' or a comma separated list)
+    # replace dc_offset/dc_step stepping. sweep_points_per_ramp grid points are interleaved in one warm-up, sweep_dwell
+    # seconds each; finished ramps are kept in sweep_state.json in the output folder so a campaign can be continued
+    config.sweep_points_per_ramp = int(settings.get('sweep_points_per_ramp', 1))
+    config.sweep_dwell = float(settings.get('sweep_dwell', 30))
+    # Detection harmonics cycled through during every run (comma separated, e.g. 1,2,3), each written to its own
+    # Run_N_H<n>.csv; empty to leave the harmonic as it is
+    config.harmonics = [int(value) for value in parse_axis(settings['harmonics'])] if str(settings.get('harmonics', '')).strip() else []
+
+    # GPIB address of the lock-in amplifier
+    config.lock_in_address = 'GPIB0::13::INSTR'
+    # VISA backend, left empty for the installed VISA library (set to a pyvisa-sim file + '@sim' to run without hardware);
+    # a replay drives the simulated lock-in unless it is set
+    config.visa_backend = str(settings.get('visa_backend', ''))
+    if config.replay_log and 'visa_backend' not in settings:
+        from Lockin_session import SIM_BACKEND
+        config.visa_backend = SIM_BACKEND
+    # Further lock-ins read alongside the main one, comma separated (for example a second harmonic on its own SR865A)
+    config.extra_lock_in_addresses = [address.strip() for address in str(settings.get('extra_lock_in_addresses', '')).split(',') if address.strip()]
+    # Capture buffer mode: rate is the instrument maximum / 2**capture_rate_divider (unset for one snapshot per loop)
+    config.capture_rate_divider = int(settings['capture_rate_divider']) if 'capture_rate_divider' in settings else None
+    config.capture_buffer_kb = int(settings.get('capture_buffer_kb', 256))
+    # How temperature rows are joined with lock-in readings: nearest, previous or linear, within max_skew seconds
+    config.join_policy = str(settings.get('join_policy', 'nearest'))
+    config.max_skew = float(settings['max_skew']) if 'max_skew' in settings else None
+    # Rows are written to disk in batches of csv_flush_rows, or after csv_flush_interval seconds
+    config.csv_flush_rows = int(settings.get('csv_flush_rows', 100))
+    config.csv_flush_interval = float(settings.get('csv_flush_interval', 5))
+    # Also write every file as compressed binary columns (a .columns folder per CSV), flushed every columnar_flush_interval seconds
+    config.columnar_output = bool(settings.get('columnar_output', 0))
+    config.columnar_flush_interval = float(settings.get('columnar_flush_interval', 60))
+    # Lock-in sampling interval, also the longest wait for a new log row between checks (seconds)
+    config.loop_interval = float(settings.get('loop_interval', 0.5))
+    # Number of most recent rows kept for the live plot
+    config.plot_window = int(settings.get('plot_window', 2000))
+    # Most redraws of the live plot per second
+    config.plot_fps = float(settings.get('plot_fps', 5))
+    # Seconds between redraws of the whole-session history window (0 to not open it)
+    config.history_refresh = float(settings.get('history_refresh', 10))
+    config.start_time = datetime.now()  # Record the start time of the script
+    config.tolerance = float(settings['warming_ramp_rate'])*0.2  #Tolerance for temperature change in K/min (20% of smallest expected slope)
+    config.trend_window = float(settings.get('trend_window', 60))  #Time window (s) the temperature slope is fitted over
+    # A target temperature counts as reached within temp_band (K); settling is abandoned beyond temp_band_exit
+    config.temp_band = float(settings.get('temp_band', 0.01))
+    config.temp_band_exit = float(settings.get('temp_band_exit', 0.05))
+    # Seconds the temperature must hold steady at temp_min before a run starts, and at temp_max before it ends
+    config.settle_dwell = float(settings.get('settle_dwell', 0))
+    config.stop_dwell = float(settings.get('stop_dwell', 0))
+    # Checkpoints go to session_journal.jsonl in the output folder every journal_interval seconds and at every
+    # run start and end; with resume set, the last checkpoint's session is continued instead of starting a new one
+    config.journal_interval = float(settings.get('journal_interval', 30))
+    config.resume = bool(settings.get('resume', 0))
+    return config
 
 
 if __name__ == "__main__":
-    #Create Full Data Log:
-    create_run_file(0,0,False)
+    command_line = parse_command_line()
+    config = load_settings(command_line.settings or LAB_SETTINGS_FILE, command_line.headless)
+    journal_file = os.path.join(config.output_folder, 'session_journal.jsonl')
+    checkpoint = last_checkpoint(journal_file) if config.resume else None
+    if checkpoint is None:
+        #Create Full Data Log:
+        full_data = create_run_file(config, 0,0,False)
+        full_columns = create_columnar_file(config, 0,0,False)
+    else:
+        #Continue the Full Data Log of the interrupted session
+        print(f"Resuming the session from the checkpoint of {checkpoint['time']}")
+        full_data, last_time = resume_run_file(config, 0, False)
+        # Rows written after the checkpoint are kept, the session continues after the last of them
+        if last_time is not None and (checkpoint['last_row_time'] is None or last_time > checkpoint['last_row_time']):
+            checkpoint['last_row_time'] = last_time
+            checkpoint['tailer']['after'] = last_time
+        full_columns = create_columnar_file(config, 0, 0, False, checkpoint['last_row_time'])
     #Creat run log folder
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
+    if not os.path.exists(config.output_folder):
+        os.makedirs(config.output_folder)
+    journal = Journal(journal_file, config.journal_interval, resume=checkpoint is not None)
     #Data Logging and Plotting
-    live_readout()
+    try:
+        live_readout(config, full_data, full_columns, journal, checkpoint)
+    finally:
+        full_data.close()
+        if full_columns is not None:
+            full_columns.close()
+        journal.close()
+        from Lockin_session import close_all
+        close_all()
@@ -0,0 +1,185 @@
+import threading
+from datetime import datetime
+import numpy as np
+from Ring_buffer import RingBuffer
+
+# Summaries of one pyramid level, one row per bucket, in preallocated arrays that double when full
+class PyramidLevel:
+    def __init__(self, width, capacity=256):
+        self.width = width
+        self.count = 0
+        self.start = np.empty(capacity)          # Time of the first row in the bucket
+        self.first_row = np.empty(capacity, dtype=np.int64)
+        self.low = np.empty((capacity, width))
+        self.low_time = np.empty((capacity, width))
+        self.high = np.empty((capacity, width))
+        self.high_time = np.empty((capacity, width))
+
+    def __len__(self):
+        return self.count
+
+    def append(self, start, first_row, low, low_time, high, high_time):
+        if self.count == len(self.start):
+            for name in ('start', 'first_row', 'low', 'low_time', 'high', 'high_time'):
+                old = getattr(self, name)
+                new = np.empty((2 * len(old),) + old.shape[1:], dtype=old.dtype)
+                new[:self.count] = old[:self.count]
+                setattr(self, name, new)
+        self.start[self.count] = start
+        self.first_row[self.count] = first_row
+        self.low[self.count] = low
+        self.low_time[self.count] = low_time
+        self.high[self.count] = high
+        self.high_time[self.count] = high_time
+        self.count += 1
+
+    # Merges buckets first to last into one summary
+    def merge(self, first, last):
+        columns = np.arange(self.width)
+        lows = self.low[first:last]
+        highs = self.high[first:last]
+        low_index = lows.argmin(axis=0)
+        high_index = highs.argmax(axis=0)
+        return (self.start[first], self.first_row[first],
+                lows[low_index, columns], self.low_time[first:last][low_index, columns],
+                highs[high_index, columns], self.high_time[first:last][high_index, columns])
+
+# Min/max pyramid over every row of the session, built incrementally as rows arrive. Level 0
+# summarises blocks of block rows, each further level merges factor buckets of the one below,
+# so any time range can be drawn from the coarsest level that still gives about max_points
+# points. Zooming in far enough reads the rows themselves back from the Full_Data.csv writer.
+class HistoryPyramid:
+    def __init__(self, width, block=64, factor=4, writer=None, recent=4096):
+        """
+        Parameters:
+        width (int): Values per row (temperature, X2, Y2 for the stepper).
+        block (int): Rows summarised by one level 0 bucket.
+        factor (int): Buckets of a level merged into one bucket of the next.
+        writer (BufferedCsvWriter): File every row is also written to, read for full resolution
+        (None to stop at level 0). add() must be called right after the row was written.
+        recent (int): Most recent rows kept in memory for the part of a zoom not yet flushed to disk.
+        """
+        self.width = width
+        self.block = block
+        self.factor = factor
+        self.writer = writer
+        self.row_base = None  # Writer row number of the first added row
+        self.origin = None    # Time of the first added row
+        self.rows = 0
+        self.pending = np.empty((block, 1 + width))
+        self.recent = RingBuffer(recent, ('row', 'time') + tuple(range(width)))
+        self.levels = [PyramidLevel(width)]
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.rows
+
+    # Adds one row: epoch time and width values
+    def add(self, timestamp, values):
+        with self.lock:
+            if self.origin is None:
+                self.origin = timestamp
+                if self.writer is not None:
+                    self.row_base = self.writer.row_count - 1
+            self.pending[self.rows % self.block] = (timestamp, *values)
+            self.recent.append((self.rows, timestamp, *values))
+            self.rows += 1
+            if self.rows % self.block == 0:
+                self._close_block()
+
+    def _close_block(self):
+        times = self.pending[:, 0]
+        values = self.pending[:, 1:]
+        columns = np.arange(self.width)
+        low_index = values.argmin(axis=0)
+        high_index = values.argmax(axis=0)
+        self.levels[0].append(times[0], self.rows - self.block, values[low_index, columns], times[low_index],
+                              values[high_index, columns], times[high_index])
+        # Carry complete groups of factor buckets up the pyramid
+        level = 0
+        while len(self.levels[level]) % self.factor == 0:
+            if level + 1 == len(self.levels):
+                self.levels.append(PyramidLevel(self.width))
+            count = len(self.levels[level])
+            self.levels[level + 1].append(*self.levels[level].merge(count - self.factor, count))
+            level += 1
+
+    def _bucket_rows(self, level):
+        return self.block * self.factor ** level
+
+    # Interleaved min/max points of buckets first to last of a level, in time order per column
+    def _bucket_points(self, level, first, last):
+        data = self.levels[level]
+        low_first = data.low_time[first:last] <= data.high_time[first:last]
+        times = np.where(low_first, data.low_time[first:last], data.high_time[first:last])
+        values = np.where(low_first, data.low[first:last], data.high[first:last])
+        later_times = np.where(low_first, data.high_time[first:last], data.low_time[first:last])
+        later_values = np.where(low_first, data.high[first:last], data.low[first:last])
+        return (np.stack([times, later_times], axis=1).reshape(-1, self.width),
+                np.stack([values, later_values], axis=1).reshape(-1, self.width))
+
+    # Rows first to last, from the writer's file where flushed and from memory after that
+    def _raw_rows(self, first, last):
+        parts = []
+        if self.writer is not None and self.row_base is not None:
+            flushed = self.writer.flushed_rows - self.row_base
+            for row in self.writer.read_rows(self.row_base + first, self.row_base + min(last, flushed)):
+                try:
+                    parts.append([datetime.fromisoformat(row[0]).timestamp()] + [float(value) for value in row[1:1 + self.width]])
+                except (ValueError, IndexError):
+                    continue
+            first = max(first, flushed)
+        recent = self.recent.view()
+        keep = (recent[:, 0] >= first) & (recent[:, 0] < last)
+        rows = np.vstack([np.array(parts, dtype=float).reshape(-1, 1 + self.width), recent[keep, 1:]])
+        return rows[:, :1].repeat(self.width, axis=1), rows[:, 1:]
+
+    # Points covering t0 to t1 (epoch seconds, None for the whole session)
+    def query(self, t0=None, t1=None, max_points=2000):
+        """
+        Returns:
+        tuple: (times, values), both (points, width) arrays; column j holds the points of value j.
+        At most about max_points points per column, full resolution when the range holds fewer rows.
+        """
+        with self.lock:
+            if self.rows == 0:
+                return np.empty((0, self.width)), np.empty((0, self.width))
+            t0 = -np.inf if t0 is None else t0
+            t1 = np.inf if t1 is None else t1
+            # First row of the range from level 0 (or the first pending row), last from the end of the session
+            base = self.levels[0]
+            first_bucket = max(int(np.searchsorted(base.start[:len(base)], t0, side='right')) - 1, 0)
+            first_row = int(base.first_row[first_bucket]) if len(base) else 0
+            last_bucket = int(np.searchsorted(base.start[:len(base)], t1, side='right'))
+            last_row = min(self.rows, last_bucket * self.block) if last_bucket < len(base) else self.rows
+            # Rows only come back from memory without a writer, and only the most recent ones
+            on_hand = self.writer is not None or first_row >= self.rows - len(self.recent)
+            if last_row - first_row <= max_points and on_hand:
+                times, values = self._raw_rows(first_row, last_row)
+            else:
+                level = 0
+                while level + 1 < len(self.levels) and 2 * (last_row - first_row) / self._bucket_rows(level) > max_points:
+                    level += 1
+                times, values = self._range_points(level, first_row, last_row)
+        keep = ((times >= t0) & (times <= t1)).any(axis=1)
+        return times[keep], values[keep]
+
+    # Points of a level from first_row to last_row, completed by finer levels and pending rows at the end
+    def _range_points(self, level, first_row, last_row):
+        parts_times = []
+        parts_values = []
+        row = first_row
+        for current in range(level, -1, -1):
+            size = self._bucket_rows(current)
+            first = row // size
+            last = min(len(self.levels[current]), last_row // size)
+            if last > first:
+                times, values = self._bucket_points(current, first, last)
+                parts_times.append(times)
+                parts_values.append(values)
+                row = last * size
+        if row < last_row:
+            times, values = self._raw_rows(row, last_row)
+            parts_times.append(times)
+            parts_values.append(values)
+        return np.vstack(parts_times), np.vstack(parts_values)
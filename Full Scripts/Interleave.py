@@ -0,0 +1,65 @@
+import bisect
+import math
+import time
+
+# Cycles the lock-in through several settings (slots) during one run, dwell seconds on each,
+# and tells which slot a row belongs to. Switch times are kept, so a row is tagged with the
+# slot that was active when it was measured however late it is processed. A row is joined
+# with a lock-in reading up to skew seconds away on either side, so rows within skew of a
+# switch (the reading may come from the other slot) and rows whose readings may fall within
+# guard seconds after a switch (outputs still settling) belong to no slot.
+class Interleaver:
+    def __init__(self, slots, dwell, apply, guard=0.0, clock=time.time, history=64, skew=0.0):
+        """
+        Parameters:
+        slots (list): Settings of each slot, passed to apply.
+        dwell (float): Seconds spent on each slot before switching to the next.
+        apply (callable): Sends a slot's settings to the instrument.
+        guard (float): Seconds after a switch whose readings are dropped.
+        clock (callable): Current time in the time base of the rows (epoch seconds, or the replay clock).
+        history (int): Switches remembered for tagging rows that are processed late.
+        skew (float): Largest distance in seconds between a row and the reading joined with it.
+        """
+        self.slots = list(slots)
+        self.dwell = dwell
+        self.apply = apply
+        self.guard = guard
+        self.skew = skew
+        self.clock = clock
+        self.history = history
+        self.current = 0
+        self.switch_times = [-math.inf]
+        self.switch_slots = [0]
+        self.last_switch = None
+
+    # Starts cycling with the first slot, which the caller has already applied
+    def start(self):
+        self.current = 0
+        self.switch_times = [-math.inf]
+        self.switch_slots = [0]
+        self.last_switch = self.clock()
+
+    # Moves on to the next slot once the current one has had its dwell time; True if it switched
+    def poll(self):
+        if len(self.slots) < 2 or self.last_switch is None:
+            return False
+        now = self.clock()
+        if now is None or now - self.last_switch < self.dwell:
+            return False
+        # The switch is dated before the settings are sent: no reading after that time is safe to tag with the old slot
+        switched = self.clock()
+        self.current = (self.current + 1) % len(self.slots)
+        self.apply(self.slots[self.current])
+        self.last_switch = switched
+        self.switch_times = self.switch_times[-self.history + 1:] + [self.last_switch]
+        self.switch_slots = self.switch_slots[-self.history + 1:] + [self.current]
+        return True
+
+    # Slot a row measured at timestamp belongs to, None when its reading may come from either side of
+    # a switch or from the outputs settling after one. Switches after the newest reading are not known
+    # yet, but no reading joined so far can have been taken after them.
+    def slot_at(self, timestamp):
+        index = bisect.bisect_right(self.switch_times, timestamp + self.skew) - 1
+        if index < 0 or timestamp - self.skew - self.switch_times[index] < self.guard:
+            return None
+        return self.switch_slots[index]
@@ -0,0 +1,62 @@
+import json
+import os
+import time
+
+# Append-only checkpoint journal: one JSON object per line, fsync'd as it is written. Callers
+# write a checkpoint when due() (every interval seconds) or on important events, after putting
+# their data files on disk, so the last complete line always describes data that survived.
+class Journal:
+    def __init__(self, path, interval=30.0, resume=False):
+        """
+        Parameters:
+        path (str): Journal file.
+        interval (float): Seconds between scheduled checkpoints (see due).
+        resume (bool): Keep the entries of an earlier session instead of starting a new journal.
+        """
+        self.path = path
+        self.interval = interval
+        # A line the crash cut short is dropped, so the next checkpoint starts on a line of its own
+        if resume and os.path.exists(path):
+            with open(path, 'r+b') as file:
+                file.truncate(complete_length(file))
+        self.file = open(path, 'a' if resume else 'w')
+        self.last_write = time.monotonic()
+
+    def due(self):
+        return time.monotonic() - self.last_write >= self.interval
+
+    # Appends a checkpoint and waits until it is on disk
+    def record(self, entry):
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.last_write = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+# Bytes of a file up to the end of its last complete line, found by reading backwards from the end
+def complete_length(file, block=1 << 16):
+    end = file.seek(0, os.SEEK_END)
+    while end > 0:
+        start = max(end - block, 0)
+        file.seek(start)
+        newline = file.read(end - start).rfind(b'\n')
+        if newline >= 0:
+            return start + newline + 1
+        end = start
+    return 0
+
+# Last complete checkpoint of a journal, None if there is none (a line cut short by a crash is skipped)
+def last_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    checkpoint = None
+    with open(path, 'r') as file:
+        for line in file:
+            try:
+                checkpoint = json.loads(line)
+            except ValueError:
+                continue
+    return checkpoint
@@ -0,0 +1,202 @@
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+from Ring_buffer import LiveSeries
+
+# (column, colour, y label, title format, y padding) of each panel; a padding of None
+# means 10% of the data range
+PANELS = (
+    ('temperature', 'r', 'Temperature (K)', 'Current Temperature: {:.2f} K', 1.0),
+    ('x2', 'g', 'Second Harmonic In-phase (V)', 'Current Reading: {:.2f} V', None),
+    ('y2', 'b', 'Second Harmonic Out-of-phase (V)', 'Current Reading: {:.2f} V', None),
+)
+
+# Reduces a line to at most 2 * buckets points, keeping the minimum and maximum of every
+# bucket in their original order so spikes survive however many rows are plotted
+def decimate(x, y, buckets):
+    count = len(x)
+    if buckets <= 0 or count <= 2 * buckets:
+        return x, y
+    size = count // buckets
+    body = size * buckets
+    rows = y[:body].reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    low = rows.argmin(axis=1) + offsets
+    high = rows.argmax(axis=1) + offsets
+    index = np.column_stack([np.minimum(low, high), np.maximum(low, high)]).ravel()
+    index = np.concatenate([index, np.arange(body, count)])
+    return x[index], y[index]
+
+# Live readout figure. Lines are decimated to the pixel width of their axes, redraws are
+# capped at fps, and the static parts of the figure (axes, ticks, labels) are cached and
+# blitted, so only the lines and titles are drawn each frame. A full draw only happens
+# when data leaves the current axis limits or the window is resized.
+class LivePlot:
+    def __init__(self, size, fps=5.0, show=True):
+        """
+        Parameters:
+        size (int): Number of most recent rows plotted.
+        fps (float): Most redraws per second.
+        show (bool): Show the window (False for off-screen use, e.g. benchmarks).
+        """
+        self.series = LiveSeries(size)
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.fig, self.axes = plt.subplots(3, 1)
+        self.fig.suptitle('Live Data Readout')
+        self.canvas = self.fig.canvas
+        self.blit = getattr(self.canvas, 'supports_blit', False)
+        self.lines = []
+        for ax, (_, colour, label, _, _) in zip(self.axes, PANELS):
+            line, = ax.plot([], [], colour, animated=self.blit)
+            self.lines.append(line)
+            ax.set_ylabel(label)
+            ax.title.set_animated(self.blit)
+        self.axes[0].set_xticks([])
+        self.axes[1].set_xticks([])
+        self.axes[2].set_xlabel('Time (s)')
+        self.background = None
+        self.changed = False
+        self.last_draw = -np.inf
+        self.full_draws = 0
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        if show:
+            self.fig.show()
+
+    # timestamp is in epoch seconds
+    def add(self, timestamp, temperature, x2, y2):
+        self.series.add(timestamp, temperature, x2, y2)
+        self.changed = True
+
+    # After a full draw (ours or a resize), cache the static figure and draw the lines on it
+    def _on_draw(self, event):
+        if self.blit:
+            self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+            self._draw_animated()
+
+    def _draw_animated(self):
+        for ax, line in zip(self.axes, self.lines):
+            self.fig.draw_artist(line)
+            self.fig.draw_artist(ax.title)
+
+    # Widens the limits once the data leaves them (or fills less than a quarter of them); True if any changed
+    def _update_limits(self, elapsed, columns):
+        rescaled = False
+        left, right = self.axes[0].get_xlim()
+        if elapsed[0] < left or elapsed[-1] > right or elapsed[0] > left + 0.25 * (right - left):
+            headroom = max(0.2 * (elapsed[-1] - elapsed[0]), 10.0)
+            for ax in self.axes:
+                ax.set_xlim(elapsed[0], elapsed[-1] + headroom)
+            rescaled = True
+        for ax, values, (_, _, _, _, pad) in zip(self.axes, columns, PANELS):
+            finite = values[np.isfinite(values)]
+            if not len(finite):
+                continue
+            low, high = finite.min(), finite.max()
+            bottom, top = ax.get_ylim()
+            if pad is None:
+                pad = 0.1 * (high - low) or 0.1 * abs(high) or 1e-9
+            if low < bottom or high > top or (high - low + 2 * pad) < 0.25 * (top - bottom):
+                ax.set_ylim(low - pad, high + pad)
+                rescaled = True
+        return rescaled
+
+    # Redraws if rows were added and the last frame is at least 1/fps old; True if it drew
+    def update(self, force=False):
+        now = time.monotonic()
+        if not len(self.series) or not (self.changed or force) or now - self.last_draw < self.interval:
+            return False
+        elapsed = self.series.column('elapsed')
+        columns = [self.series.column(name) for name, _, _, _, _ in PANELS]
+        rescaled = self._update_limits(elapsed, columns)
+        for ax, line, values, (_, _, _, title, _) in zip(self.axes, self.lines, columns, PANELS):
+            line.set_data(*decimate(elapsed, values, int(ax.bbox.width)))
+            ax.set_title(title.format(values[-1]))
+
+        if rescaled or self.background is None:
+            self.canvas.draw()
+            self.full_draws += 1
+        else:
+            self.canvas.restore_region(self.background)
+            self._draw_animated()
+            self.canvas.blit(self.fig.bbox)
+        self.canvas.flush_events()
+        self.changed = False
+        self.last_draw = now
+        return True
+
+    def close(self):
+        plt.close(self.fig)
+
+# Whole-session view drawn from a HistoryPyramid, refreshed every refresh seconds. Zooming with
+# the toolbar requeries the pyramid at the resolution of the new range, down to the rows on disk;
+# a view that covers the whole session again follows the run as it grows.
+class HistoryPlot:
+    def __init__(self, history, refresh=10.0, show=True):
+        """
+        Parameters:
+        history (HistoryPyramid): Session summary, with temperature, X2 and Y2 as its columns.
+        refresh (float): Seconds between redraws while following the run.
+        show (bool): Show the window.
+        """
+        self.history = history
+        self.refresh = refresh
+        self.fig, self.axes = plt.subplots(3, 1, sharex=True)
+        self.fig.suptitle('Run History')
+        self.lines = []
+        for ax, (_, colour, label, _, _) in zip(self.axes, PANELS):
+            line, = ax.plot([], [], colour)
+            self.lines.append(line)
+            ax.set_ylabel(label)
+        self.axes[2].set_xlabel('Time (s)')
+        self.zoom = None
+        self.full_right = None
+        self.setting_limits = False
+        self.last_draw = -np.inf
+        self.axes[0].callbacks.connect('xlim_changed', self._on_xlim)
+        if show:
+            self.fig.show()
+
+    # A zoom or pan by the operator; redrawn at the new resolution on the next update
+    def _on_xlim(self, ax):
+        if self.setting_limits:
+            return
+        left, right = ax.get_xlim()
+        if left <= 0 and self.full_right is not None and right >= self.full_right:
+            self.zoom = None
+        else:
+            self.zoom = (left, right)
+        self.last_draw = -np.inf
+
+    def update(self):
+        now = time.monotonic()
+        if not len(self.history) or now - self.last_draw < self.refresh:
+            return False
+        origin = self.history.origin
+        width = int(self.axes[0].bbox.width)
+        if self.zoom is None:
+            times, values = self.history.query(max_points=2 * width)
+        else:
+            times, values = self.history.query(origin + self.zoom[0], origin + self.zoom[1], 2 * width)
+        if not len(times):
+            self.last_draw = now
+            return False
+        elapsed = times - origin
+        self.setting_limits = True
+        try:
+            for ax, line, column in zip(self.axes, self.lines, range(values.shape[1])):
+                line.set_data(elapsed[:, column], values[:, column])
+                low, high = np.nanmin(values[:, column]), np.nanmax(values[:, column])
+                pad = 0.05 * (high - low) or 0.1 * abs(high) or 1e-9
+                ax.set_ylim(low - pad, high + pad)
+            if self.zoom is None:
+                self.full_right = max(elapsed.max(), 1.0)
+                self.axes[0].set_xlim(0, self.full_right)
+        finally:
+            self.setting_limits = False
+        self.fig.canvas.draw_idle()
+        self.fig.canvas.flush_events()
+        self.last_draw = now
+        return True
+
+    def close(self):
+        plt.close(self.fig)
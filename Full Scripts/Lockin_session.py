@@ -0,0 +1,236 @@
+import math
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime
+import pyvisa
+
+# pyvisa-sim backend describing a simulated SRS865A at the stepper's GPIB address
+SIM_BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'SR865A_sim.yaml') + '@sim'
+
+_pool_lock = threading.Lock()
+_resource_managers = {}
+_sessions = {}
+_settings_caches = {}
+
+# Returns one ResourceManager per VISA backend, created on first use
+def _get_resource_manager(backend):
+    if backend not in _resource_managers:
+        _resource_managers[backend] = pyvisa.ResourceManager(backend)
+    return _resource_managers[backend]
+
+# Keeps a single VISA handle to an instrument open for the whole run
+class LockinSession:
+    def __init__(self, address, backend='', timeout=5000, retries=1):
+        """
+        Parameters:
+        address (str): GPIB address of the instrument.
+        backend (str): VISA backend passed to pyvisa.ResourceManager ('' for the system library, SIM_BACKEND for pyvisa-sim).
+        timeout (int): I/O timeout in milliseconds.
+        retries (int): Number of reconnect attempts after a VisaIOError before the error is raised.
+        """
+        self.address = address
+        self.backend = backend
+        self.timeout = timeout
+        self.retries = retries
+        self.lock = threading.RLock()
+        self.resource = None
+
+    # Opens the resource if it is not open yet and returns it
+    def open(self):
+        with self.lock:
+            if self.resource is None:
+                with _pool_lock:
+                    rm = _get_resource_manager(self.backend)
+                self.resource = rm.open_resource(self.address)
+                self.resource.timeout = self.timeout
+                self.resource.read_termination = '\n'
+                self.resource.write_termination = '\n'
+            return self.resource
+
+    def close(self):
+        with self.lock:
+            if self.resource is not None:
+                try:
+                    self.resource.close()
+                except pyvisa.VisaIOError:
+                    pass  # The handle is being discarded anyway
+                self.resource = None
+
+    def reconnect(self):
+        with self.lock:
+            self.close()
+            return self.open()
+
+    # Runs an action on the resource under the session lock, reopening the handle after a VisaIOError
+    def _call(self, action):
+        with self.lock:
+            for attempt in range(self.retries + 1):
+                try:
+                    return action(self.open())
+                except pyvisa.VisaIOError as e:
+                    print(f"An error occurred on {self.address}: {e}")
+                    self.close()
+                    if attempt == self.retries:
+                        raise
+
+    def query(self, command):
+        return self._call(lambda resource: resource.query(command))
+
+    def write(self, command):
+        return self._call(lambda resource: resource.write(command))
+
+    # Sends a query and returns the raw binary reply; the termination character is
+    # disabled for the read so 0x0A bytes inside a data block do not end it early
+    def query_raw(self, command):
+        def action(resource):
+            termination = resource.read_termination
+            resource.read_termination = None
+            try:
+                resource.write(command)
+                return resource.read_raw()
+            finally:
+                resource.read_termination = termination
+        return self._call(action)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+# Returns the shared session for an address, so every caller in the process uses the same handle
+def get_session(address, backend='', timeout=5000, retries=1):
+    with _pool_lock:
+        key = (address, backend)
+        if key not in _sessions:
+            _sessions[key] = LockinSession(address, backend, timeout, retries)
+        return _sessions[key]
+
+# Closes every pooled session, called once at the end of a run
+def close_all():
+    with _pool_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+        _settings_caches.clear()
+    for session in sessions:
+        session.close()
+
+# Internal oscillator settings of the SR865A and the detection harmonic, in the order they are written
+OSCILLATOR_SETTINGS = ('SOFF', 'SLVL', 'FREQ', 'HARM')
+
+# Write-through cache of instrument settings. The instrument's values are read once, when a
+# setting is first needed; after that apply() sends only the settings that differ from the
+# cached ones, joined with ';' into a single write. With verify the written settings are read
+# back, and one that does not match is dropped from the cache so the next apply sends it again.
+class SettingsCache:
+    def __init__(self, lockin, names=OSCILLATOR_SETTINGS, verify=False, rel_tol=1e-6, abs_tol=1e-12):
+        """
+        Parameters:
+        lockin: Open session (or stand-in instrument).
+        names (tuple): Setting commands, each with a matching '<name>?' query.
+        verify (bool): Read every written setting back.
+        rel_tol, abs_tol (float): Tolerances within which two values count as the same setting.
+        """
+        self.lockin = lockin
+        self.names = names
+        self.verify = verify
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _same(self, a, b):
+        return math.isclose(a, b, rel_tol=self.rel_tol, abs_tol=self.abs_tol)
+
+    def _read(self, name):
+        return float(self.lockin.query(f'{name}?'))
+
+    # Forgets every cached value, e.g. after the instrument was reset by hand
+    def invalidate(self):
+        with self.lock:
+            self.values.clear()
+
+    # Sets name=value pairs, sending only the ones that changed; returns the settings written
+    def apply(self, **settings):
+        """
+        Returns:
+        dict: Settings that were sent (empty when the instrument already had them all).
+        Raises pyvisa.VisaIOError like the session; the cache is cleared first, since the
+        instrument may have taken part of the write.
+        """
+        with self.lock:
+            try:
+                changed = {}
+                for name in self.names:
+                    if name not in settings:
+                        continue
+                    if name not in self.values:
+                        self.values[name] = self._read(name)
+                    if not self._same(self.values[name], settings[name]):
+                        changed[name] = settings[name]
+                if changed:
+                    self.lockin.write(';'.join(f'{name} {value}' for name, value in changed.items()))
+                    self.values.update(changed)
+                    if self.verify:
+                        for name, value in changed.items():
+                            actual = self._read(name)
+                            if not self._same(actual, value):
+                                print(f"{name} reads back {actual}, expected {value}")
+                                del self.values[name]
+                return changed
+            except pyvisa.VisaIOError:
+                self.values.clear()
+                raise
+
+# Returns the shared settings cache of an address, so every caller sees the same cached state
+def get_settings_cache(address, backend='', verify=False):
+    session = get_session(address, backend)
+    with _pool_lock:
+        key = (address, backend)
+        if key not in _settings_caches:
+            _settings_caches[key] = SettingsCache(session, verify=verify)
+        return _settings_caches[key]
+
+# One simultaneous lock-in reading; aux holds the auxiliary inputs (IN1-IN3) or None
+LockinSnapshot = namedtuple('LockinSnapshot', ['timestamp', 'x', 'y', 'r', 'theta', 'aux'])
+
+# Assigns the four data channels to X, Y, R and theta so SNAPD? returns them in one reply
+def configure_snapshot(lockin):
+    for channel in range(4):
+        lockin.write(f'CDSP {channel},{channel}')
+
+# Reads X, Y, R and theta (and optionally the aux inputs) as one timestamped record
+def read_snapshot(lockin, aux=False):
+    """
+    Parameters:
+    lockin: Open session (or stand-in instrument) with data channels set by configure_snapshot.
+    aux (bool): Also read auxiliary inputs IN1-IN3 with one SNAP? query.
+
+    Returns:
+    LockinSnapshot: Values latched by the instrument in a single SNAPD? round trip,
+    stamped with the midpoint of the query.
+    """
+    before = datetime.now()
+    x, y, r, theta = (float(value) for value in lockin.query('SNAPD?').split(','))
+    aux_values = None
+    if aux:
+        aux_values = tuple(float(value) for value in lockin.query('SNAP? 4,5,6').split(','))
+    after = datetime.now()
+    return LockinSnapshot(before + (after - before) / 2, x, y, r, theta, aux_values)
+
+if __name__ == "__main__":
+    # Exercise the session layer against the simulated lock-in
+    session = get_session('GPIB0::13::INSTR', backend=SIM_BACKEND)
+    print(session.query('*IDN?'))
+    session.write('SOFF 0.0016')
+    print('SOFF? ->', session.query('SOFF?'))
+    print('OUTP? 0 ->', session.query('OUTP? 0'))
+    print('OUTP? 1 ->', session.query('OUTP? 1'))
+    configure_snapshot(session)
+    print(read_snapshot(session, aux=True))
+    cache = get_settings_cache('GPIB0::13::INSTR', SIM_BACKEND, verify=True)
+    print('apply ->', cache.apply(SOFF=0.0016, SLVL=0.001, FREQ=1000.0))
+    print('apply ->', cache.apply(SOFF=0.0017, SLVL=0.001, FREQ=1000.0))
+    close_all()
@@ -0,0 +1,143 @@
+import json
+import os
+import sys
+import zlib
+import numpy as np
+from Log_scanner import LogScanner, parse_rows
+
+# Sparse timestamp -> byte offset index of an MPMS log: the time of the first row at or after
+# every step bytes, read through a LogScanner without parsing the rows in between. Rows must be
+# in time order, which the MPMS guarantees. The index is cached beside the log (<log>.index.npz)
+# and used as is while the log's size and mtime are unchanged; when the log has only grown (the
+# bytes before the indexed end still match) the index is extended, otherwise it is rebuilt.
+class LogIndex:
+    def __init__(self, path, step=1 << 16, time_column='Time', temperature_column='Temperature (K)', cache=True):
+        """
+        Parameters:
+        path (str): MPMS log file.
+        step (int): Bytes between two index entries; a seek lands at most this far before its row.
+        time_column (str): Name of the timestamp column in the [Data] header.
+        temperature_column (str): Name of the temperature column in the [Data] header.
+        cache (bool): Load and save the index beside the log.
+        """
+        self.path = path
+        self.step = step
+        self.time_column = time_column
+        self.temperature_column = temperature_column
+        self.cache_path = path + '.index.npz' if cache else None
+        self._clear()
+
+    def _clear(self):
+        self.times = np.empty(0)
+        self.offsets = np.empty(0, dtype=np.int64)
+        self.size = None       # Size and mtime of the log when last indexed
+        self.mtime = None
+        self.indexed = 0       # End of the last complete line covered
+        self.check = None      # crc32 of the bytes just before indexed
+        self.data_start = None
+        self.columns = None
+        self.time_index = 0
+        self.temperature_index = 1
+        self.single_section = True  # False once a second [Data] section is seen; seeking is then off
+
+    def __len__(self):
+        return len(self.times)
+
+    def _load(self):
+        try:
+            with np.load(self.cache_path) as cache:
+                meta = json.loads(str(cache['meta']))
+                if meta['step'] != self.step or meta['time_column'] != self.time_column:
+                    return
+                self.times = cache['times']
+                self.offsets = cache['offsets']
+        except (OSError, KeyError, ValueError):
+            return
+        for name in ('size', 'mtime', 'indexed', 'check', 'data_start', 'columns', 'time_index',
+                     'temperature_index', 'single_section'):
+            setattr(self, name, meta[name])
+
+    def _save(self):
+        meta = {name: getattr(self, name) for name in ('step', 'time_column', 'size', 'mtime', 'indexed', 'check',
+                                                       'data_start', 'columns', 'time_index', 'temperature_index',
+                                                       'single_section')}
+        try:
+            with open(self.cache_path + '.tmp', 'wb') as file:
+                np.savez(file, times=self.times, offsets=self.offsets, meta=json.dumps(meta))
+            os.replace(self.cache_path + '.tmp', self.cache_path)
+        except OSError as error:
+            print(f"Could not save the log index {self.cache_path}: {error}")
+
+    def _checksum(self, scanner, end):
+        return zlib.crc32(scanner.map[max(end - 4096, 0):end])
+
+    # Brings the index up to date with the log (loading the cache first if there is one)
+    def update(self):
+        if self.size is None and self.cache_path is not None:
+            self._load()
+        try:
+            status = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if (status.st_size, status.st_mtime_ns) == (self.size, self.mtime):
+            return
+        with LogScanner(self.path, self.time_column, self.temperature_column) as scanner:
+            if scanner.data_start is None:
+                return
+            if (self.data_start != scanner.data_start or scanner.size < self.indexed
+                    or self._checksum(scanner, self.indexed) != self.check):
+                self._clear()
+                self.data_start = scanner.data_start
+                self.columns = scanner.columns
+                self.time_index = scanner.time_index
+                self.temperature_index = scanner.temperature_index
+            end = scanner.line_start(scanner.size)
+            if self.single_section and scanner.map.find(b'[Data]', max(self.indexed, self.data_start)) >= 0:
+                self.single_section = False
+            if self.single_section:
+                self._extend(scanner, end)
+            self.indexed = end
+            self.check = self._checksum(scanner, end)
+        self.size = status.st_size
+        self.mtime = status.st_mtime_ns
+        if self.cache_path is not None:
+            self._save()
+
+    # Samples the first parseable row at or after every step bytes up to end
+    def _extend(self, scanner, end):
+        times = []
+        offsets = []
+        offset = int(self.offsets[-1]) + self.step if len(self.offsets) else self.data_start
+        while offset < end:
+            start = offset if offset == self.data_start else scanner.map.find(b'\n', offset - 1, end) + 1
+            if start <= 0:
+                break
+            stop = scanner.map.find(b'\n', start, end) + 1
+            row_times, _ = parse_rows(np.frombuffer(scanner.map, np.uint8, stop - start, start),
+                                      self.time_index, self.temperature_index)
+            if len(row_times):
+                times.append(row_times[0])
+                offsets.append(start)
+                offset = start + self.step
+            else:
+                offset = stop  # Not a row; sample the next line instead
+        if times:
+            self.times = np.concatenate([self.times, times])
+            self.offsets = np.concatenate([self.offsets, np.array(offsets, dtype=np.int64)])
+
+    # Byte offset of a line at or before the first row with a time >= timestamp
+    def offset_for(self, timestamp):
+        if not self.single_section or not len(self.times):
+            return self.data_start or 0
+        position = int(np.searchsorted(self.times, timestamp, side='left')) - 1
+        return int(self.offsets[position]) if position >= 0 else self.data_start
+
+if __name__ == "__main__":
+    # python Log_index.py log.csv [start time, ISO format] - builds or updates the cached index
+    from datetime import datetime
+    index = LogIndex(sys.argv[1])
+    index.update()
+    print(f'{len(index)} entries covering {index.indexed} bytes of {sys.argv[1]}')
+    if len(sys.argv) > 2:
+        offset = index.offset_for(datetime.fromisoformat(sys.argv[2]).timestamp())
+        print(f'Rows from {sys.argv[2]} start within {index.step} bytes after offset {offset}')
@@ -0,0 +1,213 @@
+import mmap
+import os
+import sys
+import numpy as np
+
+FIELD_BYTES = 32  # Longest field the vectorised parser converts; longer ones take the per-line path
+
+# Converts the time and temperature fields of complete log lines (a uint8 array ending in a
+# newline) without a Python loop: line and field boundaries come from the positions of the
+# newlines and commas, the two fields are cut out as fixed-width byte strings and numpy
+# converts them in one call. Lines missing a field or not holding numbers are skipped,
+# like LogTailer skips them.
+def parse_rows(data, time_index=0, temperature_index=1):
+    """
+    Returns:
+    tuple: (times, temperatures) as numpy float arrays, in file order.
+    """
+    ends = np.flatnonzero(data == 10)
+    if not len(ends):
+        return np.empty(0), np.empty(0)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    commas = np.flatnonzero(data == 44)
+    before = np.searchsorted(commas, starts)  # Commas ahead of each line
+    fields = []
+    valid = np.ones(len(starts), bool)
+    for index in (time_index, temperature_index):
+        if index == 0:
+            first = starts
+        else:
+            position = np.minimum(before + index - 1, len(commas) - 1)
+            exists = (before + index - 1 < len(commas)) & (commas[position] < ends)
+            first = np.where(exists, commas[position] + 1, ends)
+        position = np.minimum(before + index, len(commas) - 1)
+        closed = (before + index < len(commas)) & (commas[position] < ends)
+        last = np.where(closed, commas[position], ends)
+        length = last - first
+        valid &= (length > 0) & (length <= FIELD_BYTES)
+        fields.append((first, length))
+    if not valid.any():
+        return np.empty(0), np.empty(0)
+    # Fields are cut out at the width of the longest one, padded with the zeros numpy strips
+    width = int(max(length[valid].max() for _, length in fields))
+    padded = np.concatenate([data, np.zeros(width, np.uint8)])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, width)
+    values = []
+    for first, length in fields:
+        cut = windows[first[valid]]
+        cut[np.arange(width) >= length[valid, None]] = 0
+        text = cut.view(f'S{width}').ravel()
+        try:
+            values.append(text.astype(float))
+        except ValueError:
+            values.append(_parse_slow(text))
+    keep = np.isfinite(values[0]) & np.isfinite(values[1])
+    return values[0][keep], values[1][keep]
+
+# Per-field fallback for a batch holding text that is not a number (NaN marks the row as skipped)
+def _parse_slow(text):
+    values = np.empty(len(text))
+    for i, field in enumerate(text.tolist()):
+        try:
+            values[i] = float(field)
+        except ValueError:
+            values[i] = np.nan
+    return values
+
+# Read-only view of a whole MPMS log through mmap, for logs too large to read line by line.
+# The [Data] section and its column header are located once; after that the newest row is
+# found by scanning backwards from the end of the file, and any byte range is parsed in
+# chunks with parse_rows. The mapping is taken when the scanner is created (and again by
+# refresh), so rows written later are only seen after refresh(). latest() does the job of the
+# readlines get_latest_temperature readers in Test scripts, which are kept as the
+# development snapshots they are.
+class LogScanner:
+    def __init__(self, path, time_column='Time', temperature_column='Temperature (K)', chunk_bytes=16 << 20):
+        """
+        Parameters:
+        path (str): MPMS log file.
+        time_column (str): Name of the timestamp column in the [Data] header.
+        temperature_column (str): Name of the temperature column in the [Data] header.
+        chunk_bytes (int): Bytes parsed per parse_rows call, bounding the memory a parse uses.
+        """
+        self.path = path
+        self.time_column = time_column
+        self.temperature_column = temperature_column
+        self.chunk_bytes = chunk_bytes
+        self.file = open(path, 'rb')
+        self.map = None
+        self.size = 0
+        self.columns = None
+        self.time_index = 0
+        self.temperature_index = 1
+        self.data_start = None  # Byte offset of the first row, None until the layout is known
+        self.refresh()
+
+    # Maps the file again to see rows written since; the layout is only searched until found
+    def refresh(self):
+        size = os.fstat(self.file.fileno()).st_size
+        if size == self.size and self.map is not None:
+            return
+        if self.map is not None:
+            self.map.close()
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.size = size
+        if self.data_start is None and self.map is not None:
+            self._find_layout()
+
+    # Finds the column header after [Data] (or a named header on the first line) and where rows begin
+    def _find_layout(self):
+        marker = self.map.find(b'[Data]')
+        if marker < 0:
+            end = self.map.find(b'\n')
+            if end < 0:
+                return
+            first = self.map[:end].decode('utf-8', errors='replace')
+            if self.time_column in first:
+                self._parse_header(first)
+                self.data_start = end + 1
+            else:
+                self.data_start = 0
+            return
+        header_start = self.map.find(b'\n', marker) + 1
+        while header_start > 0:
+            end = self.map.find(b'\n', header_start)
+            if end < 0:
+                return  # Column header not complete yet
+            line = self.map[header_start:end].decode('utf-8', errors='replace').strip()
+            if line:
+                self._parse_header(line)
+                self.data_start = end + 1
+                return
+            header_start = end + 1
+
+    def _parse_header(self, line):
+        names = [name.strip() for name in line.split(',')]
+        self.columns = {name: index for index, name in enumerate(names)}
+        self.time_index = self.columns.get(self.time_column, 0)
+        self.temperature_index = self.columns.get(self.temperature_column, 1)
+
+    # Start of the line holding offset (offset itself when a line starts there); at the end
+    # of the file, the end of the last complete line
+    def line_start(self, offset):
+        return self.map.rfind(b'\n', 0, offset) + 1 if self.map is not None else 0
+
+    # Newest complete row, found from the end of the file without reading the rest
+    def latest(self):
+        """
+        Returns:
+        tuple: (time, temperature) of the last row, or None when the log has no rows yet.
+        """
+        if self.data_start is None:
+            return None
+        end = self.line_start(self.size)
+        while end > self.data_start:
+            start = max(self.line_start(end - 1), self.data_start)
+            times, temperatures = parse_rows(np.frombuffer(self.map, np.uint8, end - start, start),
+                                             self.time_index, self.temperature_index)
+            if len(times):
+                return times[0], temperatures[0]
+            end = start
+        return None
+
+    # Chunks of the complete rows between two byte offsets (start at a line start), as
+    # (offset of the chunk, times, temperatures)
+    def chunks(self, start=None, end=None):
+        if self.data_start is None:
+            return
+        start = self.data_start if start is None else max(start, self.data_start)
+        end = self.line_start(self.size if end is None else min(end, self.size))
+        while start < end:
+            stop = self.line_start(min(start + self.chunk_bytes, end))
+            if stop <= start:
+                stop = self.map.find(b'\n', start, end) + 1  # A single line longer than chunk_bytes
+            times, temperatures = parse_rows(np.frombuffer(self.map, np.uint8, stop - start, start),
+                                             self.time_index, self.temperature_index)
+            yield start, times, temperatures
+            start = stop
+
+    # All complete rows between two byte offsets (the whole [Data] section by default)
+    def parse(self, start=None, end=None):
+        """
+        Returns:
+        tuple: (times, temperatures) as numpy float arrays.
+        """
+        parts = [(times, temperatures) for _, times, temperatures in self.chunks(start, end)]
+        if not parts:
+            return np.empty(0), np.empty(0)
+        return np.concatenate([times for times, _ in parts]), np.concatenate([values for _, values in parts])
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+if __name__ == "__main__":
+    # python Log_scanner.py log.csv - prints the newest row and the number of rows
+    from datetime import datetime
+    with LogScanner(sys.argv[1]) as scanner:
+        latest = scanner.latest()
+        if latest is None:
+            print(f'{sys.argv[1]} has no rows yet')
+        else:
+            times, _ = scanner.parse()
+            print(f'{len(times)} rows, newest {datetime.fromtimestamp(latest[0])}: {latest[1]} K')
@@ -0,0 +1,221 @@
+import os
+import numpy as np
+from Log_index import LogIndex
+from Log_scanner import LogScanner
+
+# Follows the MPMS log.csv as it grows. The file handle stays open between reads,
+# a line the MPMS has only partly written is kept until the rest arrives, and the
+# [Data] column header is parsed once to find the time and temperature columns.
+# Truncation or replacement of the log restarts reading from the beginning.
+# The byte offset of each batch is remembered so a crashed session can resume
+# reading just before its last saved row instead of from byte 0 (resume_state).
+# A large unread part (a long historical log on the first read) is parsed in bulk
+# through a LogScanner instead of line by line, and with a start_time the first read
+# of a large log seeks close to it through a cached LogIndex.
+class LogTailer:
+    def __init__(self, path, start_time=None, time_column='Time', temperature_column='Temperature (K)', bulk_bytes=1 << 20,
+                 use_index=True):
+        """
+        Parameters:
+        path (str): MPMS log file.
+        start_time (float): Rows with earlier timestamps (epoch seconds) are skipped, None keeps all.
+        time_column (str): Name of the timestamp column in the [Data] header.
+        temperature_column (str): Name of the temperature column in the [Data] header.
+        Logs without a column header use the first two columns, like get_new_temperature_lines did.
+        bulk_bytes (int): Unread size above which rows are parsed in bulk.
+        use_index (bool): Seek to start_time through the log's LogIndex when the log is larger than bulk_bytes.
+        """
+        self.path = path
+        self.start_time = start_time
+        self.time_column = time_column
+        self.temperature_column = temperature_column
+        self.bulk_bytes = bulk_bytes
+        self.use_index = use_index
+        self.file = None
+        self.identity = None
+        self.batches = ()  # (first row time, byte offset of its line) of the latest reads
+        self._reset()
+
+    def _reset(self):
+        self.position = 0
+        self.partial = b''
+        self.columns = None
+        self.time_index = 0
+        self.temperature_index = 1
+        self.section = 'rows'
+
+    def open(self):
+        self.file = open(self.path, 'rb')
+        status = os.fstat(self.file.fileno())
+        self.identity = (status.st_dev, status.st_ino)
+        self._reset()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    # Reopens the log if it was truncated or replaced by a new file since the last read
+    def _check_rotation(self):
+        try:
+            status = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if (status.st_dev, status.st_ino) != self.identity or status.st_size < self.position:
+            print(f"{self.path} was truncated or replaced, reading it from the start")
+            self.close()
+            self.open()
+
+    # Maps the [Data] column header to the indices of the time and temperature columns
+    def _parse_header(self, line):
+        names = [name.strip() for name in line.split(',')]
+        self.columns = {name: index for index, name in enumerate(names)}
+        self.time_index = self.columns.get(self.time_column, 0)
+        self.temperature_index = self.columns.get(self.temperature_column, 1)
+
+    # Skips the rows before start_time in a freshly opened log, starting at the last indexed row before it
+    def _seek_start(self):
+        index = LogIndex(self.path, time_column=self.time_column, temperature_column=self.temperature_column)
+        index.update()
+        offset = index.offset_for(self.start_time)
+        if index.data_start is None or offset <= index.data_start:
+            return
+        self.file.seek(offset)
+        self.position = offset
+        self.columns = index.columns
+        self.time_index = index.time_index
+        self.temperature_index = index.temperature_index
+        self.section = 'rows'
+
+    # Parses the unread complete lines through a LogScanner and moves past them; None when the
+    # range needs the line-by-line path (a new [Header]/[Data] section inside it)
+    def _read_bulk(self):
+        with LogScanner(self.path, self.time_column, self.temperature_column) as scanner:
+            if scanner.data_start is None:
+                return None
+            if self.position == 0:
+                start = scanner.data_start
+            else:
+                scanner.time_index = self.time_index
+                scanner.temperature_index = self.temperature_index
+                start = self.position
+            if scanner.map.find(b'[Data]', start) >= 0:
+                return None
+            if self.position == 0:
+                self.columns = scanner.columns
+                self.time_index = scanner.time_index
+                self.temperature_index = scanner.temperature_index
+            parts = []
+            for offset, times, temperatures in scanner.chunks(start):
+                if len(times):
+                    self.batches = self.batches[-63:] + ((times[0], offset),)
+                parts.append((times, temperatures))
+            end = scanner.line_start(scanner.size)
+        self.file.seek(end)
+        self.position = end
+        if not parts:
+            return np.empty(0), np.empty(0)
+        return np.concatenate([times for times, _ in parts]), np.concatenate([values for _, values in parts])
+
+    # Returns the complete rows written since the last call
+    def read_new(self):
+        """
+        Returns:
+        tuple: (times, temperatures) as numpy float arrays, times in epoch seconds.
+        """
+        if self.file is None:
+            self.open()
+        else:
+            self._check_rotation()
+        size = os.fstat(self.file.fileno()).st_size
+        if self.position == 0 and self.start_time is not None and self.use_index and size > self.bulk_bytes:
+            self._seek_start()
+        bulk = None
+        if not self.partial and self.section == 'rows' and size - self.position > self.bulk_bytes:
+            bulk = self._read_bulk()
+        batch_start = self.position - len(self.partial)
+        chunk = self.file.read()
+        self.position += len(chunk)
+        lines = (self.partial + chunk).split(b'\n')
+        self.partial = lines.pop()  # Empty when the chunk ended on a newline
+
+        times = []
+        temperatures = []
+        needed = max(self.time_index, self.temperature_index)
+        for raw in lines:
+            line = raw.decode('utf-8', errors='replace').strip()
+            if not line:
+                continue
+            if line == '[Header]':
+                self.section = 'header'
+                continue
+            if line == '[Data]':
+                self.section = 'columns'
+                continue
+            if self.section == 'header':
+                continue
+            if self.section == 'columns':
+                self._parse_header(line)
+                needed = max(self.time_index, self.temperature_index)
+                self.section = 'rows'
+                continue
+            parts = line.split(',')
+            if len(parts) <= needed:
+                continue
+            try:
+                timestamp = float(parts[self.time_index])
+                temperature = float(parts[self.temperature_index])
+            except ValueError:
+                # A named column header without a preceding [Data] line
+                if self.columns is None and self.time_column in line:
+                    self._parse_header(line)
+                    needed = max(self.time_index, self.temperature_index)
+                continue
+            times.append(timestamp)
+            temperatures.append(temperature)
+
+        if times:
+            # Replaced as a whole so another thread can read it at any time
+            self.batches = self.batches[-63:] + ((times[0], batch_start),)
+        times = np.array(times, dtype=float)
+        temperatures = np.array(temperatures, dtype=float)
+        if bulk is not None:
+            times = np.concatenate([bulk[0], times])
+            temperatures = np.concatenate([bulk[1], temperatures])
+        if self.start_time is not None:
+            keep = times >= self.start_time
+            times, temperatures = times[keep], temperatures[keep]
+        return times, temperatures
+
+    # Where a new tailer should start to return every row after last_time, and the
+    # column layout it needs there (rows in the log must be in time order)
+    def resume_state(self, last_time):
+        offset = 0
+        for first_time, batch_start in self.batches:
+            if first_time <= last_time:
+                offset = batch_start
+        return {
+            'path': self.path,
+            'offset': offset,
+            'after': last_time,
+            'identity': list(self.identity) if self.identity else None,
+            'columns': self.columns,
+            'time_index': self.time_index,
+            'temperature_index': self.temperature_index,
+        }
+
+    # Continues from a resume_state(); the whole log is read again if it was replaced or truncated since
+    def restore(self, state):
+        self.open()
+        self.start_time = np.nextafter(state['after'], np.inf)
+        status = os.fstat(self.file.fileno())
+        if list(self.identity) != state['identity'] or status.st_size < state['offset']:
+            print(f"{self.path} changed since the checkpoint, reading it from the start")
+            return
+        self.file.seek(state['offset'])
+        self.position = state['offset']
+        if state['offset'] > 0:
+            self.columns = state['columns']
+            self.time_index = state['time_index']
+            self.temperature_index = state['temperature_index']
+            self.section = 'rows'
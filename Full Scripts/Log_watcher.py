@@ -0,0 +1,114 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct('iIII')
+
+# Opens an inotify descriptor watching a directory, None where inotify is not available
+def _open_inotify(directory):
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_CREATE | IN_MOVED_TO
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+# Blocks until the MPMS log grows. Uses inotify on Linux and polls the file size
+# elsewhere (or when inotify cannot be set up). Bursts of change events are
+# coalesced into a single wake-up.
+class LogWatcher:
+    def __init__(self, path, poll_interval=0.1, coalesce=0.01, use_inotify=True):
+        """
+        Parameters:
+        path (str): File to watch.
+        poll_interval (float): Seconds between size checks in polling mode.
+        coalesce (float): After the first event, further events arriving within this many seconds are merged.
+        use_inotify (bool): Set to False to force polling.
+        """
+        self.path = path
+        self.name = os.fsencode(os.path.basename(path))
+        self.poll_interval = poll_interval
+        self.coalesce = coalesce
+        self.fd = _open_inotify(os.path.dirname(os.path.abspath(path))) if use_inotify else None
+        self.last_size = self._size()
+
+    @property
+    def mode(self):
+        return 'inotify' if self.fd is not None else 'polling'
+
+    def _size(self):
+        try:
+            return os.stat(self.path).st_size
+        except FileNotFoundError:
+            return 0
+
+    # True when the file size differs from the last wake-up (a shrink means it was replaced)
+    def _changed(self):
+        size = self._size()
+        if size != self.last_size:
+            self.last_size = size
+            return True
+        return False
+
+    # Reads all queued inotify events, True if any of them concern the watched file
+    def _drain_events(self):
+        relevant = False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return relevant
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b'\0')
+                relevant = relevant or name == self.name
+                offset += _EVENT_HEADER.size + length
+
+    # Waits until the file has grown or the timeout (seconds, None for no limit) expires
+    def wait(self, timeout=None):
+        """
+        Returns:
+        bool: True if the file changed, False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self._changed():
+            return True
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if self.fd is None:
+                time.sleep(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+            else:
+                ready, _, _ = select.select([self.fd], [], [], remaining)
+                if ready and self._drain_events():
+                    # Merge the rest of a burst of writes into this wake-up
+                    if select.select([self.fd], [], [], self.coalesce)[0]:
+                        self._drain_events()
+            if self._changed():
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
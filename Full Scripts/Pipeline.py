@@ -0,0 +1,235 @@
+import queue
+import time
+from collections import namedtuple
+from threading import Thread, Event
+import numpy as np
+
+# A batch of temperature rows joined with lock-in readings (X, Y, R, theta per row)
+MatchedRows = namedtuple('MatchedRows', ['times', 'temperatures', 'values'])
+
+# Puts an item on a bounded queue, blocking while it is full (backpressure) until stopped
+def put_blocking(output, item, stop_event):
+    while not stop_event.is_set():
+        try:
+            output.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+# Puts an item on a bounded queue, dropping the oldest item if it is full so the producer never waits
+def put_latest(output, item):
+    while True:
+        try:
+            output.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                output.get_nowait()
+            except queue.Empty:
+                pass
+
+# Thread running one stage of the pipeline; an exception stops the whole pipeline
+class Stage(Thread):
+    def __init__(self, name, stop_event):
+        Thread.__init__(self, name=name, daemon=True)
+        self.stop_event = stop_event
+        self.error = None
+
+    def run(self):
+        try:
+            self.loop()
+        except Exception as e:
+            self.error = e
+            self.stop_event.set()
+
+    def loop(self):
+        raise NotImplementedError
+
+# Samples the lock-in on a fixed schedule; read_batch returns (epoch times, X/Y/R/theta rows)
+class AcquisitionStage(Stage):
+    def __init__(self, read_batch, output, interval, stop_event):
+        Stage.__init__(self, 'acquisition', stop_event)
+        self.read_batch = read_batch
+        self.output = output
+        self.interval = interval
+
+    def loop(self):
+        next_time = time.monotonic()
+        while not self.stop_event.is_set():
+            times, values = self.read_batch()
+            if len(times):
+                put_blocking(self.output, (times, values), self.stop_event)
+            # Schedule from the previous target, not from now, so timing does not drift
+            next_time += self.interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                self.stop_event.wait(delay)
+            else:
+                next_time = time.monotonic()
+
+# Waits for the MPMS log to grow and forwards the new rows
+class TailStage(Stage):
+    def __init__(self, tailer, watcher, output, interval, stop_event):
+        Stage.__init__(self, 'tail', stop_event)
+        self.tailer = tailer
+        self.watcher = watcher
+        self.output = output
+        self.interval = interval
+
+    def loop(self):
+        while not self.stop_event.is_set():
+            times, temperatures = self.tailer.read_new()
+            if len(times):
+                put_blocking(self.output, (times, temperatures), self.stop_event)
+            self.watcher.wait(self.interval)
+
+# Joins temperature rows with lock-in readings. A row is held until a reading at or
+# after its time has arrived (or hold seconds have passed), so the nearest reading
+# is not chosen before the one following the row exists. At most max_pending rows wait,
+# the oldest are dropped beyond that.
+class JoinStage(Stage):
+    def __init__(self, index, readings, rows, writer_output, ui_output, stop_event, hold=2.0, max_pending=10000):
+        Stage.__init__(self, 'join', stop_event)
+        self.index = index
+        self.readings = readings
+        self.rows = rows
+        self.writer_output = writer_output
+        self.ui_output = ui_output
+        self.hold = hold
+        self.max_pending = max_pending
+        self.pending_times = np.empty(0)
+        self.pending_temperatures = np.empty(0)
+
+    def _drain_readings(self):
+        while True:
+            try:
+                times, values = self.readings.get_nowait()
+            except queue.Empty:
+                return
+            self.index.extend(times, values)
+
+    # Removes the first count pending rows and returns their times and temperatures
+    def _take(self, count):
+        times = self.pending_times[:count]
+        temperatures = self.pending_temperatures[:count]
+        self.pending_times = self.pending_times[count:]
+        self.pending_temperatures = self.pending_temperatures[count:]
+        return times, temperatures
+
+    # Drops the oldest rows beyond max_pending, so a lock-in that stops answering cannot grow the backlog without bound
+    def _cap_pending(self):
+        excess = len(self.pending_times) - self.max_pending
+        if excess > 0:
+            self._take(excess)
+            print(f"{excess} temperature rows dropped, more than {self.max_pending} were waiting for lock-in readings")
+
+    def _match_ready(self):
+        latest = self.index.latest()
+        # Rows older than hold seconds are released even before the first reading arrives
+        ready = self.pending_times < time.time() - self.hold
+        if latest is not None:
+            ready |= self.pending_times <= latest
+        count = len(ready) if ready.all() else int(np.argmin(ready))
+        if count == 0:
+            return
+        times, temperatures = self._take(count)
+        if latest is None:
+            print(f"{count} temperature rows had no lock-in reading, none has arrived yet")
+            return
+
+        values, valid = self.index.lookup(times)
+        if not valid.all():
+            print(f"{np.count_nonzero(~valid)} temperature rows had no lock-in reading within {self.index.max_skew} s")
+        # Later temperature rows can only match the newest readings
+        self.index.prune(times[-1])
+        batch = MatchedRows(times[valid], temperatures[valid], values[valid])
+        if len(batch.times):
+            put_blocking(self.writer_output, batch, self.stop_event)
+            put_latest(self.ui_output, batch)
+
+    def loop(self):
+        while not self.stop_event.is_set():
+            self._drain_readings()
+            try:
+                times, temperatures = self.rows.get(timeout=0.05)
+                self.pending_times = np.concatenate([self.pending_times, times])
+                self.pending_temperatures = np.concatenate([self.pending_temperatures, temperatures])
+                self._cap_pending()
+                self._drain_readings()
+            except queue.Empty:
+                pass
+            if len(self.pending_times):
+                self._match_ready()
+
+# Hands matched batches to record(batch), which writes them to disk (and runs the experiment control).
+# idle() is called whenever no batch has arrived for a while, e.g. to flush files on their time schedule.
+class WriterStage(Stage):
+    def __init__(self, record, input_queue, stop_event, idle=None):
+        Stage.__init__(self, 'writer', stop_event)
+        self.record = record
+        self.input_queue = input_queue
+        self.idle = idle
+
+    def loop(self):
+        while not self.stop_event.is_set():
+            try:
+                batch = self.input_queue.get(timeout=0.1)
+            except queue.Empty:
+                if self.idle is not None:
+                    self.idle()
+                continue
+            self.record(batch)
+        # Write out whatever was matched before stopping
+        while True:
+            try:
+                self.record(self.input_queue.get_nowait())
+            except queue.Empty:
+                return
+
+# Lock-in acquisition, log tailing, the join and disk writing, each in its own thread and
+# connected by bounded queues. The UI consumes ui_batches() from the main thread; its queue
+# drops the oldest batch when full, so a slow redraw never holds up the other stages.
+class Pipeline:
+    def __init__(self, read_batch, tailer, watcher, index, record, sample_interval=0.5,
+                 queue_size=1000, ui_queue_size=100, hold=2.0, max_pending=10000, idle=None):
+        self.stop_event = Event()
+        self.readings = queue.Queue(queue_size)
+        self.rows = queue.Queue(queue_size)
+        self.matched = queue.Queue(queue_size)
+        self.ui = queue.Queue(ui_queue_size)
+        self.stages = [
+            AcquisitionStage(read_batch, self.readings, sample_interval, self.stop_event),
+            TailStage(tailer, watcher, self.rows, sample_interval, self.stop_event),
+            JoinStage(index, self.readings, self.rows, self.matched, self.ui, self.stop_event, hold, max_pending),
+            WriterStage(record, self.matched, self.stop_event, idle),
+        ]
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    # Raises the first error of a failed stage
+    def check(self):
+        for stage in self.stages:
+            if stage.error is not None:
+                raise RuntimeError(f"Pipeline stage '{stage.name}' failed") from stage.error
+
+    def running(self):
+        return not self.stop_event.is_set()
+
+    # Matched batches for the UI, waiting up to timeout seconds for the first one
+    def ui_batches(self, timeout=0.1):
+        batches = []
+        try:
+            batches.append(self.ui.get(timeout=timeout))
+            while True:
+                batches.append(self.ui.get_nowait())
+        except queue.Empty:
+            pass
+        return batches
+
+    def stop(self):
+        self.stop_event.set()
+        for stage in self.stages:
+            stage.join()
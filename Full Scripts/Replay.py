@@ -0,0 +1,180 @@
+import math
+import os
+import time
+from datetime import datetime
+from threading import Event, Thread
+import numpy as np
+from Log_tailer import LogTailer
+from Time_index import TimeIndex
+
+# Replay timeline shared by the log writer and the lock-in source. Recorded timestamps
+# are shifted by offset so the first row lands at the moment the replay starts; now()
+# is the (shifted) time of the newest row written to the replay log.
+class ReplayClock:
+    def __init__(self):
+        self.offset = 0.0
+        self.start = None
+        self.latest = None
+        self.done = Event()
+
+    def now(self):
+        return self.latest
+
+    def advance(self, timestamp):
+        self.latest = timestamp
+
+# Loads lock-in readings from a file written by the stepper (Full_Data.csv or a run file)
+def load_lockin_trace(path):
+    """
+    Returns:
+    tuple: (times, values) with epoch seconds and X, Y, R, theta columns of the main lock-in.
+    """
+    times = []
+    rows = []
+    with open(path, 'r') as file:
+        for line in file:
+            parts = line.strip().split(',')
+            if len(parts) < 4:
+                continue
+            try:
+                timestamp = datetime.fromisoformat(parts[0]).timestamp()
+                x, y = float(parts[2]), float(parts[3])
+            except ValueError:
+                continue  # Banner and column header lines
+            times.append(timestamp)
+            rows.append([x, y, math.hypot(x, y), math.degrees(math.atan2(y, x))])
+    return np.array(times, dtype=float), np.array(rows, dtype=float).reshape(-1, 4)
+
+# Writes the rows of a recorded MPMS log into a new log file at speed times real time
+# (0 for as fast as possible), the way the MPMS would have written them
+class LogReplayer(Thread):
+    def __init__(self, source, target, clock, speed=1.0, chunk_rows=50):
+        """
+        Parameters:
+        source (str): Recorded MPMS log.csv.
+        target (str): Log file the stepper tails during the replay; overwritten.
+        clock (ReplayClock): Advanced to every row written.
+        speed (float): Replay speed relative to the recording, 0 for as fast as possible.
+        chunk_rows (int): Rows written per write at full speed.
+        """
+        Thread.__init__(self, name='log replay', daemon=True)
+        tailer = LogTailer(source)
+        self.times, self.temperatures = tailer.read_new()
+        tailer.close()
+        self.source = source
+        self.target = target
+        self.clock = clock
+        self.speed = speed
+        self.chunk_rows = chunk_rows
+        self.stop_event = Event()
+        self.rows_written = 0
+
+    def finished(self):
+        return self.clock.done.is_set()
+
+    def run(self):
+        try:
+            self._replay()
+        finally:
+            self.clock.done.set()
+
+    def _replay(self):
+        if not len(self.times):
+            return
+        wall_start = time.time()
+        self.clock.offset = wall_start - self.times[0]
+        times = self.times + self.clock.offset
+        self.clock.start = times[0]
+        with open(self.target, 'w') as file:
+            file.write(f'[Header]\nReplay of {self.source}\n[Data]\nTime,Temperature (K)\n')
+            file.flush()
+            start = 0
+            while start < len(times) and not self.stop_event.is_set():
+                if self.speed > 0:
+                    # Every row that is due by now goes out in one write, then wait for the next one
+                    due = wall_start + (times[start] - times[0]) / self.speed
+                    delay = due - time.time()
+                    if delay > 0:
+                        self.stop_event.wait(delay)
+                        continue
+                    elapsed = (time.time() - wall_start) * self.speed
+                    end = int(np.searchsorted(times, times[0] + elapsed, side='right'))
+                else:
+                    end = min(start + self.chunk_rows, len(times))
+                file.write(''.join(f'{timestamp:.3f},{temperature}\n' for timestamp, temperature
+                                   in zip(times[start:end].tolist(), self.temperatures[start:end].tolist())))
+                file.flush()
+                self.clock.advance(times[end - 1])
+                self.rows_written += end - start
+                start = end
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+# Lock-in source that follows the replay timeline: every call returns readings every
+# interval seconds of replay time up to just past the newest log row, taken from a
+# recorded trace (interpolated) or, without one, a synthetic signal. The synthetic
+# outputs hold a constant level and, like the instrument's, dip after every oscillator
+# change (step) and recover exponentially, so a replayed run settles as a live one does.
+class ReplayLockin:
+    def __init__(self, clock, interval=0.5, trace=None, amplitude=1e-6, phase=30.0, time_constant=1.0):
+        """
+        Parameters:
+        clock (ReplayClock): Timeline of the replayed log.
+        interval (float): Spacing of the readings in replay seconds.
+        trace (tuple): (times, values) from load_lockin_trace, in the recording's time, or None.
+        amplitude, phase (float): Level (V) and phase (degrees) the synthetic outputs settle to.
+        time_constant (float): Replay seconds the synthetic outputs take to recover (1/e) after a step.
+        """
+        self.clock = clock
+        self.interval = interval
+        self.amplitude = amplitude
+        self.phase = phase
+        self.time_constant = time_constant
+        self.step_time = -math.inf
+        self.next_time = None
+        self.trace = None
+        if trace is not None and len(trace[0]):
+            order = np.argsort(trace[0], kind='stable')
+            self.trace = TimeIndex(4, 'linear')
+            self.trace.extend(trace[0][order], trace[1][order])
+
+    def _values(self, times):
+        if self.trace is not None:
+            values, _ = self.trace.lookup(times - self.clock.offset)
+            return values
+        after = np.maximum(times - self.step_time, 0.0)
+        r = self.amplitude * np.where(times >= self.step_time, 1 - 0.5 * np.exp(-after / self.time_constant), 1.0)
+        phase = np.radians(self.phase)
+        return np.column_stack([r * np.cos(phase), r * np.sin(phase), r, np.full(len(times), self.phase)])
+
+    # Starts a synthetic transient at timestamp (replay time), as an oscillator change does on the instrument
+    def step(self, timestamp):
+        self.step_time = timestamp
+
+    # Same contract as read_lockin_batch: (epoch times, X/Y/R/theta rows)
+    def read_batch(self):
+        now = self.clock.now()
+        if now is None:
+            return np.empty(0), np.empty((0, 4))
+        if self.next_time is None:
+            self.next_time = self.clock.start - self.interval
+        # One reading past the newest row, so the join never waits for the next call
+        count = max(int(math.floor((now + self.interval - self.next_time) / self.interval)) + 1, 0)
+        times = self.next_time + self.interval * np.arange(count)
+        self.next_time += self.interval * count
+        return times, self._values(times)
+
+if __name__ == "__main__":
+    # Writes a synthetic MPMS log for replays: cool to 2 K, hold, warm to 9 K at 0.2 K/min, hold
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.getcwd(), 'replay_source.csv')
+    step = 1.0
+    temperatures = np.concatenate([np.linspace(9, 2, 300), np.full(120, 2.0), np.arange(2, 9, 0.2 / 60 * step), np.full(120, 9.0)])
+    temperatures += np.random.default_rng(0).normal(0, 0.001, len(temperatures))
+    times = time.time() - step * len(temperatures) + step * np.arange(len(temperatures))
+    with open(path, 'w') as file:
+        file.write('[Header]\nSynthetic MPMS log\n[Data]\nTime,Temperature (K)\n')
+        file.write(''.join(f'{timestamp:.3f},{temperature:.4f}\n' for timestamp, temperature in zip(times, temperatures)))
+    print(f'Wrote {len(times)} rows to {path}')
@@ -0,0 +1,49 @@
+import numpy as np
+
+# Fixed-size buffer of the most recent rows backed by a preallocated numpy array.
+# Every row is written twice (at i and i + size) so the retained window is always
+# one contiguous slice and view() never copies.
+class RingBuffer:
+    def __init__(self, size, columns):
+        """
+        Parameters:
+        size (int): Number of rows kept; older rows are overwritten.
+        columns (tuple): Column names, used by column() and latest().
+        """
+        self.size = int(size)
+        self.columns = tuple(columns)
+        self.data = np.zeros((2 * self.size, len(self.columns)))
+        self.position = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, row):
+        self.data[self.position] = row
+        self.data[self.position + self.size] = row
+        self.position = (self.position + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    # Oldest to newest rows of the window, as a view into the buffer
+    def view(self):
+        start = (self.position - self.count) % self.size
+        return self.data[start:start + self.count]
+
+    def column(self, name):
+        return self.view()[:, self.columns.index(name)]
+
+    def latest(self, name):
+        return self.data[self.position - 1 + self.size, self.columns.index(name)]
+
+# Live plotting series: time since the first row is computed once per row as it arrives
+class LiveSeries(RingBuffer):
+    def __init__(self, size):
+        super().__init__(size, ('elapsed', 'temperature', 'x2', 'y2'))
+        self.origin = None
+
+    # timestamp is in epoch seconds
+    def add(self, timestamp, temperature, x2, y2):
+        if self.origin is None:
+            self.origin = timestamp
+        self.append((timestamp - self.origin, temperature, x2, y2))
@@ -0,0 +1,131 @@
+import sys
+
+COOLING = 'COOLING'      # Waiting for the temperature to reach temp_min
+SETTLING = 'SETTLING'    # Within the temp_min band, waiting for the temperature to hold steady
+ARMED = 'ARMED'          # Oscillator set and run file open, waiting for the lock-in to be ready
+RECORDING = 'RECORDING'  # Warming from temp_min to temp_max, rows go to the run file
+STEPPING = 'STEPPING'    # Run finished at temp_max, DC offset being stepped for the next run
+
+# Transition table: (from state, to state, condition method). The first condition that
+# holds for the current state fires; entry actions are supplied by the caller.
+TRANSITIONS = [
+    (COOLING, SETTLING, 'near_min'),
+    (SETTLING, COOLING, 'left_min'),
+    (SETTLING, ARMED, 'settled_at_min'),
+    (ARMED, RECORDING, 'ready'),
+    (RECORDING, STEPPING, 'settled_at_max'),
+    (STEPPING, COOLING, 'always'),
+]
+
+# Experiment run control, evaluated on every temperature row
+class RunStateMachine:
+    def __init__(self, temp_min, temp_max, band=0.01, band_exit=0.05, settle_dwell=0.0, stop_dwell=0.0,
+                 on_enter=None, ready=None):
+        """
+        Parameters:
+        temp_min, temp_max (float): Run start and end temperatures (K).
+        band (float): Distance from a target temperature (K) that counts as reached.
+        band_exit (float): Distance from temp_min (K) at which SETTLING falls back to COOLING (hysteresis, >= band).
+        settle_dwell (float): Seconds the temperature must stay steady at temp_min before a run is armed.
+        stop_dwell (float): Seconds the temperature must stay steady at temp_max before the run ends.
+        on_enter (dict): State name -> callable(machine), run when the state is entered.
+        ready (callable): Returns True once an ARMED run may start recording, None to start at once.
+        """
+        self.temp_min = temp_min
+        self.temp_max = temp_max
+        self.band = band
+        self.band_exit = max(band_exit, band)
+        self.settle_dwell = settle_dwell
+        self.stop_dwell = stop_dwell
+        self.on_enter = on_enter or {}
+        self.ready_check = ready
+        self.state = COOLING
+        self.entered = None
+        self.steady_since = None
+        self.timestamp = None
+        self.temperature = None
+        self.trend = None
+
+    @property
+    def recording(self):
+        return self.state == RECORDING
+
+    def _steady_for(self, dwell):
+        return self.steady_since is not None and self.timestamp - self.steady_since >= dwell
+
+    def near_min(self):
+        return abs(self.temperature - self.temp_min) <= self.band
+
+    def left_min(self):
+        return abs(self.temperature - self.temp_min) > self.band_exit
+
+    def settled_at_min(self):
+        return self.near_min() and self._steady_for(self.settle_dwell)
+
+    def ready(self):
+        return self.ready_check is None or self.ready_check(self)
+
+    def settled_at_max(self):
+        return abs(self.temperature - self.temp_max) <= self.band and self._steady_for(self.stop_dwell)
+
+    def always(self):
+        return True
+
+    # State needed to continue after a restart (see restore)
+    def snapshot(self):
+        return {'state': self.state, 'entered': self.entered, 'steady_since': self.steady_since}
+
+    # Continues from a snapshot() without running entry actions
+    def restore(self, snapshot):
+        self.state = snapshot['state']
+        self.entered = snapshot['entered']
+        self.steady_since = snapshot['steady_since']
+
+    # Feeds one row (epoch seconds, K) and the current trend; returns the transitions taken
+    def update(self, timestamp, temperature, trend):
+        self.timestamp = timestamp
+        self.temperature = temperature
+        self.trend = trend
+        if self.entered is None:
+            self.entered = timestamp
+        if trend.state == 'steady':
+            if self.steady_since is None:
+                self.steady_since = timestamp
+        else:
+            self.steady_since = None
+
+        transitions = []
+        for _ in range(len(TRANSITIONS)):
+            for source, target, condition in TRANSITIONS:
+                if source == self.state and getattr(self, condition)():
+                    transitions.append((timestamp, self.state, target))
+                    self.state = target
+                    self.entered = timestamp
+                    if target in self.on_enter:
+                        self.on_enter[target](self)
+                    break
+            else:
+                break
+        return transitions
+
+# Runs a recorded temperature trace through a detector and state machine, returning every transition
+def replay(machine, detector, times, temperatures):
+    transitions = []
+    for timestamp, temperature in zip(times, temperatures):
+        detector.add(timestamp, temperature)
+        transitions.extend(machine.update(timestamp, temperature, detector.trend()))
+    return transitions
+
+if __name__ == "__main__":
+    # Replay a recorded MPMS log: python Run_state_machine.py log.csv temp_min temp_max [ramp_rate K/min]
+    from datetime import datetime
+    from Log_tailer import LogTailer
+    from Trend_detector import TrendDetector
+
+    tailer = LogTailer(sys.argv[1])
+    times, temperatures = tailer.read_new()
+    tailer.close()
+    ramp_rate = float(sys.argv[4]) if len(sys.argv) > 4 else 0.2
+    machine = RunStateMachine(float(sys.argv[2]), float(sys.argv[3]))
+    for timestamp, source, target in replay(machine, TrendDetector(60, ramp_rate * 0.2), times, temperatures):
+        print(f'{datetime.fromtimestamp(timestamp)}  {source} -> {target}')
@@ -0,0 +1,91 @@
+import math
+from collections import deque
+
+# Seconds per SR865A time constant index (OFLT): 1 us, 3 us, 10 us ... 10 ks, 30 ks
+TIME_CONSTANTS = [mantissa * 10.0 ** exponent for exponent in range(-6, 5) for mantissa in (1, 3)]
+# Filter slope index (OFSL) -> dB/octave
+FILTER_SLOPES = (6, 12, 18, 24)
+# Time constants the output filter needs to settle within 1% of a step, per slope (SR865A manual)
+SETTLING_TIME_CONSTANTS = {6: 5.0, 12: 7.0, 18: 9.0, 24: 10.0}
+
+# Time the lock-in output filter needs to settle after a step, from its time constant and slope
+def lockin_settling_time(lockin):
+    """
+    Returns:
+    float: Seconds to settle within 1%.
+    """
+    time_constant = TIME_CONSTANTS[int(float(lockin.query('OFLT?')))]
+    slope = FILTER_SLOPES[int(float(lockin.query('OFSL?')))]
+    return SETTLING_TIME_CONSTANTS[slope] * time_constant
+
+# Decides when lock-in outputs have settled after an oscillator change. The filter's own
+# settling time has to pass first; after that the newest points readings must have stopped
+# moving: the means of their older and newer halves agree within tolerance (relative) or
+# within confidence standard errors of the noise, for every channel.
+class SettleDetector:
+    def __init__(self, tolerance=0.01, points=6, confidence=3.0, timeout=None):
+        """
+        Parameters:
+        tolerance (float): Relative change between the two halves still counted as settled.
+        points (int): Readings the convergence test looks at, at least 4 (0 to only wait for the filter).
+        confidence (float): Changes within this many standard errors of the noise count as settled.
+        timeout (float): Seconds after which the outputs are taken as settled anyway, None for no limit.
+        """
+        self.tolerance = tolerance
+        self.points = max(points, 4) if points else 0
+        self.confidence = confidence
+        self.timeout = timeout
+        self.readings = deque(maxlen=max(self.points, 1))
+        self.start_time = None
+        self.settling_time = 0.0
+        self.settled_at = None
+        self.timed_out = False
+
+    # Starts waiting at timestamp (epoch seconds) for a filter settling time in seconds
+    def start(self, timestamp, settling_time):
+        self.readings.clear()
+        self.start_time = timestamp
+        self.settling_time = settling_time
+        self.settled_at = None
+        self.timed_out = False
+
+    # Adds one set of outputs (e.g. X2, Y2 of every lock-in) read at timestamp
+    def add(self, timestamp, values):
+        if self.start_time is not None and timestamp >= self.start_time:
+            self.readings.append(list(values))
+
+    def _converged(self):
+        if self.points == 0:
+            return True
+        if len(self.readings) < self.points:
+            return False
+        half = self.points // 2
+        older = list(self.readings)[:half]
+        newer = list(self.readings)[-half:]
+        for channel in range(len(newer[0])):
+            a = [reading[channel] for reading in older]
+            b = [reading[channel] for reading in newer]
+            mean_a, mean_b = sum(a) / half, sum(b) / half
+            variance = (sum((x - mean_a) ** 2 for x in a) + sum((x - mean_b) ** 2 for x in b)) / (2 * half - 2)
+            noise = self.confidence * math.sqrt(2 * variance / half)
+            if abs(mean_b - mean_a) > max(self.tolerance * abs(mean_b), noise):
+                return False
+        return True
+
+    # True once the outputs have settled (or the timeout passed) at timestamp
+    def settled(self, timestamp):
+        if self.settled_at is not None:
+            return True
+        if self.start_time is None:
+            return True
+        elapsed = timestamp - self.start_time
+        if elapsed >= self.settling_time and self._converged():
+            self.settled_at = timestamp
+        elif self.timeout is not None and elapsed >= self.timeout:
+            self.settled_at = timestamp
+            self.timed_out = True
+        return self.settled_at is not None
+
+    # Seconds from start to settled, None while still waiting
+    def wait(self):
+        return None if self.settled_at is None else self.settled_at - self.start_time
@@ -0,0 +1,97 @@
+import json
+import os
+import sys
+
+# Oscillator settings a sweep can vary, outermost axis first: every DC offset change costs a
+# thermal cycle anyway, while frequency points are cheap to take several of in one ramp
+SWEEP_AXES = ('SOFF', 'SLVL', 'FREQ')
+
+# Values of one sweep axis from settings.txt: 'start:stop:step' (stop included) or a comma separated list
+def parse_axis(text):
+    text = str(text).strip()
+    if ':' in text:
+        start, stop, step = (float(part) for part in text.split(':'))
+        if step == 0 or (stop - start) * step < 0:
+            raise ValueError(f"Sweep axis {text!r} does not reach its stop value")
+        count = int(round((stop - start) / step)) + 1
+        return [start + index * step for index in range(count)]
+    return [float(value) for value in text.split(',') if value.strip()]
+
+# Grid of oscillator settings measured over a campaign of thermal ramps. Points are visited in
+# serpentine order (each inner axis runs back and forth), so consecutive points differ in one
+# setting and the settings cache sends a single command between them. Consecutive points are
+# grouped points_per_ramp to a ramp, interleaved during one warm-up. Finished ramps are saved
+# to a state file as they complete, so an interrupted campaign continues with the first ramp
+# not done; a state file written for a different grid is ignored.
+class SweepPlan:
+    def __init__(self, axes, points_per_ramp=1, state_file=None):
+        """
+        Parameters:
+        axes (dict): Setting name (SOFF, SLVL, FREQ) -> list of values; names missing keep no value.
+        points_per_ramp (int): Grid points interleaved in one ramp.
+        state_file (str): JSON file recording finished ramps, None to keep them in memory only.
+        """
+        self.axes = {name: list(axes[name]) for name in SWEEP_AXES if name in axes}
+        self.points_per_ramp = max(int(points_per_ramp), 1)
+        self.state_file = state_file
+        self.points = self._serpentine()
+        self.ramps = [self.points[start:start + self.points_per_ramp]
+                      for start in range(0, len(self.points), self.points_per_ramp)]
+        self.signature = {'axes': self.axes, 'points_per_ramp': self.points_per_ramp}
+        self.completed = {}  # Ramp index -> run number it was measured in
+        if state_file is not None and os.path.exists(state_file):
+            with open(state_file, 'r') as file:
+                state = json.load(file)
+            if state.get('signature') == self.signature:
+                self.completed = {int(index): run for index, run in state['completed'].items()}
+            else:
+                print(f"{state_file} belongs to a different sweep, starting the campaign from the first ramp")
+
+    def _serpentine(self):
+        names = list(self.axes)
+        points = [()]
+        # Each axis is added inside the previous ones, reversing direction on every pass
+        for name in names:
+            values = self.axes[name]
+            points = [point + (value,) for index, point in enumerate(points)
+                      for value in (values if index % 2 == 0 else values[::-1])]
+        return [dict(zip(names, point)) for point in points]
+
+    def __len__(self):
+        return len(self.ramps)
+
+    # Index of the first ramp not measured yet, None when the campaign is finished
+    def next_ramp(self):
+        for index in range(len(self.ramps)):
+            if index not in self.completed:
+                return index
+        return None
+
+    def ramp(self, index):
+        return self.ramps[index]
+
+    # Records a ramp as measured in run_number and saves the state
+    def complete(self, index, run_number):
+        self.completed[index] = run_number
+        if self.state_file is None:
+            return
+        state = {'signature': self.signature, 'completed': self.completed}
+        with open(self.state_file + '.tmp', 'w') as file:
+            json.dump(state, file, indent=2)
+        os.replace(self.state_file + '.tmp', self.state_file)
+
+if __name__ == "__main__":
+    # python Sweep_plan.py "SOFF=1.6e-3:2e-3:1e-4" "FREQ=100e3,271.8e3" [points per ramp] - prints the ramps
+    axes = {}
+    points_per_ramp = 1
+    for argument in sys.argv[1:]:
+        if '=' in argument:
+            name, values = argument.split('=', 1)
+            axes[name.strip().upper()] = parse_axis(values)
+        else:
+            points_per_ramp = int(argument)
+    plan = SweepPlan(axes, points_per_ramp)
+    print(f'{len(plan.points)} points in {len(plan)} ramps')
+    for index in range(len(plan)):
+        print(f'Ramp {index + 1}: ' + '; '.join(', '.join(f'{name} {value:g}' for name, value in point.items())
+                                                 for point in plan.ramp(index)))
@@ -0,0 +1,119 @@
+import numpy as np
+
+JOIN_POLICIES = ('nearest', 'previous', 'linear')
+
+# Ordered, array-backed store of timestamped readings (epoch seconds) that joins
+# query times with a binary search instead of scanning every stored reading
+class TimeIndex:
+    def __init__(self, width, policy='nearest', max_skew=None, capacity=1024):
+        """
+        Parameters:
+        width (int): Number of values stored with each timestamp.
+        policy (str): 'nearest' reading, 'previous' reading at or before the query time,
+        or 'linear' interpolation between the two readings around it.
+        max_skew (float): Largest allowed distance in seconds between a query time and
+        the reading(s) used for it, None for no limit.
+        capacity (int): Initial number of preallocated rows.
+        """
+        if policy not in JOIN_POLICIES:
+            raise ValueError(f"Unknown join policy {policy!r}, expected one of {JOIN_POLICIES}")
+        self.width = width
+        self.policy = policy
+        self.max_skew = max_skew
+        self.times = np.empty(capacity)
+        self.values = np.empty((capacity, width))
+        self.start = 0
+        self.end = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    # Timestamp of the newest reading, None when empty
+    def latest(self):
+        return self.times[self.end - 1] if len(self) else None
+
+    # Makes room for count more rows, compacting pruned space before growing the arrays
+    def _reserve(self, count):
+        if self.end + count <= len(self.times):
+            return
+        size = len(self)
+        capacity = len(self.times)
+        while size + count > capacity // 2:
+            capacity *= 2
+        if capacity != len(self.times):
+            times = np.empty(capacity)
+            values = np.empty((capacity, self.width))
+        else:
+            times, values = self.times, self.values
+        times[:size] = self.times[self.start:self.end]
+        values[:size] = self.values[self.start:self.end]
+        self.times, self.values = times, values
+        self.start, self.end = 0, size
+
+    def append(self, timestamp, values):
+        self.extend(np.array([timestamp]), np.array([values], dtype=float))
+
+    # Adds a batch of readings; timestamps must not go backwards
+    def extend(self, times, values):
+        count = len(times)
+        if count == 0:
+            return
+        if (len(self) and times[0] < self.times[self.end - 1]) or np.any(np.diff(times) < 0):
+            raise ValueError("Readings must be added in time order")
+        self._reserve(count)
+        self.times[self.end:self.end + count] = times
+        self.values[self.end:self.end + count] = values
+        self.end += count
+
+    # Joins query times (epoch seconds, ascending or not) with the stored readings
+    def lookup(self, query_times):
+        """
+        Returns:
+        tuple: (values, valid) where values has one row per query time and valid marks
+        rows that found readings within max_skew. Invalid rows are filled with NaN.
+        """
+        query_times = np.asarray(query_times, dtype=float)
+        result = np.full((len(query_times), self.width), np.nan)
+        if len(self) == 0:
+            return result, np.zeros(len(query_times), dtype=bool)
+        times = self.times[self.start:self.end]
+        values = self.values[self.start:self.end]
+
+        after = np.searchsorted(times, query_times, side='right')
+        before = after - 1
+        has_before = before >= 0
+        has_after = after < len(times)
+        before = np.clip(before, 0, len(times) - 1)
+        after = np.clip(after, 0, len(times) - 1)
+        gap_before = np.where(has_before, query_times - times[before], np.inf)
+        gap_after = np.where(has_after, times[after] - query_times, np.inf)
+
+        if self.policy == 'previous':
+            chosen, skew = before, gap_before
+        else:
+            use_after = gap_after < gap_before
+            chosen = np.where(use_after, after, before)
+            skew = np.minimum(gap_before, gap_after)
+        result[:] = values[chosen]
+
+        if self.policy == 'linear':
+            bracketed = has_before & has_after & (times[after] > times[before])
+            span = np.where(bracketed, times[after] - times[before], 1.0)
+            weight = np.where(bracketed, gap_before / span, 0.0)[:, None]
+            interpolated = values[before] + weight * (values[after] - values[before])
+            result = np.where(bracketed[:, None], interpolated, result)
+            # Both readings of an interpolation are used, so both must be within max_skew
+            skew = np.where(bracketed, np.maximum(gap_before, gap_after), skew)
+
+        valid = np.isfinite(skew)
+        if self.max_skew is not None:
+            valid &= skew <= self.max_skew
+        result[~valid] = np.nan
+        return result, valid
+
+    # Drops readings that no query at or after the given time can use: everything
+    # before the last reading at or before it
+    def prune(self, timestamp):
+        keep = np.searchsorted(self.times[self.start:self.end], timestamp, side='right') - 1
+        if keep > 0:
+            self.start += keep
@@ -0,0 +1,87 @@
+import math
+from collections import deque, namedtuple
+
+# slope and slope_error in K/min, noise is the residual standard deviation in K
+Trend = namedtuple('Trend', ['state', 'slope', 'slope_error', 'noise', 'count'])
+
+# Least-squares fit of temperature against real time over a sliding time window,
+# updated with running sums so each new row costs O(1) instead of a full polyfit
+class TrendDetector:
+    def __init__(self, window, tolerance, min_points=5, confidence=2.0, refresh=10000):
+        """
+        Parameters:
+        window (float): Length of the fitted time window in seconds.
+        tolerance (float): Slopes below this magnitude (K/min) count as steady.
+        min_points (int): Rows needed before a trend is reported; the rows must also span half the window.
+        confidence (float): Steady is only reported when the slope plus this many standard errors is within tolerance.
+        refresh (int): The sums are recomputed from the window every refresh rows to stop rounding errors building up.
+        """
+        self.window = window
+        self.tolerance = tolerance
+        self.min_points = max(min_points, 3)
+        self.confidence = confidence
+        self.refresh = refresh
+        self.rows = deque()
+        self.origin = None
+        self.updates = 0
+        self._clear_sums()
+
+    def _clear_sums(self):
+        self.sum_t = 0.0
+        self.sum_y = 0.0
+        self.sum_tt = 0.0
+        self.sum_ty = 0.0
+        self.sum_yy = 0.0
+
+    def _accumulate(self, t, y, sign):
+        self.sum_t += sign * t
+        self.sum_y += sign * y
+        self.sum_tt += sign * t * t
+        self.sum_ty += sign * t * y
+        self.sum_yy += sign * y * y
+
+    def __len__(self):
+        return len(self.rows)
+
+    # Adds one row (epoch seconds, kelvin) and drops rows that left the window
+    def add(self, timestamp, temperature):
+        if self.origin is None:
+            self.origin = timestamp
+        t = timestamp - self.origin  # Small offsets keep the sums well conditioned
+        self.rows.append((t, temperature))
+        self._accumulate(t, temperature, 1)
+        while self.rows and self.rows[0][0] < t - self.window:
+            old_t, old_y = self.rows.popleft()
+            self._accumulate(old_t, old_y, -1)
+        self.updates += 1
+        if self.updates % self.refresh == 0:
+            self._clear_sums()
+            for old_t, old_y in self.rows:
+                self._accumulate(old_t, old_y, 1)
+
+    def latest(self):
+        return self.rows[-1][1] if self.rows else None
+
+    def trend(self):
+        n = len(self.rows)
+        if n < self.min_points or self.rows[-1][0] - self.rows[0][0] < self.window / 2:
+            return Trend("Not enough data", math.nan, math.nan, math.nan, n)
+        s_tt = self.sum_tt - self.sum_t * self.sum_t / n
+        s_ty = self.sum_ty - self.sum_t * self.sum_y / n
+        s_yy = self.sum_yy - self.sum_y * self.sum_y / n
+        if s_tt <= 0:
+            return Trend("Not enough data", math.nan, math.nan, math.nan, n)
+        slope = s_ty / s_tt
+        residual = max(s_yy - slope * s_ty, 0.0) / (n - 2)
+        slope_error = math.sqrt(residual / s_tt)
+
+        slope_per_minute = slope * 60
+        if abs(slope_per_minute) + self.confidence * slope_error * 60 < self.tolerance:
+            state = "steady"
+        elif abs(slope_per_minute) < self.tolerance:
+            state = "uncertain"
+        elif slope > 0:
+            state = "warming"
+        else:
+            state = "cooling"
+        return Trend(state, slope_per_minute, slope_error * 60, math.sqrt(residual), n)
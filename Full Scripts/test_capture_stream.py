@@ -0,0 +1,59 @@
+import time
+import numpy as np
+import pytest
+from Capture_stream import CaptureStream
+from Fake_instruments import FakeLockin
+
+# X/Y capture at 1024 samples/s: 8 kB/s, so a 4 kB buffer wraps every 0.5 s
+RATE = 1024.0
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    return now
+
+def armed(clock):
+    lockin = FakeLockin(latency=0, capture_rate_max=RATE)
+    stream = CaptureStream(lockin, 0, 'XY', buffer_kb=4)
+    stream.arm()
+    return lockin, stream
+
+# Every sample drained is the one the fake instrument produced at that time
+def check_samples(lockin, stream, times, values):
+    indices = np.round((times - stream.start_time) * RATE).astype(int)
+    assert np.array_equal(np.diff(indices), np.ones(len(indices) - 1, dtype=int))
+    assert values == pytest.approx(lockin.capture_values(indices).astype(float))
+
+def test_drain_in_time(clock):
+    lockin, stream = armed(clock)
+    clock[0] += 0.3  # 2.4 kB
+    times, values = stream.drain()
+    assert len(times) == 2 * 128
+    check_samples(lockin, stream, times, values)
+    clock[0] += 0.3
+    more, values = stream.drain()
+    assert more[0] == pytest.approx(times[-1] + 1 / RATE)
+    check_samples(lockin, stream, more, values)
+
+# Several wraps between two polls: the newest 3 kB are read, not data from an older pass over the buffer
+def test_several_wraps_between_polls(clock):
+    lockin, stream = armed(clock)
+    clock[0] += 1.3  # 10.4 kB, two and a half passes over the buffer
+    times, values = stream.drain()
+    assert len(times) == 3 * 128
+    assert stream.kb_read == 10
+    check_samples(lockin, stream, times, values)
+
+# A full buffer: the oldest kilobyte is being written over and is skipped
+def test_full_buffer_skips_kilobyte_being_written(clock):
+    lockin, stream = armed(clock)
+    clock[0] += 0.51  # 4.08 kB
+    times, values = stream.drain()
+    assert len(times) == 3 * 128
+    assert times[0] == pytest.approx(stream.start_time + 128 / RATE)
+    check_samples(lockin, stream, times, values)
+
+def test_buffer_must_hold_two_kilobytes():
+    with pytest.raises(ValueError):
+        CaptureStream(FakeLockin(latency=0), buffer_kb=1)
@@ -0,0 +1,41 @@
+import time
+import pytest
+from Csv_writer import BufferedCsvWriter
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    return now
+
+def lines(path):
+    return path.read_text().splitlines()
+
+def test_rows_wait_for_the_batch_size(tmp_path, clock):
+    path = tmp_path / 'data.csv'
+    with BufferedCsvWriter(str(path), flush_rows=3, flush_interval=5.0) as writer:
+        writer.writerow([1, 2])
+        writer.writerow([3, 4])
+        assert lines(path) == []
+        writer.writerow([5, 6])
+        assert lines(path) == ['1,2', '3,4', '5,6']
+
+def test_flush_if_due_keeps_the_interval_without_new_rows(tmp_path, clock):
+    path = tmp_path / 'data.csv'
+    with BufferedCsvWriter(str(path), flush_rows=100, flush_interval=5.0) as writer:
+        writer.writerow([1, 2])
+        clock[0] += 4.0
+        writer.flush_if_due()
+        assert lines(path) == []
+        clock[0] += 1.0
+        writer.flush_if_due()
+        assert lines(path) == ['1,2']
+        assert writer.read_rows(0, 1) == [['1', '2']]
+
+def test_flush_if_due_without_rows_writes_nothing(tmp_path, clock):
+    path = tmp_path / 'data.csv'
+    with BufferedCsvWriter(str(path), flush_interval=5.0) as writer:
+        clock[0] += 10.0
+        writer.flush_if_due()
+        assert writer.checkpoints == []
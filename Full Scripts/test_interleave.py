@@ -0,0 +1,63 @@
+import numpy as np
+from Interleave import Interleaver
+from Time_index import TimeIndex
+
+# Clock of the rows, moved by hand; sending settings takes send_time seconds
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def interleaver(clock, sent, guard=1.0, skew=2.0, send_time=0.5):
+    def apply(slot):
+        sent.append((clock.now, slot))
+        clock.now += send_time
+    return Interleaver(['a', 'b'], 10.0, apply, guard, clock, skew=skew)
+
+def test_switch_dated_before_settings_are_sent():
+    clock = FakeClock()
+    sent = []
+    slots = interleaver(clock, sent)
+    slots.start()
+    clock.now = 10.0
+    assert slots.poll()
+    assert sent == [(10.0, 'b')]
+    assert slots.last_switch == 10.0
+    assert slots.switch_times[-1] == 10.0
+
+def test_rows_around_switch_dropped_on_both_sides():
+    clock = FakeClock()
+    slots = interleaver(clock, [], guard=1.0, skew=2.0)
+    slots.start()
+    clock.now = 10.0
+    slots.poll()
+    # A reading up to 2 s after a row may be joined with it, so rows from 8 s on may carry slot 1 readings;
+    # from the switch the outputs settle for 1 s, so readings before 11 s (rows before 13 s) are dropped
+    assert slots.slot_at(7.9) == 0
+    assert slots.slot_at(8.1) is None
+    assert slots.slot_at(10.0) is None
+    assert slots.slot_at(12.9) is None
+    assert slots.slot_at(13.1) == 1
+
+# Rows joined with readings across a switch: every row that gets a slot got a reading measured in that slot
+def test_joined_rows_never_cross_a_switch():
+    clock = FakeClock()
+    slots = interleaver(clock, [], guard=0.0, skew=1.0, send_time=0.3)
+    slots.start()
+    readings = TimeIndex(1, 'nearest', max_skew=1.0)
+    measured_in = []
+    for step in range(400):
+        clock.now = step * 0.1
+        slots.poll()
+        # The instrument takes the new slot once the settings are sent, a reading every 0.7 s
+        if step % 7 == 0:
+            readings.append(clock.now, [slots.current])
+            measured_in.append(slots.current)
+    rows = np.arange(0.05, 39.0, 0.25)
+    values, valid = readings.lookup(rows)
+    tagged = [(slots.slot_at(row), value[0]) for row, value, found in zip(rows, values, valid) if found]
+    assert any(slot is None for slot, _ in tagged)
+    assert {slot for slot, _ in tagged if slot is not None} == {0, 1}
+    assert all(slot == value for slot, value in tagged if slot is not None)
@@ -0,0 +1,24 @@
+from Journal import Journal, complete_length, last_checkpoint
+
+# A checkpoint written after resuming a journal whose last line was cut short by a crash
+def test_resume_drops_torn_line(tmp_path):
+    path = tmp_path / 'session_journal.jsonl'
+    journal = Journal(str(path))
+    journal.record({'last_row_time': 1.0})
+    journal.close()
+    with open(path, 'a') as file:
+        file.write('{"last_row_time": 2.')
+    journal = Journal(str(path), resume=True)
+    journal.record({'last_row_time': 3.0})
+    journal.close()
+    assert last_checkpoint(str(path)) == {'last_row_time': 3.0}
+    assert path.read_text().splitlines() == ['{"last_row_time": 1.0}', '{"last_row_time": 3.0}']
+
+def test_complete_length_across_blocks(tmp_path):
+    path = tmp_path / 'lines'
+    path.write_bytes(b'a' * 100 + b'\n' + b'b' * 50)
+    with open(path, 'rb') as file:
+        assert complete_length(file, block=16) == 101
+    path.write_bytes(b'no newline')
+    with open(path, 'rb') as file:
+        assert complete_length(file) == 0
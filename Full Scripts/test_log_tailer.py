@@ -0,0 +1,85 @@
+import os
+from Log_tailer import LogTailer
+
+HEADER = '[Header]\nTitle,MPMS log\nFileOpenTime,1700000000\n[Data]\nComment,Temperature (K),Time\n'
+
+def write(path, text, mode='a'):
+    with open(path, mode) as file:
+        file.write(text)
+
+def rows(tailer):
+    times, temperatures = tailer.read_new()
+    return list(zip(times.tolist(), temperatures.tolist()))
+
+def test_data_header_picks_columns(tmp_path):
+    path = tmp_path / 'log.csv'
+    write(path, HEADER + ',2.5,100.0\n,2.6,101.0\n', 'w')
+    tailer = LogTailer(str(path))
+    assert rows(tailer) == [(100.0, 2.5), (101.0, 2.6)]
+    assert tailer.columns == {'Comment': 0, 'Temperature (K)': 1, 'Time': 2}
+    tailer.close()
+
+def test_partial_line_kept_until_complete(tmp_path):
+    path = tmp_path / 'log.csv'
+    write(path, HEADER + ',2.5,100.0\n,2.6,10', 'w')
+    tailer = LogTailer(str(path))
+    assert rows(tailer) == [(100.0, 2.5)]
+    assert rows(tailer) == []
+    write(path, '1.0\n,2.7,102.0\n')
+    assert rows(tailer) == [(101.0, 2.6), (102.0, 2.7)]
+    tailer.close()
+
+def test_truncated_log_read_from_start(tmp_path):
+    path = tmp_path / 'log.csv'
+    write(path, HEADER + ',2.5,100.0\n,2.6,101.0\n', 'w')
+    tailer = LogTailer(str(path))
+    rows(tailer)
+    write(path, HEADER + ',3.0,200.0\n', 'w')
+    assert rows(tailer) == [(200.0, 3.0)]
+    tailer.close()
+
+def test_replaced_log_read_from_start(tmp_path):
+    path = tmp_path / 'log.csv'
+    write(path, HEADER + ',2.5,100.0\n', 'w')
+    tailer = LogTailer(str(path))
+    rows(tailer)
+    # A new log of the same size and more, moved in place of the old one
+    new = tmp_path / 'new.csv'
+    write(new, HEADER + ',3.0,200.0\n,3.1,201.0\n', 'w')
+    os.replace(new, path)
+    assert rows(tailer) == [(200.0, 3.0), (201.0, 3.1)]
+    write(path, ',3.2,202.0\n')
+    assert rows(tailer) == [(202.0, 3.2)]
+    tailer.close()
+
+def test_start_time_skips_older_rows(tmp_path):
+    path = tmp_path / 'log.csv'
+    write(path, HEADER + ''.join(f',{2 + i / 10},{100.0 + i}\n' for i in range(10)), 'w')
+    tailer = LogTailer(str(path), start_time=105.0)
+    assert [timestamp for timestamp, _ in rows(tailer)] == [105.0, 106.0, 107.0, 108.0, 109.0]
+    tailer.close()
+
+# Large unread parts go through the bulk parser, which must leave a partial last line like the line-by-line path
+def test_bulk_read_keeps_partial_line(tmp_path):
+    path = tmp_path / 'log.csv'
+    write(path, HEADER + ''.join(f',{2 + i / 1000},{100.0 + i}\n' for i in range(200)) + ',9.9,30', 'w')
+    tailer = LogTailer(str(path), bulk_bytes=256)
+    read = rows(tailer)
+    assert len(read) == 200 and read[-1] == (299.0, 2.199)
+    write(path, '0.0\n')
+    assert rows(tailer) == [(300.0, 9.9)]
+    tailer.close()
+
+def test_resume_state_continues_after_last_row(tmp_path):
+    path = tmp_path / 'log.csv'
+    write(path, HEADER + ',2.5,100.0\n,2.6,101.0\n', 'w')
+    tailer = LogTailer(str(path))
+    rows(tailer)
+    write(path, ',2.7,102.0\n,2.8,103.0\n')
+    rows(tailer)
+    state = tailer.resume_state(102.0)
+    tailer.close()
+    resumed = LogTailer(str(path))
+    resumed.restore(state)
+    assert rows(resumed) == [(103.0, 2.8)]
+    resumed.close()
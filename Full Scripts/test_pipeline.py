@@ -0,0 +1,69 @@
+import queue
+import time
+from threading import Event
+import numpy as np
+from Async_engine import MergedJoin, TEMPERATURE
+from Pipeline import JoinStage, WriterStage
+from Time_index import TimeIndex
+
+# A join stage whose queues are inspected directly instead of running its thread
+def join_stage(hold=2.0, max_pending=10000):
+    return JoinStage(TimeIndex(4), queue.Queue(), queue.Queue(), queue.Queue(), queue.Queue(), Event(),
+                     hold, max_pending)
+
+def add_rows(stage, times):
+    stage.pending_times = np.concatenate([stage.pending_times, times])
+    stage.pending_temperatures = np.concatenate([stage.pending_temperatures, np.full(len(times), 2.0)])
+    stage._cap_pending()
+
+def test_rows_wait_for_a_reading_after_them():
+    stage = join_stage()
+    now = time.time()
+    add_rows(stage, [now - 0.5, now])
+    stage.index.append(now - 0.4, [1.0, 0.0, 1.0, 0.0])
+    stage._match_ready()
+    batch = stage.writer_output.get_nowait()
+    assert batch.times.tolist() == [now - 0.5]
+    assert stage.pending_times.tolist() == [now]
+
+def test_stale_rows_are_released_without_any_reading():
+    stage = join_stage(hold=1.0)
+    now = time.time()
+    add_rows(stage, [now - 5.0, now - 3.0, now])
+    stage._match_ready()
+    assert stage.writer_output.empty()
+    assert stage.pending_times.tolist() == [now]
+
+def test_pending_rows_are_capped():
+    stage = join_stage(max_pending=3)
+    now = time.time()
+    add_rows(stage, now + np.arange(5.0))
+    assert stage.pending_times.tolist() == (now + np.arange(2.0, 5.0)).tolist()
+    assert len(stage.pending_temperatures) == 3
+
+def temperature_records(times):
+    return [(t, 0, TEMPERATURE, [2.0]) for t in times]
+
+def test_merged_join_releases_stale_rows_without_any_reading():
+    join = MergedJoin(['lockin'], hold=1.0)
+    assert join.add_records(temperature_records([0.0, 1.0, 2.0, 2.5])) is None
+    assert join.pending_times == [2.0, 2.5]
+
+def test_merged_join_caps_pending_rows():
+    join = MergedJoin(['lockin'], hold=100.0, max_pending=2)
+    join.add_records(temperature_records([0.0, 1.0, 2.0]))
+    assert join.pending_times == [1.0, 2.0]
+
+def test_writer_stage_calls_idle_while_no_batch_arrives():
+    stop_event = Event()
+    batches = queue.Queue()
+    recorded = []
+    idle_calls = []
+    stage = WriterStage(recorded.append, batches, stop_event, lambda: idle_calls.append(len(recorded)))
+    stage.start()
+    batches.put('batch')
+    time.sleep(0.35)
+    stop_event.set()
+    stage.join()
+    assert recorded == ['batch']
+    assert idle_calls and idle_calls[-1] == 1
@@ -0,0 +1,66 @@
+import csv
+import time
+import numpy as np
+import Get_Data_Stepper
+from Lockin_session import close_all
+from Replay import ReplayClock, ReplayLockin
+from Settle_detector import SettleDetector
+
+SETTINGS = """temp_min=2
+temp_max=9
+warming_ramp_rate=0.2
+settle_dwell=5
+stop_dwell=5
+ac_voltage=0.5
+frequency=271.8e3
+dc_offset=1.60e-3
+dc_step=0.1e-3
+settle_timeout=120
+max_skew=2
+history_refresh=0
+replay_speed=0
+"""
+
+# MPMS log sampled once a second: cool 9 K -> 2 K, hold 2 min, warm to 9 K at 0.2 K/min, hold 2 min
+def write_log(path):
+    temperatures = np.concatenate([np.linspace(9, 2, 300), np.full(120, 2.0), np.arange(2, 9, 0.2 / 60), np.full(120, 9.0)])
+    temperatures += np.random.default_rng(0).normal(0, 0.001, len(temperatures))
+    times = time.time() - len(temperatures) + np.arange(len(temperatures))
+    with open(path, 'w') as file:
+        file.write('[Header]\nSynthetic MPMS log\n[Data]\nTime,Temperature (K)\n')
+        file.write(''.join(f'{timestamp:.3f},{temperature:.4f}\n' for timestamp, temperature in zip(times, temperatures)))
+
+def test_synthetic_outputs_settle_after_step():
+    clock = ReplayClock()
+    clock.start = 1000.0
+    clock.advance(1000.0)
+    lockin = ReplayLockin(clock, 0.5, time_constant=1.0)
+    lockin.step(1000.0)
+    settle = SettleDetector(0.01, 6, timeout=120)
+    settle.start(1000.0, 0.7)
+    clock.advance(1060.0)
+    for timestamp, values in zip(*lockin.read_batch()):
+        settle.add(timestamp, values[:2])
+        if settle.settled(timestamp):
+            break
+    assert not settle.timed_out
+    assert 2 <= settle.wait() <= 10
+
+# A replayed run starts recording at temp_min, once the outputs settled, not after settle_timeout
+def test_replayed_run_starts_at_temp_min(tmp_path, capsys):
+    write_log(tmp_path / 'source.csv')
+    settings = tmp_path / 'settings.txt'
+    settings.write_text(SETTINGS + f"replay_log={tmp_path / 'source.csv'}\noutput_file={tmp_path / 'Full_Data.csv'}\n"
+                        f"output_folder={tmp_path / 'Run Files'}\n")
+    config = Get_Data_Stepper.load_settings(str(settings), headless_mode=True)
+    (tmp_path / 'Run Files').mkdir()
+    full_data = Get_Data_Stepper.create_run_file(config, 0, 0, False)
+    try:
+        Get_Data_Stepper.live_readout(config, full_data)
+    finally:
+        full_data.close()
+        close_all()
+    assert 'Lock-in settled' in capsys.readouterr().out
+    with open(tmp_path / 'Run Files' / 'Run_1.csv', newline='') as file:
+        rows = [row for row in csv.reader(file) if len(row) == 4 and row[0] != 'Timestamp']
+    assert abs(float(rows[0][1]) - 2.0) < 0.02
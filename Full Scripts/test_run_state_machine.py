@@ -0,0 +1,87 @@
+import numpy as np
+from Run_state_machine import RunStateMachine, replay, COOLING, SETTLING, ARMED, RECORDING, STEPPING
+from Trend_detector import TrendDetector
+
+START = 1.7e9  # Epoch seconds of the first row
+
+# Temperature trace sampled once a second: starts at start_temperature and follows linear
+# segments of (seconds, temperature reached at their end)
+def trace(start_temperature, segments):
+    times = [START]
+    temperatures = [start_temperature]
+    for duration, end in segments:
+        steps = np.arange(1, int(duration) + 1)
+        times.extend((times[-1] + steps).tolist())
+        temperatures.extend((temperatures[-1] + (end - temperatures[-1]) * steps / duration).tolist())
+    return times, temperatures
+
+def detector():
+    return TrendDetector(60, 0.04)
+
+# Timestamp of the first steady trend at or after since, from a separate detector pass
+def first_steady(times, temperatures, since):
+    trends = detector()
+    for timestamp, temperature in zip(times, temperatures):
+        trends.add(timestamp, temperature)
+        if timestamp >= since and trends.trend().state == 'steady':
+            return timestamp
+    return None
+
+# Cool 10 K -> 2 K at 1 K/min, hold 5 min, warm to 9 K at 0.2 K/min, hold 5 min
+def thermal_cycle():
+    return trace(10.0, [(480, 2.0), (300, 2.0), (2100, 9.0), (300, 9.0)])
+
+def test_full_cycle_sequence():
+    times, temperatures = thermal_cycle()
+    machine = RunStateMachine(2.0, 9.0, band=0.01, band_exit=0.05, settle_dwell=30, stop_dwell=30)
+    transitions = replay(machine, detector(), times, temperatures)
+    assert [(source, target) for _, source, target in transitions] == [
+        (COOLING, SETTLING), (SETTLING, ARMED), (ARMED, RECORDING), (RECORDING, STEPPING), (STEPPING, COOLING)]
+    # SETTLING on the first row within the band: the cooling segment ends exactly at temp_min
+    assert transitions[0][0] == START + 480
+    assert machine.state == COOLING
+
+def test_dwell_timing():
+    times, temperatures = thermal_cycle()
+    machine = RunStateMachine(2.0, 9.0, band=0.01, band_exit=0.05, settle_dwell=45, stop_dwell=20)
+    transitions = {target: timestamp for timestamp, _, target in replay(machine, detector(), times, temperatures)}
+    # A run is armed settle_dwell after the temperature turned steady at temp_min, and ends
+    # stop_dwell after it turned steady at temp_max
+    assert transitions[ARMED] == first_steady(times, temperatures, START + 480) + 45
+    assert transitions[STEPPING] == first_steady(times, temperatures, START + 480 + 300 + 2100) + 20
+    # Without a ready check recording starts on the same row, stepping hands over to cooling at once
+    assert transitions[RECORDING] == transitions[ARMED]
+    assert transitions[COOLING] == transitions[STEPPING]
+
+def test_ready_check_holds_armed_run():
+    times, temperatures = thermal_cycle()
+    machine = RunStateMachine(2.0, 9.0, settle_dwell=30, stop_dwell=30,
+                              ready=lambda machine: machine.timestamp - machine.entered >= 12)
+    transitions = {target: timestamp for timestamp, _, target in replay(machine, detector(), times, temperatures)}
+    assert transitions[RECORDING] == transitions[ARMED] + 12
+
+def test_hold_shorter_than_dwell_never_arms():
+    times, temperatures = trace(10.0, [(480, 2.0), (100, 2.0), (600, 4.0)])
+    machine = RunStateMachine(2.0, 9.0, settle_dwell=120)
+    transitions = replay(machine, detector(), times, temperatures)
+    assert [(source, target) for _, source, target in transitions] == [(COOLING, SETTLING), (SETTLING, COOLING)]
+
+def test_band_hysteresis():
+    # After reaching temp_min the temperature drifts up to 2.03 K (outside band, inside band_exit),
+    # comes back, then overshoots to 2.08 K (outside band_exit) before settling again
+    times, temperatures = trace(10.0, [(480, 2.0), (20, 2.03), (40, 2.03), (20, 2.0),
+                                       (20, 2.08), (40, 2.08), (20, 2.0), (200, 2.0)])
+    machine = RunStateMachine(2.0, 9.0, band=0.01, band_exit=0.05, settle_dwell=600)
+    transitions = replay(machine, detector(), times, temperatures)
+    assert [(source, target) for _, source, target in transitions] == [
+        (COOLING, SETTLING), (SETTLING, COOLING), (COOLING, SETTLING)]
+    left = transitions[1][0]
+    returned = transitions[2][0]
+    # Falls back to COOLING on the first row beyond band_exit, and settles again on the first row within band
+    assert temperatures[times.index(left)] > 2.05 >= temperatures[times.index(left) - 1]
+    assert abs(temperatures[times.index(returned)] - 2.0) <= 0.01 < abs(temperatures[times.index(returned) - 1] - 2.0)
+    assert max(temperatures[:times.index(left)][480:]) > 2.01  # The first excursion left the band without leaving SETTLING
+
+def test_band_exit_never_below_band():
+    machine = RunStateMachine(2.0, 9.0, band=0.1, band_exit=0.05)
+    assert machine.band_exit == 0.1
@@ -0,0 +1,63 @@
+import pytest
+from Lockin_session import SIM_BACKEND, LockinSession, SettingsCache
+
+# Power-on settings of the simulated SR865A (SR865A_sim.yaml)
+DEFAULTS = {'SOFF': 0.0, 'SLVL': 0.001, 'FREQ': 1000.0, 'HARM': 1}
+
+# Simulated SR865A session that keeps the commands written to it
+class RecordingSession(LockinSession):
+    def __init__(self):
+        LockinSession.__init__(self, 'GPIB0::13::INSTR', SIM_BACKEND)
+        self.writes = []
+
+    def write(self, command):
+        self.writes.append(command)
+        return LockinSession.write(self, command)
+
+# The simulated instrument keeps its settings between sessions, so each test starts from the defaults
+@pytest.fixture
+def lockin():
+    session = RecordingSession()
+    for name, value in DEFAULTS.items():
+        session.write(f'{name} {value}')
+    session.writes.clear()
+    yield session
+    session.close()
+
+def test_unchanged_settings_are_not_sent(lockin):
+    cache = SettingsCache(lockin)
+    assert cache.apply(**DEFAULTS) == {}
+    assert lockin.writes == []
+    for _ in range(3):
+        cache.apply(**DEFAULTS)
+    assert lockin.writes == []
+
+def test_changed_setting_is_sent_and_cached(lockin):
+    cache = SettingsCache(lockin)
+    assert cache.apply(SOFF=0.0016, SLVL=0.001, FREQ=1000.0, HARM=1) == {'SOFF': 0.0016}
+    assert lockin.writes == ['SOFF 0.0016']
+    assert float(lockin.query('SOFF?')) == pytest.approx(0.0016)
+    assert cache.values['SOFF'] == 0.0016
+    # The same value again is not sent, a new harmonic is
+    assert cache.apply(SOFF=0.0016, HARM=1) == {}
+    assert cache.apply(SOFF=0.0016, HARM=2) == {'HARM': 2}
+    assert lockin.writes == ['SOFF 0.0016', 'HARM 2']
+    assert int(lockin.query('HARM?')) == 2
+
+def test_verify_reads_back_written_settings(lockin):
+    cache = SettingsCache(lockin, verify=True)
+    assert cache.apply(FREQ=2000.0, SLVL=0.5) == {'SLVL': 0.5, 'FREQ': 2000.0}
+    assert float(lockin.query('FREQ?')) == pytest.approx(2000.0)
+    assert cache.values == {'SLVL': 0.5, 'FREQ': 2000.0}
+    assert cache.apply(FREQ=2000.0, SLVL=0.5) == {}
+    assert len(lockin.writes) == 1
+
+def test_invalidate_reads_instrument_again(lockin):
+    cache = SettingsCache(lockin)
+    cache.apply(SOFF=0.002)
+    # Changed behind the cache's back, e.g. on the front panel
+    lockin.write('SOFF 0.003')
+    assert cache.apply(SOFF=0.002) == {}
+    cache.invalidate()
+    assert cache.apply(SOFF=0.002) == {'SOFF': 0.002}
+    assert float(lockin.query('SOFF?')) == pytest.approx(0.002)
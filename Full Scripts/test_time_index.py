@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from Time_index import TimeIndex
+
+# Readings at 10, 12 and 20 s: X is ten times the time, Y the time
+def index(policy, max_skew=None):
+    readings = TimeIndex(2, policy, max_skew, capacity=2)
+    readings.extend(np.array([10.0, 12.0]), np.array([[100.0, 10.0], [120.0, 12.0]]))
+    readings.append(20.0, [200.0, 20.0])
+    return readings
+
+@pytest.mark.parametrize('policy', ['nearest', 'previous', 'linear'])
+def test_exact_hits(policy):
+    values, valid = index(policy).lookup([10.0, 12.0, 20.0])
+    assert valid.all()
+    assert values[:, 0].tolist() == [100.0, 120.0, 200.0]
+
+def test_nearest_between_readings():
+    values, valid = index('nearest').lookup([10.9, 11.1, 17.0, 25.0])
+    assert valid.all()
+    assert values[:, 0].tolist() == [100.0, 120.0, 200.0, 200.0]
+
+def test_previous_between_readings():
+    values, valid = index('previous').lookup([9.0, 11.9, 19.9, 25.0])
+    assert valid.tolist() == [False, True, True, True]
+    assert np.isnan(values[0]).all()
+    assert values[1:, 0].tolist() == [100.0, 120.0, 200.0]
+
+def test_linear_between_readings():
+    values, valid = index('linear').lookup([11.0, 16.0, 25.0])
+    assert valid.all()
+    assert values[:, 0] == pytest.approx([110.0, 160.0, 200.0])
+    assert values[:, 1] == pytest.approx([11.0, 16.0, 20.0])
+
+def test_skew_beyond_limit_has_no_reading():
+    values, valid = index('nearest', max_skew=1.5).lookup([11.0, 16.0, 21.5, 21.6, 8.4])
+    assert valid.tolist() == [True, False, True, False, False]
+    assert np.isnan(values[~valid]).all()
+    # Interpolation needs both readings within max_skew
+    values, valid = index('linear', max_skew=1.5).lookup([11.0, 18.6, 21.0])
+    assert valid.tolist() == [True, False, True]
+    assert values[[0, 2], 0] == pytest.approx([110.0, 200.0])
+
+def test_empty_index():
+    values, valid = TimeIndex(4).lookup([1.0, 2.0])
+    assert not valid.any()
+    assert values.shape == (2, 4)
+
+def test_readings_out_of_order_rejected():
+    readings = index('nearest')
+    with pytest.raises(ValueError):
+        readings.append(15.0, [150.0, 15.0])
+
+def test_prune_keeps_reading_before_cutoff():
+    readings = index('nearest')
+    readings.prune(13.0)
+    assert len(readings) == 2
+    # A query at the cutoff still finds the reading before it
+    values, valid = readings.lookup([13.0])
+    assert valid.all() and values[0, 0] == 120.0
+    readings.prune(25.0)
+    assert len(readings) == 1
+    assert readings.latest() == 20.0
+
+def test_prune_then_grow_keeps_order():
+    readings = TimeIndex(1, capacity=4)
+    for second in range(100):
+        readings.append(float(second), [second])
+        readings.prune(second - 2.5)
+    assert len(readings) == 4
+    values, valid = readings.lookup([96.0, 99.0])
+    assert valid.all() and values[:, 0].tolist() == [96.0, 99.0]